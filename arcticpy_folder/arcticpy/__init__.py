@@ -1,10 +1,11 @@
 from autoarray.instruments import acs
 
-from arcticpy.main import add_cti, remove_cti, model_for_HST_ACS
+from arcticpy.main import add_cti, column_block_pool, remove_cti, model_for_HST_ACS
 from arcticpy.roe import (
     ROE,
     ROEChargeInjection,
     ROETrapPumping,
+    clear_express_matrix_cache,
 )
 from arcticpy.ccd import CCD, CCDPhase
 from arcticpy.traps import (
@@ -18,4 +19,6 @@ from arcticpy.trap_managers import (
     TrapManager,
     TrapManagerTrackTime,
     TrapManagerInstantCapture,
+    get_watermark_backend,
+    set_watermark_backend,
 )
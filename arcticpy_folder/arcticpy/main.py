@@ -18,14 +18,21 @@ Richard Massey: r.j.massey@durham.ac.uk
 James Nightingale
 """
 
+import contextlib
+import sys
 import numpy as np
+from concurrent.futures import ProcessPoolExecutor
 from copy import deepcopy
 
 from autoarray.structures import frames
 
 from arcticpy.roe import ROE, ROETrapPumping
 from arcticpy.ccd import CCD, CCDPhase
-from arcticpy.trap_managers import AllTrapManager
+from arcticpy.trap_managers import (
+    AllTrapManager,
+    get_watermark_backend,
+    set_watermark_backend,
+)
 from arcticpy.traps import TrapInstantCapture
 from arcticpy import util
 
@@ -128,22 +135,20 @@ def _clock_charge_in_one_direction(
 
     # Generate the arrays over each step for: the number of of times that the
     # effect of each pixel-to-pixel transfer can be multiplied for the express
-    # algorithm; and whether the traps must be monitored (usually whenever
-    # express matrix > 0, unless using a time window)
+    # algorithm; whether the traps must be monitored (usually whenever express
+    # matrix > 0, unless using a time window); and whether the trap occupancy
+    # states must be saved for the next express pass rather than being reset
+    # (usually at the end of each express pass)
     (
         express_matrix,
         monitor_traps_matrix,
-    ) = roe.express_matrix_and_monitor_traps_matrix_from_pixels_and_express(
+        save_trap_states_matrix,
+    ) = roe.express_matrices(
         pixels=window_row_range,
         express=express,
         offset=offset,
         time_window_range=time_window_range,
     )
-    # ; and whether the trap occupancy states must be saved for the next express
-    # pass rather than being reset (usually at the end of each express pass)
-    save_trap_states_matrix = roe.save_trap_states_matrix_from_express_matrix(
-        express_matrix=express_matrix
-    )
 
     n_express_pass, n_rows_to_process = express_matrix.shape
 
@@ -169,6 +174,7 @@ def _clock_charge_in_one_direction(
         n_columns=len(window_column_range),
         max_n_transfers=max_n_transfers,
         ccd=ccd,
+        dwell_times=roe.dwell_times,
     )
 
     # Temporarily expand image, if charge released from traps ever migrates to
@@ -257,6 +263,163 @@ def _clock_charge_in_one_direction(
     return image
 
 
+def _attach_shm(name):
+    """Attach to an existing shared memory block without taking ownership.
+
+    The creating process unlinks the block. Before Python 3.13 attaching always
+    registers the block with the resource tracker, which the workers share with
+    the parent, so the parent's unlink also covers it.
+    """
+    from multiprocessing import shared_memory
+
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+    return shared_memory.SharedMemory(name=name)
+
+
+def column_block_pool(n_workers):
+    """
+    Create a pool of worker processes to clock blocks of columns on.
+
+    The same pool can be passed to add_cti() as its executor for many calls,
+    e.g. by remove_cti() for all its iterations, so the workers are only
+    started once. The workers use the watermark backend that is set when the
+    pool is created.
+
+    Parameters
+    ----------
+    n_workers : int
+        The number of worker processes.
+
+    Returns
+    -------
+    executor : concurrent.futures.ProcessPoolExecutor
+        The pool, to be shut down (e.g. by using it as a context manager)
+        once it is no longer needed.
+    """
+    return ProcessPoolExecutor(
+        max_workers=n_workers,
+        initializer=set_watermark_backend,
+        initargs=(get_watermark_backend(),),
+    )
+
+
+def _clock_column_block(
+    image_name, output_name, shape, dtype, clock_kwargs, column_start, column_stop
+):
+    """ Clock one block of columns of a shared image in a worker process. """
+    image_shm = _attach_shm(image_name)
+    output_shm = _attach_shm(output_name)
+    try:
+        image = np.ndarray(shape, dtype=dtype, buffer=image_shm.buf)
+        output = np.ndarray(shape, dtype=dtype, buffer=output_shm.buf)
+        output[:, column_start:column_stop] = _clock_charge_in_one_direction(
+            image=image[:, column_start:column_stop].copy(),
+            window_column_range=range(column_stop - column_start),
+            **clock_kwargs,
+        )
+        # Release the views before closing the blocks
+        del image, output
+    finally:
+        image_shm.close()
+        output_shm.close()
+
+
+def _clock_charge_in_column_blocks(
+    image, roe, window_column_range, n_workers, executor=None, **kwargs
+):
+    """
+    Run _clock_charge_in_one_direction() on blocks of columns in parallel.
+
+    Columns have independent traps if roe.empty_traps_between_columns, so each
+    block is clocked with its own trap managers by a pool of worker processes.
+    The image and result are shared with the workers through shared memory.
+    Blocks have at least two columns so that the trap sums are done in the same
+    order as for the whole image, and the result is identical.
+
+    Otherwise, or if n_workers is None or 1, the whole image is clocked here.
+
+    Parameters
+    ----------
+    image, roe, window_column_range, **kwargs
+        As for _clock_charge_in_one_direction().
+
+    n_workers : int or None
+        The number of worker processes.
+
+    executor : concurrent.futures.ProcessPoolExecutor or None
+        A pool from column_block_pool() to run the blocks on. By default, a
+        pool is created for this call.
+
+    Returns
+    -------
+    image : [[float]]
+        The output array of pixel values.
+    """
+    n_blocks = min(n_workers or 1, len(window_column_range) // 2)
+    if n_blocks <= 1 or not getattr(roe, "empty_traps_between_columns", True):
+        return _clock_charge_in_one_direction(
+            image=image, roe=roe, window_column_range=window_column_range, **kwargs
+        )
+
+    if executor is None:
+        with column_block_pool(n_blocks) as executor:
+            return _clock_charge_in_column_blocks(
+                image=image,
+                roe=roe,
+                window_column_range=window_column_range,
+                n_workers=n_workers,
+                executor=executor,
+                **kwargs,
+            )
+
+    # Shared memory is only available from Python 3.8
+    from multiprocessing import shared_memory
+
+    image = np.asarray(image)
+    column_blocks = [
+        (window_column_range[block[0]], window_column_range[block[-1]] + 1)
+        for block in np.array_split(np.arange(len(window_column_range)), n_blocks)
+    ]
+
+    image_shm = None
+    output_shm = None
+    try:
+        image_shm = shared_memory.SharedMemory(create=True, size=max(image.nbytes, 1))
+        output_shm = shared_memory.SharedMemory(create=True, size=max(image.nbytes, 1))
+        np.ndarray(image.shape, dtype=image.dtype, buffer=image_shm.buf)[:] = image
+        output = np.ndarray(image.shape, dtype=image.dtype, buffer=output_shm.buf)
+        # Columns outside the window are unchanged
+        output[:] = image
+
+        clock_kwargs = dict(kwargs, roe=roe)
+        futures = [
+            executor.submit(
+                _clock_column_block,
+                image_shm.name,
+                output_shm.name,
+                image.shape,
+                image.dtype,
+                clock_kwargs,
+                column_start,
+                column_stop,
+            )
+            for column_start, column_stop in column_blocks
+        ]
+        for future in futures:
+            future.result()
+
+        image = output.copy()
+        del output
+    finally:
+        for shm in (image_shm, output_shm):
+            if shm is not None:
+                shm.close()
+                shm.unlink()
+
+    return image
+
+
 def add_cti(
     image,
     parallel_ccd=None,
@@ -272,6 +435,8 @@ def add_cti(
     serial_offset=0,
     serial_window_range=None,
     time_window_range=None,
+    n_workers=None,
+    executor=None,
 ):
     """
     Add CTI trails to an image by trapping, releasing, and moving electrons
@@ -370,6 +535,16 @@ def add_cti(
         will change slightly (unless express=0) because trap occupancy is
         not stored between calls.
 
+    n_workers : int (opt.)
+        If more than 1, split the columns (or rows for serial clocking) into
+        this many blocks, each clocked by its own worker process, with an
+        identical result. Only used if the roe has empty_traps_between_columns.
+
+    executor : concurrent.futures.ProcessPoolExecutor (opt.)
+        A pool of worker processes from column_block_pool() to use for the
+        n_workers blocks, e.g. shared by many calls so that the workers are
+        only started once. By default, a pool is started for each call.
+
     Returns
     -------
     image : [[float]] or frames.Frame
@@ -411,7 +586,7 @@ def add_cti(
     if parallel_traps is not None:
 
         # Transfer charge in parallel direction
-        image_add_cti = _clock_charge_in_one_direction(
+        image_add_cti = _clock_charge_in_column_blocks(
             image=image_add_cti,
             ccd=parallel_ccd,
             roe=parallel_roe,
@@ -421,6 +596,8 @@ def add_cti(
             window_row_range=parallel_window_range,
             window_column_range=serial_window_range,
             time_window_range=time_window_range,
+            n_workers=n_workers,
+            executor=executor,
         )
 
     # Serial clocking
@@ -430,7 +607,7 @@ def add_cti(
         image_add_cti = image_add_cti.T.copy()
 
         # Transfer charge in serial direction
-        image_add_cti = _clock_charge_in_one_direction(
+        image_add_cti = _clock_charge_in_column_blocks(
             image=image_add_cti,
             ccd=serial_ccd,
             roe=serial_roe,
@@ -440,6 +617,8 @@ def add_cti(
             window_row_range=serial_window_range,
             window_column_range=serial_window_column_range,
             time_window_range=None,
+            n_workers=n_workers,
+            executor=executor,
         )
 
         # Switch axes back
@@ -476,6 +655,10 @@ def remove_cti(
     serial_offset=0,
     serial_window_range=None,
     time_window_range=None,
+    n_workers=None,
+    tolerance=None,
+    tolerance_norm="max",
+    image_estimate=None,
 ):
     """
     Remove CTI trails from an image by first modelling the addition of CTI.
@@ -491,39 +674,101 @@ def remove_cti(
 
     iterations : int
         The number of times CTI-adding clocking is run to perform the correction
-        via forward modelling.
+        via forward modelling. The maximum number if a tolerance is set.
+
+    tolerance : float (opt.)
+        Stop early once each iteration's update to the estimate (the input
+        image minus the estimate with CTI added) is no larger than this, in
+        electrons, as measured by tolerance_norm.
+
+        With only parallel clocking (and no serial_window_range), columns are
+        independent, so each column is frozen once its own update is within
+        the tolerance and only the other columns are modelled again.
+
+    tolerance_norm : str
+        How to measure the update for the tolerance: "max" for the largest
+        absolute change in any pixel, or "rms" for the root mean square change.
+
+    image_estimate : [[float]] (opt.)
+        A starting estimate of the image with CTI removed, e.g. the result for
+        a previous similar exposure, instead of the input image itself.
 
     Returns
     -------
     image : [[float]] or frames.Frame
         The output array of pixel values with CTI removed.
     """
-
-    # Initialise the iterative estimate of removed CTI; don't modify the external array
-    image_remove_cti = deepcopy(image)
-
-    # Estimate the image with removed CTI more precisely each iteration
-    for iteration in range(iterations):
-
-        image_add_cti = add_cti(
-            image=image_remove_cti,
-            parallel_ccd=parallel_ccd,
-            parallel_roe=parallel_roe,
-            parallel_traps=parallel_traps,
-            parallel_express=parallel_express,
-            parallel_offset=parallel_offset,
-            parallel_window_range=parallel_window_range,
-            serial_ccd=serial_ccd,
-            serial_roe=serial_roe,
-            serial_traps=serial_traps,
-            serial_express=serial_express,
-            serial_offset=serial_offset,
-            serial_window_range=serial_window_range,
-            time_window_range=time_window_range,
+    if tolerance_norm not in ("max", "rms"):
+        raise ValueError(f"Unknown tolerance_norm: {tolerance_norm}")
+    if image_estimate is not None and np.shape(image_estimate) != np.shape(image):
+        raise ValueError(
+            f"image_estimate shape {np.shape(image_estimate)} does not match "
+            f"image shape {np.shape(image)}"
         )
 
-        # Improved estimate of image with CTI trails removed
-        image_remove_cti += image - image_add_cti
+    add_cti_kwargs = dict(
+        parallel_ccd=parallel_ccd,
+        parallel_roe=parallel_roe,
+        parallel_traps=parallel_traps,
+        parallel_express=parallel_express,
+        parallel_offset=parallel_offset,
+        parallel_window_range=parallel_window_range,
+        serial_ccd=serial_ccd,
+        serial_roe=serial_roe,
+        serial_traps=serial_traps,
+        serial_express=serial_express,
+        serial_offset=serial_offset,
+        serial_window_range=serial_window_range,
+        time_window_range=time_window_range,
+        n_workers=n_workers,
+    )
+
+    # Initialise the iterative estimate of removed CTI; don't modify the external arrays
+    image_remove_cti = np.array(
+        image if image_estimate is None else image_estimate, dtype=float
+    )
+    image_array = np.asarray(image)
+
+    # Columns still to be modelled, if converged ones can be frozen
+    freeze_columns = (
+        tolerance is not None and serial_traps is None and serial_window_range is None
+    )
+    active_columns = np.arange(image_array.shape[1])
+
+    # Start the worker processes once, for all the iterations
+    with contextlib.ExitStack() as stack:
+        if n_workers is not None and n_workers > 1:
+            add_cti_kwargs["executor"] = stack.enter_context(
+                column_block_pool(n_workers)
+            )
+
+        # Estimate the image with removed CTI more precisely each iteration
+        for iteration in range(iterations):
+
+            if freeze_columns:
+                image_add_cti = add_cti(
+                    image=image_remove_cti[:, active_columns], **add_cti_kwargs
+                )
+                update = image_array[:, active_columns] - image_add_cti
+                image_remove_cti[:, active_columns] += update
+            else:
+                image_add_cti = add_cti(image=image_remove_cti, **add_cti_kwargs)
+                update = image_array - image_add_cti
+
+                # Improved estimate of image with CTI trails removed
+                image_remove_cti += update
+
+            if tolerance is None:
+                continue
+
+            # Stop, or freeze the columns, once the update is small enough
+            if freeze_columns:
+                converged = _update_norm(update, tolerance_norm, axis=0) <= tolerance
+                active_columns = active_columns[~converged]
+                if len(active_columns) == 0:
+                    break
+            elif _update_norm(update, tolerance_norm) <= tolerance:
+                break
 
     # TODO : Implement as decorator
 
@@ -540,6 +785,13 @@ def remove_cti(
     return image_remove_cti
 
 
+def _update_norm(update, tolerance_norm, axis=None):
+    """ The size of a remove_cti() update, see its tolerance_norm. """
+    if tolerance_norm == "max":
+        return np.max(np.abs(update), axis=axis)
+    return np.sqrt(np.mean(np.square(update), axis=axis))
+
+
 def model_for_HST_ACS(date):
     """
     Return arcticpy objects that provide a preset CTI model for the Hubble Space
@@ -49,8 +49,19 @@ phase 2 is closer than phase 1:
 +----------- 
 """
 import numpy as np
+from collections import OrderedDict
 from copy import deepcopy
 
+# Express, monitor-traps, and save-trap-states matrices for the most recently
+# used ROE settings and image geometries, see ROEAbstract.express_matrices()
+_express_matrix_cache = OrderedDict()
+_express_matrix_cache_size = 32
+
+
+def clear_express_matrix_cache():
+    """ Empty the cache used by ROEAbstract.express_matrices(). """
+    _express_matrix_cache.clear()
+
 
 class ROEPhase(object):
     def __init__(
@@ -114,6 +125,93 @@ class ROEAbstract(object):
         self.dwell_times = dwell_times
         self.express_matrix_dtype = express_matrix_dtype
 
+    def express_matrices(self, pixels, express=0, offset=0, time_window_range=None):
+        """
+        The matrices of express multipliers, when to monitor traps, and when to
+        save trap states.
+
+        See express_matrix_and_monitor_traps_matrix_from_pixels_and_express()
+        and save_trap_states_matrix_from_express_matrix(). The results are
+        read-only and cached (for the last few distinct sets of inputs) by the
+        ROE settings, not the instance, so e.g. repeated add_cti() calls for
+        images of the same size skip building them.
+
+        Parameters
+        ----------
+        pixels, express, offset, time_window_range
+            See express_matrix_and_monitor_traps_matrix_from_pixels_and_express().
+
+        Returns
+        -------
+        express_matrix : [[float]]
+            The express multiplier value for each pixel-to-pixel transfer.
+
+        monitor_traps_matrix : [[bool]]
+            For each pixel-to-pixel transfer, set True if the release and
+            capture of charge needs to be monitored.
+
+        save_trap_states_matrix : [[bool]]
+            For each pixel-to-pixel transfer, set True to store the trap
+            occupancy levels.
+        """
+        key = self._express_matrix_cache_key(
+            pixels=pixels,
+            express=express,
+            offset=offset,
+            time_window_range=time_window_range,
+        )
+        if key is not None and key in _express_matrix_cache:
+            _express_matrix_cache.move_to_end(key)
+            return _express_matrix_cache[key]
+
+        (
+            express_matrix,
+            monitor_traps_matrix,
+        ) = self.express_matrix_and_monitor_traps_matrix_from_pixels_and_express(
+            pixels=pixels,
+            express=express,
+            offset=offset,
+            time_window_range=time_window_range,
+        )
+        save_trap_states_matrix = self.save_trap_states_matrix_from_express_matrix(
+            express_matrix=express_matrix
+        )
+        matrices = (express_matrix, monitor_traps_matrix, save_trap_states_matrix)
+
+        if key is not None:
+            for matrix in matrices:
+                matrix.setflags(write=False)
+            _express_matrix_cache[key] = matrices
+            if len(_express_matrix_cache) > _express_matrix_cache_size:
+                _express_matrix_cache.popitem(last=False)
+
+        return matrices
+
+    def _express_matrix_cache_key(self, pixels, express, offset, time_window_range):
+        """
+        The inputs and ROE settings that determine the express matrices, or
+        None if they should not be cached.
+        """
+        # ROEChargeInjection sets a default n_pixel_transfers on first use
+        if getattr(self, "n_pixel_transfers", 0) is None:
+            return None
+        if not isinstance(pixels, (int, range)):
+            pixels = tuple(pixels)
+        if time_window_range is not None:
+            time_window_range = range(time_window_range[0], time_window_range[-1] + 1)
+
+        return (
+            type(self),
+            self.express_matrix_dtype,
+            getattr(self, "empty_traps_for_first_transfers", None),
+            getattr(self, "n_pixel_transfers", None),
+            getattr(self, "n_pumps", None),
+            pixels,
+            express,
+            offset,
+            time_window_range,
+        )
+
     @property
     def dwell_times(self):
         return self._dwell_times
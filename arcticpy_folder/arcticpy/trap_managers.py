@@ -10,10 +10,39 @@ from arcticpy.traps import (
     TrapInstantCapture,
 )
 from arcticpy.ccd import CCD, CCDPhase
+from arcticpy import watermark_kernels
+
+
+# Implementation used for TrapManagerInstantCapture release and capture, see
+# set_watermark_backend()
+_watermark_backend = "numpy"
+
+
+def set_watermark_backend(backend):
+    """Choose how TrapManagerInstantCapture releases and captures electrons.
+
+    Parameters
+    ----------
+    backend : str
+        "numpy" (default) for the NumPy implementation, or "numba" to compile
+        watermark_kernels.release() and capture(), which give identical results
+        but skip the temporary arrays. Requires numba.
+    """
+    global _watermark_backend
+    if backend not in ("numpy", "numba"):
+        raise ValueError(f"Unknown watermark backend: {backend}")
+    if backend == "numba" and watermark_kernels.numba is None:
+        raise ImportError("The numba watermark backend requires numba")
+    _watermark_backend = backend
+
+
+def get_watermark_backend():
+    """ The current backend, see set_watermark_backend(). """
+    return _watermark_backend
 
 
 class AllTrapManager(UserList):
-    def __init__(self, traps, n_columns, max_n_transfers, ccd):
+    def __init__(self, traps, n_columns, max_n_transfers, ccd, dwell_times=None):
         """
         A list (of a list) of trap managers.
 
@@ -54,6 +83,11 @@ class AllTrapManager(UserList):
             access the number of phases per pixel, and the fractional volume of
             a pixel that is filled by a cloud of electrons.
 
+        dwell_times : [float] (opt.)
+            The dwell times of the clocking sequence, e.g. roe.dwell_times, for
+            which each trap manager precomputes its fill probabilities. See
+            TrapManager.fill_probabilities_from_dwell_time().
+
         Attributes
         ----------
         n_trapped_electrons_currently : float
@@ -109,12 +143,14 @@ class AllTrapManager(UserList):
                         max_n_transfers=max_n_transfers,
                     )
                 trap_manager.n_traps_per_pixel *= ccd.fraction_of_traps_per_phase[phase]
+                if dwell_times is not None:
+                    trap_manager.precompute_fill_probabilities(dwell_times)
                 trap_managers_this_phase.append(trap_manager)
 
             self.data.append(trap_managers_this_phase)
 
         # Initialise the empty trap state for future reference
-        self._saved_data = None
+        self._saved = False
         self._n_trapped_electrons_in_save = 0.0
         self._n_trapped_electrons_previously = 0.0
 
@@ -141,9 +177,11 @@ class AllTrapManager(UserList):
 
     def save(self):
         """ Save trap occupancy levels for future reference. """
-        # This stores far more than necessary. But extracting only the watermark
-        # arrays requires overhead.
-        self._saved_data = deepcopy(self.data)
+        # Only the active watermarks of each trap manager are snapshotted
+        for trap_manager_phase in self.data:
+            for trap_manager in trap_manager_phase:
+                trap_manager.save_watermarks()
+        self._saved = True
         self._n_trapped_electrons_in_save = self.n_trapped_electrons_currently
 
     def restore(self):
@@ -156,10 +194,12 @@ class AllTrapManager(UserList):
             self.n_trapped_electrons_currently - self._n_trapped_electrons_in_save
         )
         # Overwrite the current trap state
-        if self._saved_data is None:
+        if not self._saved:
             self.empty_all_traps()
         else:
-            self.data = deepcopy(self._saved_data)
+            for trap_manager_phase in self.data:
+                for trap_manager in trap_manager_phase:
+                    trap_manager.restore_watermarks()
 
 
 class TrapManager(object):
@@ -239,6 +279,14 @@ class TrapManager(object):
             dtype=float,
         )
 
+        # Fill probabilities for each dwell time, see
+        # fill_probabilities_from_dwell_time()
+        self._fill_probabilities = {}
+
+        # Snapshot of the active watermarks, see save_watermarks()
+        self._saved_watermarks = None
+        self._n_saved_watermarks = None
+
         # Trap rates
         self.capture_rates = np.array([trap.capture_rate for trap in traps])
         self.emission_rates = np.array([trap.emission_rate for trap in traps])
@@ -348,7 +396,13 @@ class TrapManager(object):
 
         fill_probabilities_from_release : float
             The fraction of traps that were full that stay full after release.
+
+        The (read-only) results are cached for each dwell time.
         """
+        fill_probabilities = self._fill_probabilities.get(dwell_time)
+        if fill_probabilities is not None:
+            return fill_probabilities
+
         # Common factor for capture and release probabilities
         exponential_factor = (
             1 - np.exp(-self.total_rates * dwell_time)
@@ -370,14 +424,44 @@ class TrapManager(object):
         # New fill fraction from only release
         fill_probabilities_from_release = np.exp(-self.emission_rates * dwell_time)
 
-        return (
+        fill_probabilities = (
             fill_probabilities_from_empty,
             fill_probabilities_from_full,
             fill_probabilities_from_release,
         )
+        for probabilities in fill_probabilities:
+            probabilities.setflags(write=False)
+        self._fill_probabilities[dwell_time] = fill_probabilities
+
+        return fill_probabilities
+
+    def precompute_fill_probabilities(self, dwell_times):
+        """Cache the fill probabilities for each of a list of dwell times.
+
+        Parameters
+        ----------
+        dwell_times : [float]
+            The times spent in each pixel or phase, e.g. roe.dwell_times.
+        """
+        for dwell_time in dwell_times:
+            self.fill_probabilities_from_dwell_time(dwell_time=dwell_time)
+
+    @property
+    def watermarks(self):
+        """ The trap watermarks, see TrapManager.__init__() """
+        return self._watermarks
+
+    @watermarks.setter
+    def watermarks(self, value):
+        self._watermarks = value
+        # Number of active watermark levels, found when next needed
+        self._n_active_watermarks = None
 
     def unset_watermark_index_from_watermarks(self, watermarks):
-        """Sum the number of electrons currently held in traps in each column.
+        """Find the first inactive watermark level.
+
+        For this manager's own watermarks, this uses the tracked number of
+        active levels instead of searching the whole array.
 
         Parameters
         ----------
@@ -389,6 +473,11 @@ class TrapManager(object):
         unset_watermark_index : int
             The index of the first inactive watermark.
         """
+        if watermarks is self._watermarks:
+            n_active = self.n_active_watermarks()
+            # As argmax() would give, 0 if there are no inactive levels
+            return n_active if n_active < watermarks.shape[1] else 0
+
         return np.argmax(watermarks[0, :, 0] == self.unset)
 
     def n_trapped_electrons_from_watermarks(
@@ -426,9 +515,74 @@ class TrapManager(object):
             axis=1,
         )
 
+    def n_active_watermarks(self):
+        """The number of watermark levels currently in use.
+
+        This is tracked as levels are captured, emptied and restored, and only
+        checked against the level on either side of the boundary, in case the
+        watermarks were edited in place. It is otherwise found by a search.
+        """
+        n_active = self._n_active_watermarks
+        volumes = self._watermarks[0, :, 0]
+        if (
+            n_active is None
+            or (n_active < len(volumes) and volumes[n_active] != self.unset)
+            or (n_active > 0 and volumes[n_active - 1] == self.unset)
+        ):
+            unset_levels = volumes == self.unset
+            if not unset_levels.any():
+                n_active = len(volumes)
+            else:
+                n_active = int(np.argmax(unset_levels))
+            self._n_active_watermarks = n_active
+
+        return n_active
+
     def empty_all_traps(self):
         """ Reset the trap watermarks for the next run of release and capture. """
-        self.watermarks.fill(self.unset)
+        # Levels above the active ones are already unset
+        self.watermarks[:, : self.n_active_watermarks()] = self.unset
+        self._n_active_watermarks = 0
+
+    def save_watermarks(self):
+        """Save a snapshot of the current watermarks.
+
+        Only the active levels are copied, into a buffer that is allocated on
+        first use and then reused, so the cost scales with the number of
+        watermarks in use rather than with the size of the watermark array.
+        """
+        n_active = self.n_active_watermarks()
+        if (
+            self._saved_watermarks is None
+            or self._saved_watermarks.shape != self.watermarks.shape
+        ):
+            self._saved_watermarks = np.empty_like(self.watermarks)
+        self._saved_watermarks[:, :n_active] = self.watermarks[:, :n_active]
+        self._n_saved_watermarks = n_active
+
+    def restore_watermarks(self):
+        """Restore the watermarks in place from the last save_watermarks()
+        snapshot, or empty all traps if nothing has been saved.
+        """
+        if self._n_saved_watermarks is None:
+            self.empty_all_traps()
+            return
+
+        n_saved = self._n_saved_watermarks
+        if self.watermarks.shape != self._saved_watermarks.shape:
+            # The watermark array was replaced since the save
+            self.watermarks = np.full(
+                self._saved_watermarks.shape, self.unset, dtype=float
+            )
+            n_active = 0
+        else:
+            n_active = self.n_active_watermarks()
+
+        self.watermarks[:, :n_saved] = self._saved_watermarks[:, :n_saved]
+        # Unset any levels that were made after the save
+        if n_active > n_saved:
+            self.watermarks[:, n_saved:n_active] = self.unset
+        self._n_active_watermarks = n_saved
 
     def watermark_index_above_cloud_from_cloud_fractional_volume(
         self, cloud_fractional_volume, watermarks, max_watermark_index
@@ -948,6 +1102,10 @@ class TrapManagerInstantCapture(TrapManager):
             The relevant subarray of the watermarks to update. i.e. not the
             fractional volumes, and only the levels that are doing release.
 
+        dwell_time : float
+            The time spent in this pixel or phase, in the same units as the
+            trap timescales.
+
         Returns
         -------
         watermark_values : np.ndarray
@@ -960,8 +1118,8 @@ class TrapManagerInstantCapture(TrapManager):
             fill_probabilities_from_release,
         ) = self.fill_probabilities_from_dwell_time(dwell_time=dwell_time)
 
-        # Update the fill fractions
-        return watermark_values * fill_probabilities_from_release
+        # Update the fill fractions of each trap species
+        return (watermark_values.T * fill_probabilities_from_release).T
 
     def BAK_n_electrons_released(self, dwell_time=1):
         """
@@ -1257,7 +1415,7 @@ class TrapManagerInstantCapture(TrapManager):
         watermarks : np.ndarray
             The updated watermarks. See TrapManager.__init__().
         """
-        # Find the highest active watermark
+        # Find the first inactive watermark
         unset_watermark_index = self.unset_watermark_index_from_watermarks(
             watermarks=self.watermarks
         )
@@ -1267,18 +1425,12 @@ class TrapManagerInstantCapture(TrapManager):
             watermarks=self.watermarks, unset_watermark_index=unset_watermark_index
         )
 
-        # Fill probabilities    ## could be done once at start (for each dwell time)
-        (
-            fill_probabilities_from_empty,
-            fill_probabilities_from_full,
-            fill_probabilities_from_release,
-        ) = self.fill_probabilities_from_dwell_time(dwell_time=dwell_time)
-
         # Release electrons from existing watermark levels
-        self.watermarks[2:, :unset_watermark_index] = (
-            self.watermarks[2:, :unset_watermark_index].T
-            * fill_probabilities_from_release
-        ).T
+        self.watermarks[
+            2:, :unset_watermark_index
+        ] = self.update_watermark_values_for_release(
+            self.watermarks[2:, :unset_watermark_index], dwell_time
+        )
 
         # Resulting numbers of electrons in traps in each column
         n_trapped_electrons_final = self.n_trapped_electrons_from_watermarks(
@@ -1333,14 +1485,17 @@ class TrapManagerInstantCapture(TrapManager):
         # to fill all the traps reached by the cloud volume
         watermarks_initial = deepcopy(self.watermarks)
 
-        # Find the first inactive watermark     ## can be known from row index!
+        # Find the first inactive watermark
         unset_watermark_index = self.unset_watermark_index_from_watermarks(
             watermarks=self.watermarks
         )
 
-        # Initial number of electrons in traps in each column
-        n_trapped_electrons_initial = self.n_trapped_electrons_from_watermarks(
-            watermarks=self.watermarks, unset_watermark_index=unset_watermark_index
+        # Initial number of electrons in traps in each column. Capture works
+        # with fill fractions, see TrapManagerTrackTime.n_electrons_captured()
+        n_trapped_electrons_initial = TrapManager.n_trapped_electrons_from_watermarks(
+            self,
+            watermarks=self.watermarks,
+            unset_watermark_index=unset_watermark_index,
         )
 
         # The fractional volume the electron cloud reaches in each pixel well
@@ -1369,19 +1524,24 @@ class TrapManagerInstantCapture(TrapManager):
         )
 
         # Indices and total volumes of the existing watermarks immediately above
-        # and below the new ones (if any)
-        if not True in bool_vol_gt_new_vol:
+        # and below the new ones, in the columns that have any
+        columns_above = np.any(bool_vol_gt_new_vol, axis=0)
+        columns_below = np.any(bool_vol_leq_new_vol, axis=0)
+        if not True in columns_above:
             watermark_indices_above = []
         else:
-            watermark_indices_above = np.argmin(vol_mask_gt_new_vol, axis=0)
-        if not True in bool_vol_leq_new_vol:
-            watermark_indices_below = []
+            watermark_indices_above = np.argmin(vol_mask_gt_new_vol, axis=0)[
+                columns_above
+            ]
+        if not True in columns_below:
             watermark_volumes_below = 0
         else:
             watermark_indices_below = np.argmax(vol_mask_leq_new_vol, axis=0)
-            watermark_volumes_below = self.watermarks[0].T[
-                self.column_indices, watermark_indices_below
-            ]
+            watermark_volumes_below = np.where(
+                columns_below,
+                self.watermarks[0].T[self.column_indices, watermark_indices_below],
+                0,
+            )
 
         # Set the new watermarks' individual volumes (new total volume minus
         # below's total volume)
@@ -1392,9 +1552,13 @@ class TrapManagerInstantCapture(TrapManager):
         # Update the above-watermarks' individual volumes (above's total volume
         # minus new total volume)
         if len(watermark_indices_above) > 0:
-            self.watermarks[1].T[self.column_indices, watermark_indices_above] = (
-                self.watermarks[0].T[self.column_indices, watermark_indices_above]
-                - self.watermarks[0, unset_watermark_index]
+            self.watermarks[1].T[
+                self.column_indices[columns_above], watermark_indices_above
+            ] = (
+                self.watermarks[0].T[
+                    self.column_indices[columns_above], watermark_indices_above
+                ]
+                - self.watermarks[0, unset_watermark_index, columns_above]
             )
 
         # Overwrite individual volumes to zero if total volume is zero
@@ -1412,8 +1576,10 @@ class TrapManagerInstantCapture(TrapManager):
             ] = 1
 
         # Resulting numbers of electrons in traps
-        n_trapped_electrons_final = self.n_trapped_electrons_from_watermarks(
-            watermarks=self.watermarks, unset_watermark_index=unset_watermark_index + 1
+        n_trapped_electrons_final = TrapManager.n_trapped_electrons_from_watermarks(
+            self,
+            watermarks=self.watermarks,
+            unset_watermark_index=unset_watermark_index + 1,
         )
 
         # Select columns with not enough available electrons to capture
@@ -1427,34 +1593,43 @@ class TrapManagerInstantCapture(TrapManager):
         # Limit the actual increase of the changed fill fractions to the
         # `enough` fraction of the attempted increase
         if True in bool_columns_not_enough:
-            enough = enough[bool_columns_not_enough]
 
             # Update fill fractions for each trap species
             for trap_index in range(self.n_trap_species):
                 # New watermarks
                 self.watermarks[
                     2 + trap_index, unset_watermark_index, bool_columns_not_enough
-                ] = enough
+                ] = enough[bool_columns_not_enough]
 
                 # Below-watermarks
                 if len(bool_vol_leq_new_vol) > 0:
+                    with np.errstate(invalid="ignore", over="ignore"):
+                        fill_fractions = (
+                            enough
+                            * self.watermarks[2 + trap_index, :unset_watermark_index]
+                            + (1 - enough)
+                            * watermarks_initial[2 + trap_index, :unset_watermark_index]
+                        )
                     self.watermarks[2 + trap_index, :unset_watermark_index][
                         bool_vol_leq_new_vol * bool_columns_not_enough
-                    ] = (
-                        enough * self.watermarks[2 + trap_index, :unset_watermark_index]
-                        + (1 - enough)
-                        * watermarks_initial[2 + trap_index, :unset_watermark_index]
-                    )[
-                        bool_vol_leq_new_vol * bool_columns_not_enough
-                    ]
+                    ] = fill_fractions[bool_vol_leq_new_vol * bool_columns_not_enough]
 
         # Resulting numbers of electrons in traps
-        n_trapped_electrons_final = self.n_trapped_electrons_from_watermarks(
-            watermarks=self.watermarks, unset_watermark_index=unset_watermark_index + 1
+        n_trapped_electrons_final = TrapManager.n_trapped_electrons_from_watermarks(
+            self,
+            watermarks=self.watermarks,
+            unset_watermark_index=unset_watermark_index + 1,
         )
 
+        self._watermark_added(unset_watermark_index)
+
         return n_trapped_electrons_final - n_trapped_electrons_initial
 
+    def _watermark_added(self, unset_watermark_index):
+        """ Track the active watermark level just made at unset_watermark_index. """
+        if self._n_active_watermarks == unset_watermark_index:
+            self._n_active_watermarks += 1
+
     def n_electrons_released_and_captured(
         self,
         n_free_electrons,
@@ -1496,6 +1671,19 @@ class TrapManagerInstantCapture(TrapManager):
         watermarks : np.ndarray
             The updated watermarks. See TrapManager.__init__().
         """
+        if (
+            _watermark_backend == "numba"
+            and type(self) is TrapManagerInstantCapture
+            and self.watermarks.dtype == np.float64
+            and isinstance(n_free_electrons, np.ndarray)
+            and n_free_electrons.dtype == np.float64
+        ):
+            return self._n_electrons_released_and_captured_compiled(
+                n_free_electrons=n_free_electrons,
+                ccd_filling_function=ccd_filling_function,
+                dwell_time=dwell_time,
+            )
+
         # Release
         n_electrons_released = self.n_electrons_released(dwell_time=dwell_time)
         n_free_electrons += n_electrons_released
@@ -1509,6 +1697,65 @@ class TrapManagerInstantCapture(TrapManager):
 
         return n_electrons_released - n_electrons_captured
 
+    def _n_electrons_released_and_captured_compiled(
+        self, n_free_electrons, ccd_filling_function, dwell_time
+    ):
+        """As n_electrons_released_and_captured(), using watermark_kernels.
+
+        The cloud volumes come from the (Python) well-filling function so are
+        found between the release and capture kernels.
+        """
+        unset_watermark_index = self.unset_watermark_index_from_watermarks(
+            watermarks=self.watermarks
+        )
+        n_traps_per_pixel = self.n_traps_per_pixel
+        fill_probabilities_from_release = self.fill_probabilities_from_dwell_time(
+            dwell_time=dwell_time
+        )[2]
+
+        n_trapped_electrons_initial = np.empty(self.n_columns)
+        n_trapped_electrons_final = np.empty(self.n_columns)
+        level_buffer = np.empty(self.watermarks.shape[1])
+        species_buffer = np.empty(self.n_trap_species)
+
+        # Release
+        watermark_kernels.release(
+            self.watermarks,
+            unset_watermark_index,
+            fill_probabilities_from_release,
+            n_traps_per_pixel,
+            n_trapped_electrons_initial,
+            n_trapped_electrons_final,
+            level_buffer,
+            species_buffer,
+        )
+        n_electrons_released = n_trapped_electrons_initial - n_trapped_electrons_final
+        n_free_electrons += n_electrons_released
+
+        # Capture
+        cloud_fractional_volumes = np.asarray(
+            self.fraction_of_traps_exposed_from_n_electrons(
+                n_electrons=n_free_electrons, ccd_filling_function=ccd_filling_function
+            ),
+            dtype=float,
+        )
+        n_electrons_captured = np.empty(self.n_columns)
+        watermark_kernels.capture(
+            self.watermarks,
+            unset_watermark_index,
+            np.broadcast_to(cloud_fractional_volumes, self.n_columns),
+            n_free_electrons,
+            n_traps_per_pixel,
+            n_trapped_electrons_final,
+            n_electrons_captured,
+            level_buffer,
+            species_buffer,
+            np.empty((self.n_trap_species, self.watermarks.shape[1])),
+        )
+        self._watermark_added(unset_watermark_index)
+
+        return n_electrons_released - n_electrons_captured
+
 
 class TrapManagerTrackTime(TrapManagerInstantCapture):
     """Track the time elapsed since capture instead of the fill fraction.
@@ -1518,132 +1765,331 @@ class TrapManagerTrackTime(TrapManagerInstantCapture):
 
     Note the different watermark contents:
     watermarks : np.ndarray
-        Array of watermark fractional volumes and times to describe the trap
-        states. Lists each (active) watermark fractional volume and and the
-        corresponding total time elapsed since the traps were filled for
-        each trap species. Inactive elements are set to 0.
-
-        [[volume, time_elapsed, time_elapsed, ...],
-         [volume, time_elapsed, time_elapsed, ...],
-         ...                                       ]
+        Array of watermarks to describe the trap states, as for TrapManager but
+        with the total time elapsed since the traps were filled in place of the
+        fill fraction of each trap species.
+
+        [
+            # Total volumes
+            [[1st column, 2nd column, ...], [1st column, 2nd column, ...], ...],
+            # Individual volumes
+            [[1st column, 2nd column, ...], [1st column, 2nd column, ...], ...],
+            # Elapsed times, each trap species
+            [[1st column, 2nd column, ...], [1st column, 2nd column, ...], ...],
+            ...,
+        ]
+
+    The conversions to and from fill fractions act on whole watermark slices at
+    once. Species with a single exponential release timescale use the closed
+    form, and continuum species use their (optionally tabulated, see
+    TrapLifetimeContinuumAbstract.tabulate()) fill fraction functions.
     """
 
+    def __init__(self, traps, n_columns, max_n_transfers):
+        super(TrapManagerTrackTime, self).__init__(
+            traps=traps, n_columns=n_columns, max_n_transfers=max_n_transfers
+        )
+
+        # Which species have fill fractions exp(-time_elapsed / timescale)
+        self.closed_form_species = np.array(
+            [
+                type(trap).fill_fraction_from_time_elapsed
+                is Trap.fill_fraction_from_time_elapsed
+                for trap in self.traps
+            ],
+            dtype=bool,
+        )
+
+        # Reused buffers for the converted watermarks, allocated on first use
+        self._fill_fraction_buffer = None
+        self._elapsed_time_buffer = None
+
     @property
     def filled_watermark_value(self):
         """ The value for a filled watermark level, here 0 is an elapsed time """
         return 0
 
-    def watermarks_converted_to_fill_fractions_from_elapsed_times(self, watermarks):
-        """Convert the watermark values to fill fractions.
+    def _buffer(self, name, shape):
+        """ A reusable work array with the given shape. """
+        buffer = getattr(self, name)
+        if buffer is None or buffer.shape != shape:
+            buffer = np.empty(shape)
+            setattr(self, name, buffer)
+
+        return buffer
+
+    def _fill_fractions_of_species(self, trap_index, elapsed_times, out):
+        """ The fill fractions of one trap species, see the public method. """
+        trap = self.traps[trap_index]
+        if self.closed_form_species[trap_index]:
+            np.multiply(elapsed_times, -trap.emission_rate, out=out)
+            np.exp(out, out=out)
+        elif getattr(trap, "is_tabulated", False):
+            out[...] = trap.fill_fraction_from_time_elapsed(elapsed_times)
+        else:
+            out[...] = np.reshape(
+                [
+                    trap.fill_fraction_from_time_elapsed(time_elapsed)
+                    for time_elapsed in np.ravel(elapsed_times)
+                ],
+                np.shape(elapsed_times),
+            )
+
+        return out
+
+    def _elapsed_times_of_species(self, trap_index, fill_fractions, out):
+        """ The elapsed times of one trap species, see the public method. """
+        trap = self.traps[trap_index]
+        full = fill_fractions == 1
+        if self.closed_form_species[trap_index]:
+            # Completely empty traps have an infinite elapsed time
+            with np.errstate(divide="ignore"):
+                np.log(fill_fractions, out=out)
+            np.multiply(out, -trap.release_timescale, out=out)
+        else:
+            out[...] = np.reshape(
+                [
+                    self.filled_watermark_value
+                    if fill_fraction == 1
+                    else trap.time_elapsed_from_fill_fraction(fill_fraction)
+                    for fill_fraction in np.ravel(fill_fractions)
+                ],
+                np.shape(fill_fractions),
+            )
+
+        # Exactly the filled value for full traps
+        out[full] = self.filled_watermark_value
+
+        return out
+
+    def fill_fractions_from_elapsed_times(self, elapsed_times, out=None):
+        """Convert the elapsed-time watermark values to fill fractions.
 
         Parameters
         ----------
-        watermarks : np.ndarray
-            The watermarks. See TrapManager.__init__().
+        elapsed_times : np.ndarray
+            The elapsed times of each trap species, i.e. watermarks[2:] or a
+            slice of the levels in it, with shape (n_trap_species, ...).
+
+        out : np.ndarray (opt.)
+            The array to write the fill fractions into, which may be
+            elapsed_times itself. Otherwise a new array is returned.
+
+        Returns
+        -------
+        fill_fractions : np.ndarray
+            The fill fractions, with the same shape as elapsed_times.
         """
-        watermarks = deepcopy(watermarks)
+        if out is None:
+            out = np.empty(np.shape(elapsed_times))
 
-        # Convert to fill fractions
-        for level in range(np.argmax(watermarks[:, 0] == 0)):
-            for i_trap, trap in enumerate(self.traps):
-                watermarks[level, 1 + i_trap] = trap.fill_fraction_from_time_elapsed(
-                    time_elapsed=watermarks[level, 1 + i_trap]
-                )
+        for trap_index in range(self.n_trap_species):
+            self._fill_fractions_of_species(
+                trap_index=trap_index,
+                elapsed_times=elapsed_times[trap_index],
+                out=out[trap_index],
+            )
 
-        return watermarks
+        return out
 
-    def watermarks_converted_to_elapsed_times_from_fill_fractions(self, watermarks):
-        """Convert the watermark values to elapsed times.
+    def elapsed_times_from_fill_fractions(self, fill_fractions, out=None):
+        """Convert fill-fraction watermark values to elapsed times.
 
         Parameters
         ----------
-        watermarks : np.ndarray
-            The watermarks. See TrapManager.__init__().
+        fill_fractions : np.ndarray
+            The fill fractions of each trap species, with shape
+            (n_trap_species, ...).
+
+        out : np.ndarray (opt.)
+            The array to write the elapsed times into, which may be
+            fill_fractions itself. Otherwise a new array is returned.
+
+        Returns
+        -------
+        elapsed_times : np.ndarray
+            The elapsed times, with the same shape as fill_fractions.
         """
-        watermarks = deepcopy(watermarks)
+        if out is None:
+            out = np.empty(np.shape(fill_fractions))
 
-        # Convert to elapsed times
-        for level in range(np.argmax(watermarks[:, 0] == 0)):
-            for i_trap, trap in enumerate(self.traps):
-                watermarks[level, 1 + i_trap] = trap.time_elapsed_from_fill_fraction(
-                    fill_fraction=watermarks[level, 1 + i_trap]
-                )
+        for trap_index in range(self.n_trap_species):
+            self._elapsed_times_of_species(
+                trap_index=trap_index,
+                fill_fractions=fill_fractions[trap_index],
+                out=out[trap_index],
+            )
 
-        return watermarks
+        return out
 
-    def n_trapped_electrons_from_watermarks(self, watermarks):
-        """Sum the total number of electrons currently held in traps.
+    def watermarks_converted_to_fill_fractions_from_elapsed_times(
+        self, watermarks, unset_watermark_index=None, out=None
+    ):
+        """Convert the watermark values to fill fractions.
 
         Parameters
         ----------
         watermarks : np.ndarray
             The watermarks. See TrapManager.__init__().
+
+        unset_watermark_index : int (opt.)
+            The index of the first inactive watermark.
+
+        out : np.ndarray (opt.)
+            The array to write the converted watermarks into. Only the active
+            levels are written. Otherwise a copy of the watermarks is returned.
+
+        Returns
+        -------
+        watermarks : np.ndarray
+            The watermarks with fill fractions instead of elapsed times.
         """
-        # Convert to fill fractions
-        watermarks = self.watermarks_converted_to_fill_fractions_from_elapsed_times(
-            watermarks=watermarks
-        )
+        if unset_watermark_index is None:
+            unset_watermark_index = self.unset_watermark_index_from_watermarks(
+                watermarks=watermarks
+            )
+        if out is None:
+            out = watermarks.copy()
+        else:
+            out[:2, :unset_watermark_index] = watermarks[:2, :unset_watermark_index]
 
-        return np.sum(
-            (watermarks[:, 0] * watermarks[:, 1:].T).T * self.n_traps_per_pixel
+        self.fill_fractions_from_elapsed_times(
+            elapsed_times=watermarks[2:, :unset_watermark_index],
+            out=out[2:, :unset_watermark_index],
         )
 
-    def updated_watermarks_from_capture_not_enough(
-        self, watermarks, watermarks_initial, enough
+        return out
+
+    def watermarks_converted_to_elapsed_times_from_fill_fractions(
+        self, watermarks, unset_watermark_index=None, out=None
     ):
-        """
-        Tweak trap watermarks for capturing electrons when not enough are
-        available to fill every trap below the cloud fractional volume (rare!).
+        """Convert the watermark values to elapsed times.
 
         Parameters
         ----------
         watermarks : np.ndarray
-            The current watermarks after attempted capture. See
-            TrapManager.__init__().
+            The watermarks with fill fractions instead of elapsed times.
 
-        watermarks_initial : np.ndarray
-            The initial watermarks before capture, but with updated fractional
-            volumes to match the current watermarks.
+        unset_watermark_index : int (opt.)
+            The index of the first inactive watermark.
 
-        enough : float
-            The ratio of available electrons to traps up to this fractional
-            volume.
+        out : np.ndarray (opt.)
+            The array to write the converted watermarks into. Only the active
+            levels are written. Otherwise a copy of the watermarks is returned.
 
         Returns
         -------
         watermarks : np.ndarray
-            The updated watermarks. See TrapManager.__init__().
+            The watermarks. See TrapManager.__init__().
         """
-        # Convert to fill fractions
-        for level in range(np.argmax(watermarks[:, 0] == 0)):
-            for i_trap, trap in enumerate(self.traps):
-                watermarks[level, i_trap] = trap.fill_fraction_from_time_elapsed(
-                    time_elapsed=watermarks[level, i_trap]
-                )
-                watermarks_initial[
-                    level, i_trap
-                ] = trap.fill_fraction_from_time_elapsed(
-                    time_elapsed=watermarks_initial[level, i_trap]
-                )
+        if unset_watermark_index is None:
+            unset_watermark_index = self.unset_watermark_index_from_watermarks(
+                watermarks=watermarks
+            )
+        if out is None:
+            out = watermarks.copy()
+        else:
+            out[:2, :unset_watermark_index] = watermarks[:2, :unset_watermark_index]
 
-        # Update the fill fractions in the standard way
-        watermarks = super(
-            TrapManagerTrackTime, self
-        ).updated_watermarks_from_capture_not_enough(
-            self,
+        self.elapsed_times_from_fill_fractions(
+            fill_fractions=watermarks[2:, :unset_watermark_index],
+            out=out[2:, :unset_watermark_index],
+        )
+
+        return out
+
+    def n_trapped_electrons_from_watermarks(
+        self, watermarks, unset_watermark_index=None
+    ):
+        """Sum the number of electrons currently held in traps in each column.
+
+        Parameters
+        ----------
+        watermarks : np.ndarray
+            The watermarks. See TrapManager.__init__().
+
+        unset_watermark_index : int (opt.)
+            The index of the first inactive watermark.
+
+        Returns
+        -------
+        n_trapped_electrons : float
+            The total number of currently trapped electrons in each column.
+        """
+        if unset_watermark_index is None:
+            unset_watermark_index = self.unset_watermark_index_from_watermarks(
+                watermarks=watermarks
+            )
+
+        # Convert to fill fractions
+        watermarks = self.watermarks_converted_to_fill_fractions_from_elapsed_times(
             watermarks=watermarks,
-            watermarks_initial=watermarks_initial,
-            enough=enough,
+            unset_watermark_index=unset_watermark_index,
+            out=self._buffer("_fill_fraction_buffer", watermarks.shape),
         )
 
-        # Convert back to elapsed times
-        for level in range(np.argmax(watermarks[:, 0] == 0)):
-            for i_trap, trap in enumerate(self.traps):
-                watermarks[level, i_trap] = trap.time_elapsed_from_fill_fraction(
-                    fill_fraction=watermarks[level, i_trap]
-                )
+        return super(TrapManagerTrackTime, self).n_trapped_electrons_from_watermarks(
+            watermarks=watermarks, unset_watermark_index=unset_watermark_index
+        )
 
-        return watermarks
+    def n_electrons_captured(
+        self,
+        n_free_electrons,
+        ccd_filling_function,
+        dwell_time=1,
+        express_multiplier=1,
+    ):
+        """
+        Capture electrons in traps and update the trap watermarks.
+
+        The capture is done as for TrapManagerInstantCapture with the active
+        watermarks temporarily converted to fill fractions. Only the values
+        changed by capture are converted back, so the elapsed times of the
+        other levels are kept exactly.
+
+        See TrapManagerInstantCapture.n_electrons_captured() for the parameters.
+        """
+        unset_watermark_index = self.unset_watermark_index_from_watermarks(
+            watermarks=self.watermarks
+        )
+        values = self.watermarks[2:, :unset_watermark_index]
+        elapsed_times = self._buffer("_elapsed_time_buffer", self.watermarks.shape)[
+            2:, :unset_watermark_index
+        ]
+        fill_fractions = self._buffer("_fill_fraction_buffer", self.watermarks.shape)[
+            2:, :unset_watermark_index
+        ]
+
+        # Convert to fill fractions in place, keeping the initial values
+        elapsed_times[:] = values
+        self.fill_fractions_from_elapsed_times(elapsed_times=values, out=values)
+        fill_fractions[:] = values
+
+        n_electrons_captured = super(TrapManagerTrackTime, self).n_electrons_captured(
+            n_free_electrons,
+            ccd_filling_function=ccd_filling_function,
+            dwell_time=dwell_time,
+            express_multiplier=express_multiplier,
+        )
+
+        # Convert back, to the initial times where the fill fraction is unchanged
+        for trap_index in range(self.n_trap_species):
+            changed = values[trap_index] != fill_fractions[trap_index]
+            changed_fill_fractions = values[trap_index][changed]
+            elapsed_times[trap_index][changed] = self._elapsed_times_of_species(
+                trap_index=trap_index,
+                fill_fractions=changed_fill_fractions,
+                out=changed_fill_fractions,
+            )
+        values[:] = elapsed_times
+
+        # The new watermark level
+        self.elapsed_times_from_fill_fractions(
+            fill_fractions=self.watermarks[2:, unset_watermark_index],
+            out=self.watermarks[2:, unset_watermark_index],
+        )
+
+        return n_electrons_captured
 
     def update_watermark_values_for_release(self, watermark_values, dwell_time):
         """
@@ -1656,6 +2102,10 @@ class TrapManagerTrackTime(TrapManagerInstantCapture):
             fractional volumes, and only the elapsed times of the levels that
             are doing release.
 
+        dwell_time : float
+            The time spent in this pixel or phase, in the same units as the
+            trap timescales.
+
         Returns
         -------
         watermark_values : np.ndarray
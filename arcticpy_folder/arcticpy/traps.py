@@ -1,5 +1,7 @@
+import bisect
+import functools
 import numpy as np
-from scipy import integrate, optimize
+from scipy import integrate, interpolate, optimize
 from copy import deepcopy
 from arcticpy import util
 
@@ -273,6 +275,263 @@ class TrapLifetimeContinuumAbstract(TrapInstantCapture):
         self.release_timescale_mu = release_timescale_mu
         self.release_timescale_sigma = release_timescale_sigma
 
+        # Interpolation tables, if enabled by tabulate()
+        self._tables = None
+
+    @property
+    def is_tabulated(self):
+        """ Whether the interpolation tables from tabulate() are in use. """
+        return self._tables is not None
+
+    def tabulate(self, tolerance=1e-6, time_range=None):
+        """Use interpolation tables instead of integrating for every call.
+
+        The fill fraction and the electrons released are smooth, monotonically
+        decreasing functions of the elapsed time, so they are tabulated on a
+        log-time grid and interpolated with monotonic (PCHIP) cubics. The grid
+        is refined until the interpolation matches the exact integrals at the
+        grid midpoints to within the tolerance. The inverse mapping for
+        time_elapsed_from_fill_fraction() uses the same fill-fraction table.
+
+        The electrons-released tables are built on demand, once per dwell time.
+        Times (or fill fractions) beyond the tabulated range fall back to the
+        exact calculation.
+
+        Parameters
+        ----------
+        tolerance : float or None
+            The maximum absolute interpolation error in the fill fraction (or
+            the fraction of electrons released). Smaller values take longer to
+            tabulate. None removes any tables and restores the exact
+            calculations.
+
+        time_range : [float, float] or None
+            The minimum and maximum elapsed times to tabulate. By default, a
+            range that spans the distribution of release timescales, from well
+            before any traps have released to well after all of them have.
+        """
+        if tolerance is None:
+            self._tables = None
+            return
+
+        if time_range is None:
+            # Generous for a log-normal-like distribution
+            width = 8 * (self.release_timescale_sigma or 0) + np.log(1e3)
+            time_range = (
+                self.release_timescale_mu * np.exp(-width),
+                self.release_timescale_mu * np.exp(width),
+            )
+        time_min, time_max = time_range
+        if not 0 < time_min < time_max:
+            raise ValueError(
+                "time_range must satisfy 0 < min < max, not %s" % (time_range,)
+            )
+
+        self._tables = {
+            "tolerance": tolerance,
+            "log_time_range": (np.log(time_min), np.log(time_max)),
+            "electrons_released": {},
+        }
+
+        # Fill fraction, and its inverse from the same tabulated points
+        log_times, fill_fractions = self._tabulated_log_time_function(
+            function=self._fill_fraction_from_time_elapsed_exact
+        )
+        self._tables["fill_fraction"] = self._table_from_log_time_function(
+            log_times=log_times,
+            values=fill_fractions,
+            value_at_time_zero=1,
+        )
+
+        # The fill fraction saturates at 1 and 0 at the ends of the range, so
+        # keep only the points that are strictly decreasing for the inverse,
+        # which is interpolated in log fill fraction to resolve the tail
+        keep = (np.append(np.diff(fill_fractions) < 0, False)) & (fill_fractions > 0)
+        fill_fractions = fill_fractions[keep]
+        log_times = log_times[keep]
+        self._tables["time_elapsed"] = self._interpolant_table(
+            x=np.log(fill_fractions[::-1]), y=log_times[::-1]
+        )
+        self._tables["time_elapsed"].update(
+            fill_fraction_range=(fill_fractions[-1], fill_fractions[0]),
+            time_min=np.exp(log_times[0]),
+        )
+
+    def _tabulated_log_time_function(self, function):
+        """Evaluate a function of the elapsed time on a refined log-time grid.
+
+        Starting from a coarse grid, the number of points is doubled until a
+        monotonic cubic interpolation through them matches the function at the
+        midpoints to within the table tolerance.
+
+        Parameters
+        ----------
+        function : func
+            The (scalar) function of the elapsed time to tabulate.
+
+        Returns
+        -------
+        log_times : np.ndarray
+            The natural log of the tabulated elapsed times.
+
+        values : np.ndarray
+            The function evaluated at each elapsed time.
+        """
+        log_time_min, log_time_max = self._tables["log_time_range"]
+        n_points_per_decade = 10
+        n_points = int(
+            np.ceil((log_time_max - log_time_min) / np.log(10) * n_points_per_decade)
+        )
+        log_times = np.linspace(log_time_min, log_time_max, n_points + 1)
+        values = np.array([function(np.exp(log_time)) for log_time in log_times])
+
+        # Refine up to a few hundred points per decade, beyond which the
+        # numerical integration itself is typically the limiting accuracy
+        for i_refine in range(5):
+            mid_log_times = 0.5 * (log_times[1:] + log_times[:-1])
+            mid_values = np.array(
+                [function(np.exp(log_time)) for log_time in mid_log_times]
+            )
+            interpolated = interpolate.PchipInterpolator(log_times, values)(
+                mid_log_times
+            )
+
+            # Interleave the midpoints for the next iteration either way
+            all_log_times = np.empty(2 * len(log_times) - 1)
+            all_log_times[0::2] = log_times
+            all_log_times[1::2] = mid_log_times
+            all_values = np.empty(2 * len(values) - 1)
+            all_values[0::2] = values
+            all_values[1::2] = mid_values
+            log_times, values = all_log_times, all_values
+
+            # Leave a margin since the midpoints are the furthest from the nodes
+            if np.max(np.abs(interpolated - mid_values)) < self._tables["tolerance"] / 4:
+                break
+
+        # Remove any wobbles from the numerical integration
+        values = np.minimum.accumulate(values)
+
+        return log_times, values
+
+    @staticmethod
+    def _interpolant_table(x, y):
+        """Make a monotonic cubic interpolant, with a fast scalar lookup.
+
+        Parameters
+        ----------
+        x, y : np.ndarray
+            The points to interpolate, with x strictly increasing.
+
+        Returns
+        -------
+        table : dict
+            The interpolant and its knots and polynomial coefficients as lists
+            for the scalar lookup in _evaluate_interpolant().
+        """
+        interpolant = interpolate.PchipInterpolator(x, y)
+
+        return {
+            "interpolant": interpolant,
+            "knots": interpolant.x.tolist(),
+            "coefficients": interpolant.c.T.tolist(),
+        }
+
+    @staticmethod
+    def _evaluate_interpolant(table, x):
+        """Evaluate an interpolant from _interpolant_table() at a scalar x.
+
+        Calling the scipy interpolant has a much larger overhead than the cubic
+        itself, which dominates for the single values used by the trap
+        managers.
+        """
+        knots = table["knots"]
+        i_knot = min(max(bisect.bisect_right(knots, x) - 1, 0), len(knots) - 2)
+        dx = x - knots[i_knot]
+        c_3, c_2, c_1, c_0 = table["coefficients"][i_knot]
+
+        return ((c_3 * dx + c_2) * dx + c_1) * dx + c_0
+
+    def _table_from_log_time_function(self, log_times, values, value_at_time_zero):
+        """Make a table entry from a tabulated function of the elapsed time.
+
+        Parameters
+        ----------
+        log_times, values : np.ndarray
+            See _tabulated_log_time_function().
+
+        value_at_time_zero : float
+            The function value at zero elapsed time, to interpolate linearly
+            to from the start of the log-time grid.
+
+        Returns
+        -------
+        table : dict
+            The interpolant and its range.
+        """
+        table = self._interpolant_table(x=log_times, y=values)
+        table.update(
+            time_min=np.exp(log_times[0]),
+            log_time_max=log_times[-1],
+            value_min=values[0],
+            value_at_time_zero=value_at_time_zero,
+        )
+
+        return table
+
+    @classmethod
+    def _interpolated_from_table(cls, table, time_elapsed, exact_function):
+        """Look up a tabulated function of the elapsed time.
+
+        Parameters
+        ----------
+        table : dict
+            See _table_from_log_time_function().
+
+        time_elapsed : float or np.ndarray
+            The elapsed time(s).
+
+        exact_function : func
+            The (scalar) exact function to use beyond the tabulated range.
+
+        Returns
+        -------
+        value : float or np.ndarray
+            The function value(s), with the same shape as time_elapsed.
+        """
+        if np.ndim(time_elapsed) == 0:
+            # Linearly from time zero to the start of the grid
+            if time_elapsed < table["time_min"]:
+                return table["value_at_time_zero"] + (
+                    table["value_min"] - table["value_at_time_zero"]
+                ) * (max(time_elapsed, 0) / table["time_min"])
+
+            log_time = np.log(time_elapsed)
+            # Exactly beyond the end of the grid
+            if log_time > table["log_time_max"]:
+                return exact_function(time_elapsed)
+
+            return cls._evaluate_interpolant(table, log_time)
+
+        times = np.asarray(time_elapsed, dtype=float)
+        values = np.empty(times.shape)
+
+        early = times < table["time_min"]
+        values[early] = table["value_at_time_zero"] + (
+            table["value_min"] - table["value_at_time_zero"]
+        ) * (np.maximum(times[early], 0) / table["time_min"])
+
+        with np.errstate(divide="ignore"):
+            log_times = np.log(times)
+        late = log_times > table["log_time_max"]
+        tabulated = ~(early | late)
+        values[tabulated] = table["interpolant"](log_times[tabulated])
+
+        for index in zip(*np.nonzero(late)):
+            values[index] = exact_function(times[index])
+
+        return values
+
     def fill_fraction_from_time_elapsed(self, time_elapsed):
         """Calculate the fraction of filled traps after a certain time_elapsed.
 
@@ -287,6 +546,17 @@ class TrapLifetimeContinuumAbstract(TrapInstantCapture):
         fill_fraction : float
             The fraction of filled traps.
         """
+        if self._tables is not None:
+            return self._interpolated_from_table(
+                table=self._tables["fill_fraction"],
+                time_elapsed=time_elapsed,
+                exact_function=self._fill_fraction_from_time_elapsed_exact,
+            )
+
+        return self._fill_fraction_from_time_elapsed_exact(time_elapsed)
+
+    def _fill_fraction_from_time_elapsed_exact(self, time_elapsed):
+        """ See fill_fraction_from_time_elapsed(). """
 
         def integrand(release_timescale, time_elapsed, mu, sigma):
             return self.distribution_of_traps_with_lifetime(
@@ -319,9 +589,35 @@ class TrapLifetimeContinuumAbstract(TrapInstantCapture):
         time_elapsed : float
             The time elapsed, in the same units as the trap timescales.
         """
+        if self._tables is not None:
+            table = self._tables["time_elapsed"]
+            fill_fraction_min, fill_fraction_max = table["fill_fraction_range"]
+
+            # Linearly from fill fraction 1 at time zero to the start of the grid
+            if fill_fraction >= fill_fraction_max:
+                return (
+                    table["time_min"]
+                    * max(1 - fill_fraction, 0)
+                    / (1 - fill_fraction_max)
+                )
+            elif fill_fraction >= fill_fraction_min:
+                return np.exp(
+                    self._evaluate_interpolant(table, np.log(fill_fraction))
+                )
+
+        return self._time_elapsed_from_fill_fraction_exact(fill_fraction)
+
+    def _time_elapsed_from_fill_fraction_exact(self, fill_fraction):
+        """ See time_elapsed_from_fill_fraction(). """
         # Crudely iterate to find the time that gives the required fill fraction
         def find_time(time_elapsed):
-            return self.fill_fraction_from_time_elapsed(time_elapsed) - fill_fraction
+            # fsolve passes a length-1 array
+            return (
+                self._fill_fraction_from_time_elapsed_exact(
+                    float(np.squeeze(time_elapsed))
+                )
+                - fill_fraction
+            )
 
         time_elapsed = optimize.fsolve(find_time, 0.1 * self.release_timescale_mu)[0]
 
@@ -348,6 +644,39 @@ class TrapLifetimeContinuumAbstract(TrapInstantCapture):
         electrons_released : float
             The number of released electrons.
         """
+        if self._tables is not None:
+            table = self._tables["electrons_released"].get(dwell_time)
+            if table is None:
+                # A partial rather than a closure, so the trap can be pickled
+                electrons_released = functools.partial(
+                    self._electrons_released_from_time_elapsed_and_dwell_time_exact,
+                    dwell_time=dwell_time,
+                )
+                log_times, values = self._tabulated_log_time_function(
+                    function=electrons_released
+                )
+                table = self._table_from_log_time_function(
+                    log_times=log_times,
+                    values=values,
+                    value_at_time_zero=electrons_released(0),
+                )
+                table["exact_function"] = electrons_released
+                self._tables["electrons_released"][dwell_time] = table
+
+            return self._interpolated_from_table(
+                table=table,
+                time_elapsed=time_elapsed,
+                exact_function=table["exact_function"],
+            )
+
+        return self._electrons_released_from_time_elapsed_and_dwell_time_exact(
+            time_elapsed=time_elapsed, dwell_time=dwell_time
+        )
+
+    def _electrons_released_from_time_elapsed_and_dwell_time_exact(
+        self, time_elapsed, dwell_time=1
+    ):
+        """ See electrons_released_from_time_elapsed_and_dwell_time(). """
 
         def integrand(release_timescale, time_elapsed, dwell_time, mu, sigma):
             return (
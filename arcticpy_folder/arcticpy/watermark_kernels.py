@@ -0,0 +1,272 @@
+"""
+Compiled kernels for the release and capture of electrons by
+TrapManagerInstantCapture, using numba if it is installed.
+
+These reproduce the NumPy implementation in trap_managers.py bit for bit,
+including the order of floating-point operations in its sums, but work through
+the active watermarks of one column at a time without temporary arrays. See
+TrapManagerInstantCapture.n_electrons_released_and_captured().
+"""
+import numpy as np
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+
+def _jit(function):
+    """ Compile with numba if available, or leave as plain Python. """
+    if numba is None:
+        return function
+    return numba.njit(cache=True, error_model="numpy")(function)
+
+
+@_jit
+def _block_sum(values, start, n):
+    """Sum up to 128 values as in NumPy's pairwise summation."""
+    if n < 8:
+        total = 0.0
+        for i in range(start, start + n):
+            total += values[i]
+        return total
+    r0 = values[start]
+    r1 = values[start + 1]
+    r2 = values[start + 2]
+    r3 = values[start + 3]
+    r4 = values[start + 4]
+    r5 = values[start + 5]
+    r6 = values[start + 6]
+    r7 = values[start + 7]
+    i = 8
+    while i < n - n % 8:
+        r0 += values[start + i]
+        r1 += values[start + i + 1]
+        r2 += values[start + i + 2]
+        r3 += values[start + i + 3]
+        r4 += values[start + i + 4]
+        r5 += values[start + i + 5]
+        r6 += values[start + i + 6]
+        r7 += values[start + i + 7]
+        i += 8
+    total = ((r0 + r1) + (r2 + r3)) + ((r4 + r5) + (r6 + r7))
+    while i < n:
+        total += values[start + i]
+        i += 1
+    return total
+
+
+@_jit
+def _pairwise_sum(values, start, n):
+    """Sum values[start : start + n] in the same order as NumPy's pairwise
+    summation over a contiguous axis.
+
+    NumPy splits the values recursively into halves (rounded to multiples of 8)
+    until there are at most 128. This walks the same tree with an explicit
+    stack, since numba can't cache recursive functions.
+    """
+    if n <= 128:
+        return _block_sum(values, start, n)
+
+    # Pending (start, n, number of halves done) and finished partial sums
+    max_depth = 64
+    stack_start = np.empty(max_depth, dtype=np.int64)
+    stack_n = np.empty(max_depth, dtype=np.int64)
+    stack_state = np.empty(max_depth, dtype=np.int64)
+    sums = np.empty(max_depth + 1)
+    i_stack = 0
+    i_sums = 0
+    stack_start[0] = start
+    stack_n[0] = n
+    stack_state[0] = 0
+    while i_stack >= 0:
+        node_start = stack_start[i_stack]
+        node_n = stack_n[i_stack]
+        if node_n <= 128:
+            sums[i_sums] = _block_sum(values, node_start, node_n)
+            i_sums += 1
+            i_stack -= 1
+            continue
+        n_half = node_n // 2
+        n_half -= n_half % 8
+        state = stack_state[i_stack]
+        stack_state[i_stack] = state + 1
+        if state == 0:
+            child_start = node_start
+            child_n = n_half
+        elif state == 1:
+            child_start = node_start + n_half
+            child_n = node_n - n_half
+        else:
+            sums[i_sums - 2] = sums[i_sums - 2] + sums[i_sums - 1]
+            i_sums -= 1
+            i_stack -= 1
+            continue
+        i_stack += 1
+        stack_start[i_stack] = child_start
+        stack_n[i_stack] = child_n
+        stack_state[i_stack] = 0
+    return sums[0]
+
+
+@_jit
+def _n_trapped_electrons(
+    watermarks, n_levels, n_traps_per_pixel, column, pairwise, level_buffer,
+    species_buffer
+):
+    """The number of trapped electrons in one column, as
+    TrapManager.n_trapped_electrons_from_watermarks().
+
+    NumPy sums over watermark levels sequentially when there are several
+    columns, but pairwise when the column axis has length 1.
+    """
+    n_species = n_traps_per_pixel.shape[0]
+    for species in range(n_species):
+        if pairwise:
+            for level in range(n_levels):
+                level_buffer[level] = (
+                    watermarks[1, level, column] * watermarks[2 + species, level, column]
+                )
+            total = _pairwise_sum(level_buffer, 0, n_levels)
+        else:
+            total = 0.0
+            for level in range(n_levels):
+                total += (
+                    watermarks[1, level, column] * watermarks[2 + species, level, column]
+                )
+        species_buffer[species] = total * n_traps_per_pixel[species]
+
+    if pairwise:
+        return _pairwise_sum(species_buffer, 0, n_species)
+    total = 0.0
+    for species in range(n_species):
+        total += species_buffer[species]
+    return total
+
+
+@_jit
+def release(
+    watermarks,
+    unset_watermark_index,
+    fill_probabilities_from_release,
+    n_traps_per_pixel,
+    n_trapped_electrons_initial,
+    n_trapped_electrons_final,
+    level_buffer,
+    species_buffer,
+):
+    """Release electrons from the active watermarks of every column.
+
+    Fills n_trapped_electrons_initial and n_trapped_electrons_final and updates
+    the watermarks in place, as TrapManagerInstantCapture.n_electrons_released().
+    """
+    n_species = n_traps_per_pixel.shape[0]
+    n_columns = watermarks.shape[2]
+    pairwise = n_columns == 1
+    for column in range(n_columns):
+        n_trapped_electrons_initial[column] = _n_trapped_electrons(
+            watermarks, unset_watermark_index, n_traps_per_pixel, column,
+            pairwise, level_buffer, species_buffer,
+        )
+        for species in range(n_species):
+            for level in range(unset_watermark_index):
+                watermarks[2 + species, level, column] = (
+                    watermarks[2 + species, level, column]
+                    * fill_probabilities_from_release[species]
+                )
+        n_trapped_electrons_final[column] = _n_trapped_electrons(
+            watermarks, unset_watermark_index, n_traps_per_pixel, column,
+            pairwise, level_buffer, species_buffer,
+        )
+
+
+@_jit
+def capture(
+    watermarks,
+    unset_watermark_index,
+    cloud_fractional_volumes,
+    n_free_electrons,
+    n_traps_per_pixel,
+    n_trapped_electrons_initial,
+    n_electrons_captured,
+    level_buffer,
+    species_buffer,
+    fill_buffer,
+):
+    """Capture electrons in a new watermark in every column.
+
+    Fills n_electrons_captured and updates the watermarks in place, as
+    TrapManagerInstantCapture.n_electrons_captured().
+    """
+    n_species = n_traps_per_pixel.shape[0]
+    n_columns = watermarks.shape[2]
+    pairwise = n_columns == 1
+    u = unset_watermark_index
+
+    for column in range(n_columns):
+        cloud = cloud_fractional_volumes[column]
+
+        # Set the new watermark's total volume
+        watermarks[0, u, column] = cloud
+
+        # Existing watermarks immediately above and below the new one, if any
+        index_above = -1
+        index_below = -1
+        for level in range(u):
+            volume = watermarks[0, level, column]
+            if volume > cloud:
+                if index_above < 0 or volume < watermarks[0, index_above, column]:
+                    index_above = level
+            elif volume <= cloud:
+                if index_below < 0 or volume > watermarks[0, index_below, column]:
+                    index_below = level
+        volume_below = 0.0
+        if index_below >= 0:
+            volume_below = watermarks[0, index_below, column]
+
+        # Individual volumes of the new and the above watermarks
+        watermarks[1, u, column] = watermarks[0, u, column] - volume_below
+        if index_above >= 0:
+            watermarks[1, index_above, column] = (
+                watermarks[0, index_above, column] - watermarks[0, u, column]
+            )
+        for level in range(u + 1):
+            if watermarks[0, level, column] == 0:
+                watermarks[1, level, column] = 0
+
+        # Fill the new watermark and those below it, keeping the previous
+        # fill fractions in case there are not enough electrons
+        for species in range(n_species):
+            watermarks[2 + species, u, column] = 1
+            for level in range(u):
+                if watermarks[0, level, column] <= cloud:
+                    fill_buffer[species, level] = watermarks[2 + species, level, column]
+                    watermarks[2 + species, level, column] = 1
+
+        n_trapped_electrons_final = _n_trapped_electrons(
+            watermarks, u + 1, n_traps_per_pixel, column, pairwise,
+            level_buffer, species_buffer,
+        )
+
+        # Limit the increase of the fill fractions if there are not enough
+        # available electrons
+        enough = n_free_electrons[column] / (
+            n_trapped_electrons_final - n_trapped_electrons_initial[column]
+        )
+        if enough > 0 and enough < 1:
+            for species in range(n_species):
+                watermarks[2 + species, u, column] = enough
+                for level in range(u):
+                    if watermarks[0, level, column] <= cloud:
+                        watermarks[2 + species, level, column] = (
+                            enough * watermarks[2 + species, level, column]
+                            + (1 - enough) * fill_buffer[species, level]
+                        )
+            n_trapped_electrons_final = _n_trapped_electrons(
+                watermarks, u + 1, n_traps_per_pixel, column, pairwise,
+                level_buffer, species_buffer,
+            )
+
+        n_electrons_captured[column] = (
+            n_trapped_electrons_final - n_trapped_electrons_initial[column]
+        )
@@ -583,6 +583,152 @@ class TestExpress:
             assert image_post_cti == pytest.approx(image_post_cti_0, rel=tol)
 
 
+class TestColumnBlocks:
+    def test__columns_are_independent(self):
+
+        image_pre_cti = np.zeros((20, 4))
+        image_pre_cti[2, 0] = 800
+        image_pre_cti[[5, 12], 1] = 100
+        image_pre_cti[3, 2] = 10
+        image_pre_cti[6, 3] = 1000
+
+        traps = [ac.TrapInstantCapture(density=10, release_timescale=-1 / np.log(0.5))]
+        ccd = ac.CCD(well_fill_power=0.8, full_well_depth=1000, well_notch_depth=0)
+
+        image_post_cti = ac.add_cti(
+            image=image_pre_cti, parallel_traps=traps, parallel_ccd=ccd
+        )
+
+        for column in range(4):
+            image_post_cti_column = ac.add_cti(
+                image=image_pre_cti[:, [column]],
+                parallel_traps=traps,
+                parallel_ccd=ccd,
+            )
+
+            assert image_post_cti[:, [column]] == pytest.approx(image_post_cti_column)
+
+    def test__add_cti__n_workers_same_result(self):
+
+        image_pre_cti = np.zeros((12, 5))
+        image_pre_cti[[1, 4], 0] = 800
+        image_pre_cti[3, 2] = 200
+        image_pre_cti[[2, 9], 4] = [50, 1000]
+
+        traps = [
+            ac.TrapInstantCapture(density=10, release_timescale=-1 / np.log(0.5)),
+            ac.TrapInstantCapture(density=5, release_timescale=-1 / np.log(0.75)),
+        ]
+        ccd = ac.CCD(well_fill_power=0.8, full_well_depth=1000, well_notch_depth=0)
+
+        kwargs = dict(
+            parallel_traps=traps,
+            parallel_ccd=ccd,
+            parallel_express=2,
+            serial_traps=traps[:1],
+            serial_ccd=ccd,
+        )
+        image_post_cti = ac.add_cti(image=image_pre_cti, **kwargs)
+        image_post_cti_workers = ac.add_cti(image=image_pre_cti, n_workers=2, **kwargs)
+
+        assert np.array_equal(image_post_cti_workers, image_post_cti)
+
+        # The same pool for several calls
+        with ac.column_block_pool(2) as executor:
+            for _ in range(2):
+                image_post_cti_workers = ac.add_cti(
+                    image=image_pre_cti, n_workers=2, executor=executor, **kwargs
+                )
+                assert np.array_equal(image_post_cti_workers, image_post_cti)
+
+    def test__remove_cti__n_workers_one_pool(self, monkeypatch):
+
+        image_pre_cti = np.zeros((12, 6))
+        image_pre_cti[[1, 4], 0] = 800
+        image_pre_cti[3, 2] = 200
+        image_pre_cti[[2, 9], 5] = [50, 1000]
+
+        traps = [ac.TrapInstantCapture(density=10, release_timescale=-1 / np.log(0.5))]
+        ccd = ac.CCD(well_fill_power=0.8, full_well_depth=1000, well_notch_depth=0)
+        kwargs = dict(parallel_traps=traps, parallel_ccd=ccd, parallel_express=2)
+        image_post_cti = ac.add_cti(image=image_pre_cti, **kwargs)
+
+        image_remove_cti = ac.remove_cti(image=image_post_cti, iterations=4, **kwargs)
+
+        n_pools = []
+        column_block_pool = ac.main.column_block_pool
+
+        def counting_pool(n_workers):
+            n_pools.append(n_workers)
+            return column_block_pool(n_workers)
+
+        monkeypatch.setattr(ac.main, "column_block_pool", counting_pool)
+        image_remove_cti_workers = ac.remove_cti(
+            image=image_post_cti, iterations=4, n_workers=2, **kwargs
+        )
+
+        assert np.array_equal(image_remove_cti_workers, image_remove_cti)
+        # One pool for all the iterations
+        assert n_pools == [2]
+
+
+class TestRemoveCTITolerance:
+    traps = [ac.TrapInstantCapture(density=10, release_timescale=-1 / np.log(0.5))]
+    ccd = ac.CCD(well_fill_power=0.8, full_well_depth=1000, well_notch_depth=0)
+
+    def image_pre_and_post_cti(self):
+        image_pre_cti = np.zeros((15, 3))
+        image_pre_cti[2, 0] = 800
+        image_pre_cti[[4, 9], 2] = [300, 50]
+        image_post_cti = ac.add_cti(
+            image=image_pre_cti, parallel_traps=self.traps, parallel_ccd=self.ccd
+        )
+
+        return image_pre_cti, image_post_cti
+
+    def test__converges_to_tolerance(self):
+        image_pre_cti, image_post_cti = self.image_pre_and_post_cti()
+
+        for tolerance_norm in ["max", "rms"]:
+            image_remove_cti = ac.remove_cti(
+                image=image_post_cti,
+                iterations=50,
+                parallel_traps=self.traps,
+                parallel_ccd=self.ccd,
+                tolerance=1e-6,
+                tolerance_norm=tolerance_norm,
+            )
+
+            assert image_remove_cti == pytest.approx(image_pre_cti, abs=1e-4)
+
+    def test__warm_start(self):
+        image_pre_cti, image_post_cti = self.image_pre_and_post_cti()
+
+        # Start from the right answer, so one iteration changes almost nothing
+        image_remove_cti = ac.remove_cti(
+            image=image_post_cti,
+            iterations=1,
+            parallel_traps=self.traps,
+            parallel_ccd=self.ccd,
+            image_estimate=image_pre_cti,
+        )
+
+        assert image_remove_cti == pytest.approx(image_pre_cti, abs=1e-10)
+
+    def test__unknown_tolerance_norm(self):
+        image_pre_cti, image_post_cti = self.image_pre_and_post_cti()
+
+        with pytest.raises(ValueError):
+            ac.remove_cti(
+                image=image_post_cti,
+                iterations=1,
+                parallel_traps=self.traps,
+                parallel_ccd=self.ccd,
+                tolerance=1,
+                tolerance_norm="mean",
+            )
+
+
 # class TestOffsetsAndWindows:
 #     def test__add_cti__single_pixel__offset(self):
 #
@@ -1,5 +1,6 @@
 import pytest
 import numpy as np
+from copy import deepcopy
 
 import arcticpy as ac
 
@@ -331,6 +332,40 @@ class TestExpressMatrix:
             )
         )
 
+    def test__express_matrices__cached(self):
+
+        ac.clear_express_matrix_cache()
+
+        for roe in [
+            ac.ROE(empty_traps_for_first_transfers=False),
+            ac.ROE(express_matrix_dtype=int),
+            ac.ROETrapPumping(n_pumps=5),
+        ]:
+            (
+                express_matrix,
+                monitor_traps_matrix,
+            ) = roe.express_matrix_and_monitor_traps_matrix_from_pixels_and_express(
+                pixels=12, express=4
+            )
+            save_trap_states_matrix = roe.save_trap_states_matrix_from_express_matrix(
+                express_matrix=express_matrix
+            )
+
+            matrices = roe.express_matrices(pixels=12, express=4)
+
+            assert np.array_equal(matrices[0], express_matrix)
+            assert np.array_equal(matrices[1], monitor_traps_matrix)
+            assert np.array_equal(matrices[2], save_trap_states_matrix)
+            assert not matrices[0].flags.writeable
+
+            # Shared by other instances with the same settings
+            roe_copy = deepcopy(roe)
+            assert roe_copy.express_matrices(pixels=12, express=4) is matrices
+            assert roe_copy.express_matrices(pixels=12, express=3) is not matrices
+
+        ac.clear_express_matrix_cache()
+        assert roe.express_matrices(pixels=12, express=4) is not matrices
+
 
 class TestClockingSequences:
     def test__release_fractions_sum_to_unity(self):
@@ -1,3 +1,4 @@
+import pickle
 import numpy as np
 import pytest
 from scipy import integrate
@@ -190,6 +191,61 @@ class TestTrapManagerUtilities:
 
         assert unset_watermark_index == 4
 
+    def test__n_active_watermarks_tracked(self):
+        ccd = ac.CCD(well_fill_power=1, full_well_depth=1000, well_notch_depth=0)
+        trap_manager = ac.TrapManagerInstantCapture(
+            traps=traps_2_spec, n_columns=3, max_n_transfers=6
+        )
+        trap_manager.watermarks = deepcopy(watermarks_3_col)
+        assert trap_manager.n_active_watermarks() == 4
+
+        # Capture adds a level
+        trap_manager.n_electrons_released_and_captured(
+            n_free_electrons=np.array([300.0, 150.0, 0.0]),
+            ccd_filling_function=ccd.well_filling_function(),
+        )
+        assert trap_manager._n_active_watermarks == 5
+        assert trap_manager.unset_watermark_index_from_watermarks(
+            trap_manager.watermarks
+        ) == np.argmax(trap_manager.watermarks[0, :, 0] == unset)
+
+        # Levels edited in place are found again
+        trap_manager.watermarks[:, 5] = 0.3
+        assert trap_manager.n_active_watermarks() == 6
+        assert trap_manager.unset_watermark_index_from_watermarks(
+            trap_manager.watermarks
+        ) == 0
+        trap_manager.watermarks[:, 1:] = unset
+        assert trap_manager.n_active_watermarks() == 1
+
+        trap_manager.empty_all_traps()
+        assert trap_manager.n_active_watermarks() == 0
+        assert (trap_manager.watermarks == unset).all()
+
+    def test__fill_probabilities_cached_per_dwell_time(self):
+        trap_manager = ac.TrapManagerInstantCapture(
+            traps=traps_2_spec, n_columns=1, max_n_transfers=1
+        )
+
+        fill_probabilities = trap_manager.fill_probabilities_from_dwell_time(0.5)
+
+        assert fill_probabilities[0] == pytest.approx([1, 1])
+        assert fill_probabilities[2] == pytest.approx([0.5 ** 0.5, 0.75 ** 0.5])
+        assert trap_manager.fill_probabilities_from_dwell_time(0.5) is fill_probabilities
+        assert not fill_probabilities[2].flags.writeable
+
+        # Precomputed for the clocking sequence's dwell times
+        ccd = ac.CCD(well_fill_power=1, full_well_depth=1000, well_notch_depth=0)
+        trap_managers = ac.AllTrapManager(
+            traps=traps_2_spec,
+            n_columns=1,
+            max_n_transfers=1,
+            ccd=ccd,
+            dwell_times=[0.5, 2],
+        )
+
+        assert set(trap_managers[0][0]._fill_probabilities) == {0.5, 2}
+
     def test__empty_all_traps(self):
         trap_manager_3_col.watermarks = deepcopy(watermarks_3_col)
 
@@ -615,6 +671,72 @@ class TestElectronsReleasedAndCapturedInstantCapture:
         )
 
 
+class TestWatermarkBackend:
+    def released_and_captured(self, backend, trap_manager, watermarks, n_free):
+        ccd = ac.CCD(well_fill_power=0.8, full_well_depth=1000, well_notch_depth=1e-7)
+        trap_manager.watermarks = deepcopy(watermarks)
+        n_free_electrons = np.array(n_free, dtype=float)
+
+        ac.set_watermark_backend(backend)
+        try:
+            net_n_electrons = trap_manager.n_electrons_released_and_captured(
+                n_free_electrons=n_free_electrons,
+                ccd_filling_function=ccd.well_filling_function(),
+                dwell_time=0.7,
+            )
+        finally:
+            ac.set_watermark_backend("numpy")
+
+        return net_n_electrons, n_free_electrons, trap_manager.watermarks
+
+    def test__numba_backend_matches_numpy__release_and_capture(self):
+        pytest.importorskip("numba")
+
+        for trap_manager, watermarks, n_free in [
+            (trap_manager_1_col, watermarks_1_col, [0]),
+            (trap_manager_1_col, watermarks_1_col, [150]),
+            (trap_manager_1_col, watermarks_1_col, [1]),
+            (trap_manager_2_col, watermarks_2_col, [0, 400]),
+            (trap_manager_2_col, watermarks_2_col, [2, 3]),
+            (trap_manager_3_col, watermarks_3_col, [300, 150, 0]),
+            (trap_manager_3_col, watermarks_3_col, [900, 650, 2]),
+            (trap_manager_3_col, watermarks_3_col, [1, 2, 0.5]),
+        ]:
+            expected = self.released_and_captured(
+                "numpy", trap_manager, watermarks, n_free
+            )
+            result = self.released_and_captured(
+                "numba", trap_manager, watermarks, n_free
+            )
+
+            for a, b in zip(result, expected):
+                assert np.array_equal(a, b)
+
+    def test__numba_backend_matches_numpy__add_cti(self):
+        pytest.importorskip("numba")
+
+        image = np.zeros((12, 1))
+        image[[1, 4, 5], 0] = [1000, 30, 2]
+        ccd = ac.CCD(well_fill_power=0.6, full_well_depth=1e4, well_notch_depth=0.5)
+
+        image_numpy = ac.add_cti(
+            image=image, parallel_traps=traps_2_spec, parallel_ccd=ccd
+        )
+        ac.set_watermark_backend("numba")
+        try:
+            image_numba = ac.add_cti(
+                image=image, parallel_traps=traps_2_spec, parallel_ccd=ccd
+            )
+        finally:
+            ac.set_watermark_backend("numpy")
+
+        assert np.array_equal(image_numba, image_numpy)
+
+    def test__unknown_backend(self):
+        with pytest.raises(ValueError):
+            ac.set_watermark_backend("fortran")
+
+
 class TestAllTrapManager:
     def test__single_or_multiple_trap_managers__add_cti_similar_result(self):
         image = np.zeros((6, 2))
@@ -679,6 +801,45 @@ class TestAllTrapManager:
         # Confirm restored
         assert trap_managers[0][0].watermarks == pytest.approx(watermarks_3_col)
 
+    def test__save_and_restore__only_active_watermarks(self):
+        trap_managers = ac.AllTrapManager(
+            traps=traps_2_spec, n_columns=3, max_n_transfers=6, ccd=ac.CCD()
+        )
+        trap_manager = trap_managers[0][0]
+        watermarks_saved = trap_manager.watermarks.copy()
+        watermarks_saved[:, :4] = watermarks_3_col[:, :4]
+        trap_manager.watermarks[:] = watermarks_saved
+
+        trap_managers.save()
+
+        # Change the active watermarks and add new ones after the save
+        trap_manager.watermarks[2:, :4] *= 0.5
+        trap_manager.watermarks[:, 4:6] = 0.3
+        assert trap_manager.n_active_watermarks() == 6
+
+        watermarks_before = trap_manager.watermarks
+        trap_managers.restore()
+
+        # Restored in place, with the newer watermarks unset
+        assert trap_manager.watermarks is watermarks_before
+        assert trap_manager.n_active_watermarks() == 4
+        assert trap_manager.watermarks == pytest.approx(watermarks_saved)
+
+        # The snapshot is independent of later changes and can be reused
+        trap_manager.watermarks[2:, :4] = 0
+        trap_managers.restore()
+        assert trap_manager.watermarks == pytest.approx(watermarks_saved)
+
+    def test__restore_without_save_empties_traps(self):
+        trap_managers = ac.AllTrapManager(
+            traps=traps_2_spec, n_columns=3, max_n_transfers=6, ccd=ac.CCD()
+        )
+
+        trap_managers[0][0].watermarks = deepcopy(watermarks_3_col)
+        trap_managers.restore()
+
+        assert (trap_managers[0][0].watermarks == unset).all()
+
 
 class TestMiscTrapParameters:
     def test__delta_ellipticity_of_trap(self):
@@ -838,6 +999,229 @@ class TestMiscTrapParameters:
             0.113,
         ]
 
+class TestTabulatedLifetimeContinuum:
+    def test__tabulated_matches_exact(self):
+
+        trap = ac.TrapLogNormalLifetimeContinuum(
+            density=10, release_timescale_mu=1, release_timescale_sigma=0.5
+        )
+        times = [0, 1e-5, 0.1, 0.5, 1, 2, 7.5, 1e3]
+        fill_fractions = [0.999, 0.9, 0.5, 0.1, 1e-3]
+
+        exact_fill = [trap.fill_fraction_from_time_elapsed(t) for t in times]
+        exact_time = [trap.time_elapsed_from_fill_fraction(f) for f in fill_fractions]
+        exact_released = [
+            trap.electrons_released_from_time_elapsed_and_dwell_time(t, 0.5)
+            for t in times
+        ]
+
+        trap.tabulate(tolerance=1e-5)
+        assert trap.is_tabulated
+
+        assert [
+            trap.fill_fraction_from_time_elapsed(t) for t in times
+        ] == pytest.approx(exact_fill, abs=1e-5)
+        assert [
+            trap.electrons_released_from_time_elapsed_and_dwell_time(t, 0.5)
+            for t in times
+        ] == pytest.approx(exact_released, abs=1e-5)
+
+        # Inverse round trip in fill fraction
+        for fill_fraction, time in zip(fill_fractions, exact_time):
+            time_tabulated = trap.time_elapsed_from_fill_fraction(fill_fraction)
+            assert time_tabulated == pytest.approx(time, rel=1e-3)
+            assert trap.fill_fraction_from_time_elapsed(
+                time_tabulated
+            ) == pytest.approx(fill_fraction, abs=1e-5)
+
+        # Arrays as well as scalars
+        assert trap.fill_fraction_from_time_elapsed(
+            np.array(times)
+        ) == pytest.approx(exact_fill, abs=1e-5)
+
+        # One table per dwell time
+        assert list(trap._tables["electrons_released"].keys()) == [0.5]
+
+        trap.tabulate(tolerance=None)
+        assert not trap.is_tabulated
+        assert trap.fill_fraction_from_time_elapsed(2) == exact_fill[5]
+
+    def test__tabulated_monotonic(self):
+
+        trap = ac.TrapLogNormalLifetimeContinuum(
+            density=10, release_timescale_mu=3, release_timescale_sigma=0.5
+        )
+        trap.tabulate(tolerance=1e-4)
+
+        times = np.logspace(-6, 4, 2000)
+        fill_fractions = trap.fill_fraction_from_time_elapsed(times)
+        released = trap.electrons_released_from_time_elapsed_and_dwell_time(
+            times, dwell_time=1
+        )
+
+        assert np.all(np.diff(fill_fractions) <= 0)
+        assert np.all(np.diff(released) <= 0)
+        assert np.all(
+            np.diff(
+                [trap.time_elapsed_from_fill_fraction(f) for f in fill_fractions[::50]]
+            )
+            >= 0
+        )
+
+    def test__tabulated_pickle(self):
+
+        trap = ac.TrapLogNormalLifetimeContinuum(
+            density=10, release_timescale_mu=1, release_timescale_sigma=0.5
+        )
+        trap.tabulate(tolerance=1e-4)
+        released = trap.electrons_released_from_time_elapsed_and_dwell_time(
+            0.5, dwell_time=0.5
+        )
+
+        # With the electrons-released table built, e.g. to send to workers
+        trap_copy = pickle.loads(pickle.dumps(trap))
+
+        assert list(trap_copy._tables["electrons_released"].keys()) == [0.5]
+        assert trap_copy.electrons_released_from_time_elapsed_and_dwell_time(
+            0.5, dwell_time=0.5
+        ) == released
+        assert trap_copy.electrons_released_from_time_elapsed_and_dwell_time(
+            1e5, dwell_time=0.5
+        ) == trap.electrons_released_from_time_elapsed_and_dwell_time(
+            1e5, dwell_time=0.5
+        )
+
+    def test__bad_time_range(self):
+
+        trap = ac.TrapLogNormalLifetimeContinuum(
+            density=10, release_timescale_mu=1, release_timescale_sigma=0.5
+        )
+
+        with pytest.raises(ValueError):
+            trap.tabulate(time_range=(0, 10))
+
+class TestTrapManagerTrackTimeVectorized:
+    def test__watermark_conversions(self):
+
+        traps = [
+            ac.TrapInstantCapture(density=10, release_timescale=2),
+            ac.TrapLogNormalLifetimeContinuum(
+                density=10, release_timescale_mu=1, release_timescale_sigma=0.5
+            ),
+        ]
+        trap_manager = ac.TrapManagerTrackTime(
+            traps=traps, n_columns=2, max_n_transfers=3
+        )
+        assert list(trap_manager.closed_form_species) == [True, False]
+
+        trap_manager.watermarks[:, :3] = np.array(
+            [
+                [[0.5, 0.2], [0.8, 0.7], [0.9, 0.9]],
+                [[0.5, 0.2], [0.3, 0.5], [0.1, 0.2]],
+                [[1, 0], [0.5, 2], [3, 0.1]],
+                [[1, 0], [0.5, 2], [3, 0.1]],
+            ]
+        )
+
+        watermarks = trap_manager.watermarks_converted_to_fill_fractions_from_elapsed_times(
+            watermarks=trap_manager.watermarks
+        )
+        times = trap_manager.watermarks[2, :3]
+        assert watermarks[:2] == pytest.approx(trap_manager.watermarks[:2])
+        assert watermarks[2, :3] == pytest.approx(np.exp(-times / 2))
+        assert watermarks[3, :3] == pytest.approx(
+            np.array(
+                [
+                    [traps[1].fill_fraction_from_time_elapsed(t) for t in row]
+                    for row in times
+                ]
+            )
+        )
+        assert watermarks[2:, 3] == pytest.approx(trap_manager.unset)
+
+        # And back again, also into a preallocated array
+        out = np.zeros_like(watermarks)
+        watermarks = trap_manager.watermarks_converted_to_elapsed_times_from_fill_fractions(
+            watermarks=watermarks, out=out
+        )
+        assert watermarks is out
+        assert watermarks[:, :3] == pytest.approx(trap_manager.watermarks[:, :3])
+
+    def test__same_as_instant_capture_for_exponential_traps(self):
+
+        traps = [
+            ac.TrapInstantCapture(density=10, release_timescale=1.5),
+            ac.TrapInstantCapture(density=3, release_timescale=7),
+        ]
+        n_columns = 5
+        trap_manager_fill = ac.TrapManagerInstantCapture(
+            traps=traps, n_columns=n_columns, max_n_transfers=40
+        )
+        trap_manager_time = ac.TrapManagerTrackTime(
+            traps=traps, n_columns=n_columns, max_n_transfers=40
+        )
+        ccd = ac.CCD(well_fill_power=0.8, full_well_depth=1000)
+        ccd_filling_function = ccd.well_filling_function()
+
+        # Including some columns without enough electrons to fill the traps
+        rng = np.random.default_rng(1)
+        for i_transfer in range(40):
+            n_free_electrons = rng.uniform(0, 20, n_columns) * (
+                rng.random(n_columns) > 0.3
+            )
+            dwell_time = rng.uniform(0.2, 2)
+
+            net_fill = trap_manager_fill.n_electrons_released_and_captured(
+                n_free_electrons=n_free_electrons.copy(),
+                ccd_filling_function=ccd_filling_function,
+                dwell_time=dwell_time,
+            )
+            net_time = trap_manager_time.n_electrons_released_and_captured(
+                n_free_electrons=n_free_electrons.copy(),
+                ccd_filling_function=ccd_filling_function,
+                dwell_time=dwell_time,
+            )
+            assert net_time == pytest.approx(net_fill, abs=1e-12)
+
+        n_active = trap_manager_fill.n_active_watermarks()
+        assert trap_manager_time.n_active_watermarks() == n_active
+        assert trap_manager_time.watermarks_converted_to_fill_fractions_from_elapsed_times(
+            trap_manager_time.watermarks
+        )[:, :n_active] == pytest.approx(trap_manager_fill.watermarks[:, :n_active])
+        assert trap_manager_time.n_trapped_electrons_from_watermarks(
+            trap_manager_time.watermarks
+        ) == pytest.approx(
+            trap_manager_fill.n_trapped_electrons_from_watermarks(
+                trap_manager_fill.watermarks
+            )
+        )
+
+    def test__continuum_traps_tabulated_and_exact(self):
+
+        image = np.zeros((12, 2))
+        image[2] = [200, 1000]
+        ccd = ac.CCD(well_fill_power=0.8, full_well_depth=1e4)
+
+        images = []
+        for tolerance in [None, 1e-6]:
+            trap = ac.TrapLogNormalLifetimeContinuum(
+                density=3, release_timescale_mu=2, release_timescale_sigma=0.5
+            )
+            trap.tabulate(tolerance=tolerance)
+            images.append(
+                ac.add_cti(
+                    image=image,
+                    parallel_traps=[trap],
+                    parallel_ccd=ccd,
+                    parallel_roe=ac.ROE(),
+                    parallel_express=2,
+                )
+            )
+
+        # Trails
+        assert np.all(images[0][3:6] > 0)
+        assert images[1] == pytest.approx(images[0], abs=1e-4)
+
 
 #
 # class TestTrapManagerTrackTime:
@@ -0,0 +1,484 @@
+# -*- coding: utf-8 -*-
+"""Benchmark the hot paths of arcticpy and emccd_detect against a baseline.
+
+Each benchmark times a single call of a function on fixed, seeded inputs. The
+call is repeated and the fastest and median times are recorded, the fastest
+being the least sensitive to other load on the machine. Results are written as
+JSON along with the versions and machine they were measured on, so that later
+runs can be compared against them.
+
+Usage
+-----
+Run all the benchmarks and print the results:
+$  python3  benchmarks/run_benchmarks.py
+
+Save the results as a new baseline:
+$  python3  benchmarks/run_benchmarks.py  --save benchmarks/baseline.json
+
+Compare against a baseline, exiting with status 1 if any benchmark is more
+than 25% slower (by its fastest time):
+$  python3  benchmarks/run_benchmarks.py  --compare benchmarks/baseline.json
+
+Args
+----
+--filter PATTERN
+    Only run the benchmarks whose names contain any of the comma-separated
+    patterns, e.g. "add_cti,trap_manager".
+
+--repeat N
+    The number of timed repeats of each benchmark. Default 5.
+
+--tolerance FRACTION
+    The allowed fractional slowdown relative to the baseline. Default 0.25.
+
+Baselines are only meaningful on the machine that made them, so compare
+against a baseline saved on the same machine, e.g. before and after a change.
+
+The packages are imported from this checkout rather than any installed
+versions. The arcticpy benchmarks are skipped if it can't be imported, as is
+CTI in emccd_detect.
+"""
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import sys
+import time
+import timeit
+
+import numpy as np
+
+# Benchmark the code in this checkout
+here = os.path.dirname(os.path.realpath(__file__))
+root = os.path.dirname(here)
+sys.path.insert(0, os.path.join(root, "emccd_detect"))
+sys.path.insert(0, os.path.join(root, "arcticpy_folder"))
+
+try:
+    import arcticpy as ac
+except ImportError:
+    ac = None
+
+from emccd_detect.cosmics import cosmic_hits, sat_tails
+from emccd_detect.emccd_detect import EMCCDDetect
+from emccd_detect.rand_em_gain import rand_em_gain
+
+
+# Registered benchmarks: name -> (setup function, requires arcticpy)
+benchmarks = {}
+
+
+def benchmark(name, arcticpy=False):
+    """Register a benchmark.
+
+    The decorated function does any (untimed) setup and returns a function of
+    no arguments to be timed.
+
+    Parameters
+    ----------
+    name : str
+        The benchmark name, as stored in the results.
+
+    arcticpy : bool
+        If True then skip the benchmark if arcticpy is unavailable.
+    """
+
+    def register(setup):
+        benchmarks[name] = (setup, arcticpy)
+        return setup
+
+    return register
+
+
+# ========
+# arcticpy
+# ========
+def cti_test_image(n_rows, n_columns, seed=0):
+    """A sky-ish image of a faint background with some bright spots."""
+    rng = np.random.default_rng(seed)
+    image = rng.normal(10, 2, (n_rows, n_columns))
+    n_spots = n_rows * n_columns // 100
+    image[
+        rng.integers(0, n_rows, n_spots), rng.integers(0, n_columns, n_spots)
+    ] += rng.uniform(100, 10000, n_spots)
+
+    return image
+
+
+def cti_traps(trap_type):
+    """A typical trap species of each type."""
+    if trap_type == "instant":
+        return [
+            ac.TrapInstantCapture(density=10, release_timescale=-1 / np.log(0.5)),
+            ac.TrapInstantCapture(density=3, release_timescale=10),
+        ]
+    elif trap_type == "continuum":
+        trap = ac.TrapLogNormalLifetimeContinuum(
+            density=10, release_timescale_mu=2, release_timescale_sigma=0.5
+        )
+        trap.tabulate(tolerance=1e-6)
+        return [trap]
+
+
+def add_cti_benchmark(n_rows, n_columns, express, trap_type):
+    def setup():
+        image = cti_test_image(n_rows, n_columns)
+        traps = cti_traps(trap_type)
+        ccd = ac.CCD(full_well_depth=1e5, well_notch_depth=0, well_fill_power=0.8)
+        roe = ac.ROE()
+
+        def run():
+            ac.add_cti(
+                image=image,
+                parallel_traps=traps,
+                parallel_ccd=ccd,
+                parallel_roe=roe,
+                parallel_express=express,
+            )
+
+        return run
+
+    return setup
+
+
+for n_rows, n_columns in [(100, 50), (200, 50)]:
+    for express in [1, 5, 20]:
+        benchmark(
+            "add_cti[instant,%dx%d,express=%d]" % (n_rows, n_columns, express),
+            arcticpy=True,
+        )(add_cti_benchmark(n_rows, n_columns, express, "instant"))
+benchmark("add_cti[continuum,100x50,express=5]", arcticpy=True)(
+    add_cti_benchmark(100, 50, 5, "continuum")
+)
+
+
+@benchmark("remove_cti[instant,100x50,express=5,iterations=3]", arcticpy=True)
+def remove_cti_instant():
+    image = cti_test_image(100, 50)
+    traps = cti_traps("instant")
+    ccd = ac.CCD(full_well_depth=1e5, well_notch_depth=0, well_fill_power=0.8)
+    roe = ac.ROE()
+    image_cti = ac.add_cti(
+        image=image,
+        parallel_traps=traps,
+        parallel_ccd=ccd,
+        parallel_roe=roe,
+        parallel_express=5,
+    )
+
+    def run():
+        ac.remove_cti(
+            image=image_cti,
+            iterations=3,
+            parallel_traps=traps,
+            parallel_ccd=ccd,
+            parallel_roe=roe,
+            parallel_express=5,
+        )
+
+    return run
+
+
+def trap_manager_benchmark(trap_manager_class, trap_type):
+    def setup():
+        n_columns = 200
+        n_transfers = 100
+        traps = cti_traps(trap_type)
+        ccd = ac.CCD(full_well_depth=1e5, well_notch_depth=0, well_fill_power=0.8)
+        ccd_filling_function = ccd.well_filling_function()
+        rng = np.random.default_rng(0)
+        n_free_electrons = rng.uniform(0, 2000, (n_transfers, n_columns))
+        trap_manager = trap_manager_class(
+            traps=traps, n_columns=n_columns, max_n_transfers=n_transfers
+        )
+
+        def run():
+            trap_manager.empty_all_traps()
+            for n_free in n_free_electrons:
+                trap_manager.n_electrons_released_and_captured(
+                    n_free_electrons=n_free.copy(),
+                    ccd_filling_function=ccd_filling_function,
+                    dwell_time=1,
+                )
+
+        return run
+
+    return setup
+
+
+if ac is not None:
+    for name, trap_manager_class, trap_type in [
+        ("instant_capture", ac.TrapManagerInstantCapture, "instant"),
+        ("track_time", ac.TrapManagerTrackTime, "instant"),
+        ("track_time_continuum", ac.TrapManagerTrackTime, "continuum"),
+    ]:
+        benchmark(
+            "trap_manager[%s,200 columns,100 transfers]" % name, arcticpy=True
+        )(trap_manager_benchmark(trap_manager_class, trap_type))
+
+
+# ============
+# emccd_detect
+# ============
+def sim_full_frame_benchmark(
+    cr_rate=0, cti=False, regions=None, sparse=False, noise_bank=False, flux_max=0.1
+):
+    def setup():
+        if cti:
+            # The small test geometry, since CTI on a full frame takes ~1 min
+            meta_path = os.path.join(
+                root, "emccd_detect", "emccd_detect", "util", "metadata_test.yaml"
+            )
+            emccd = EMCCDDetect(
+                em_gain=1000,
+                cr_rate=cr_rate,
+                full_well_serial=100000,
+                eperdn=7,
+                meta_path=meta_path,
+                rng=0,
+            )
+            emccd.update_cti()
+        else:
+            emccd = EMCCDDetect(em_gain=1000, cr_rate=cr_rate, rng=0)
+        if sparse:
+            emccd.update_sparse_mode()
+        if noise_bank:
+            emccd.update_noise_bank(seed=0)
+        image = emccd.meta.geom["image"]
+        fluxmap = np.random.default_rng(0).uniform(
+            0, flux_max, (image["rows"], image["cols"])
+        )
+
+        def run():
+            if regions is None:
+                emccd.sim_full_frame(fluxmap, frametime=10)
+            else:
+                emccd.sim_full_frame_roi(fluxmap, 10, regions)
+
+        return run
+
+    return setup
+
+
+benchmark("sim_full_frame[1024x1024]")(sim_full_frame_benchmark())
+benchmark("sim_full_frame[1024x1024,cosmics]")(sim_full_frame_benchmark(cr_rate=5))
+benchmark("sim_full_frame[104x105,cti]", arcticpy=True)(
+    sim_full_frame_benchmark(cti=True)
+)
+# Photon counting, ~0.05 e-/pix
+benchmark("sim_full_frame[1024x1024,flux=0.01]")(
+    sim_full_frame_benchmark(flux_max=0.01)
+)
+benchmark("sim_full_frame[1024x1024,flux=0.01,sparse]")(
+    sim_full_frame_benchmark(flux_max=0.01, sparse=True)
+)
+benchmark("sim_full_frame[1024x1024,noise_bank]")(
+    sim_full_frame_benchmark(noise_bank=True)
+)
+benchmark("sim_full_frame[1024x1024,flux=0.01,sparse,noise_bank]")(
+    sim_full_frame_benchmark(flux_max=0.01, sparse=True, noise_bank=True)
+)
+benchmark("sim_full_frame_roi[64x64,cosmics]")(
+    sim_full_frame_benchmark(cr_rate=5, regions=[(500, 564, 1500, 1564)])
+)
+
+
+@benchmark("rand_em_gain[1024x1024,em_gain=1000]")
+def rand_em_gain_setup():
+    rng = np.random.default_rng(0)
+    n_in_array = rng.poisson(0.5, (1024, 1024)).astype(float)
+
+    def run():
+        rand_em_gain(n_in_array, em_gain=1000, rng=rng)
+
+    return run
+
+
+@benchmark("cosmic_hits[1024x1024,cr_rate=5,frametime=100]")
+def cosmic_hits_setup():
+    rng = np.random.default_rng(0)
+    image_frame = np.zeros((1024, 1024))
+
+    def run():
+        cosmic_hits(
+            image_frame.copy(),
+            cr_rate=5,
+            frametime=100,
+            pixel_pitch=13e-6,
+            max_val=60000,
+            rng=rng,
+        )
+
+    return run
+
+
+@benchmark("sat_tails[1200x2200,1000 saturated]")
+def sat_tails_setup():
+    rng = np.random.default_rng(0)
+    serial_frame = rng.uniform(0, 50000, 1200 * 2200)
+    serial_frame[rng.integers(0, serial_frame.size, 1000)] = 1e7
+
+    def run():
+        sat_tails(serial_frame.copy(), full_well_serial=100000)
+
+    return run
+
+
+# =======
+# Running
+# =======
+def time_benchmark(run, repeat):
+    """Time a benchmark function.
+
+    The number of calls per repeat is chosen so each repeat takes at least
+    ~0.2 s, after one untimed call to warm up any caches.
+
+    Returns
+    -------
+    result : dict
+        The fastest and median times per call (s), and the repeat and number
+        of calls per repeat.
+    """
+    run()
+
+    timer = timeit.Timer(run)
+    number, time_taken = timer.autorange()
+    times = np.array(timer.repeat(repeat=repeat, number=number)) / number
+
+    return {
+        "min": float(np.min(times)),
+        "median": float(np.median(times)),
+        "repeat": repeat,
+        "number": number,
+    }
+
+
+def run_benchmarks(patterns=None, repeat=5):
+    """Run the (selected) benchmarks, printing the times as they go.
+
+    Returns
+    -------
+    results : dict
+        The results of each benchmark, see time_benchmark().
+    """
+    results = {}
+    for name, (setup, needs_arcticpy) in benchmarks.items():
+        if patterns is not None and not any(pattern in name for pattern in patterns):
+            continue
+        if needs_arcticpy and ac is None:
+            print("%-60s skipped (arcticpy not importable)" % name)
+            continue
+
+        results[name] = time_benchmark(setup(), repeat=repeat)
+        print(
+            "%-60s %10.4g s  (median %.4g s)"
+            % (name, results[name]["min"], results[name]["median"])
+        )
+
+    return results
+
+
+def metadata():
+    """ The versions and machine the benchmarks are run with. """
+    return {
+        "date": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "n_cpus": os.cpu_count(),
+    }
+
+
+def compare(results, baseline, tolerance):
+    """Compare the results with a baseline.
+
+    Parameters
+    ----------
+    results, baseline : dict
+        The results of each benchmark, see time_benchmark().
+
+    tolerance : float
+        The allowed fractional slowdown of the fastest time.
+
+    Returns
+    -------
+    regressions : [str]
+        The names of the benchmarks that are slower than allowed.
+    """
+    regressions = []
+    print("\n%-60s %10s %10s %8s" % ("Benchmark", "Baseline", "Now", "Ratio"))
+    for name, result in results.items():
+        if name not in baseline:
+            print("%-60s %10s %10.4g %8s" % (name, "-", result["min"], "new"))
+            continue
+
+        ratio = result["min"] / baseline[name]["min"]
+        if ratio > 1 + tolerance:
+            flag = "SLOWER"
+            regressions.append(name)
+        elif ratio < 1 / (1 + tolerance):
+            flag = "faster"
+        else:
+            flag = ""
+        print(
+            (
+                "%-60s %10.4g %10.4g %8.2f %s"
+                % (name, baseline[name]["min"], result["min"], ratio, flag)
+            ).rstrip()
+        )
+
+    return regressions
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        description="Benchmark arcticpy and emccd_detect against a baseline."
+    )
+    parser.add_argument("--filter", help="Comma-separated name patterns to run.")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--save", help="Path to save the results as JSON.")
+    parser.add_argument("--compare", help="Path of a baseline JSON to compare.")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    args = parser.parse_args(args)
+
+    patterns = args.filter.split(",") if args.filter else None
+
+    time_start = time.time()
+    results = run_benchmarks(patterns=patterns, repeat=args.repeat)
+    print("Ran %d benchmarks in %.1f s" % (len(results), time.time() - time_start))
+
+    if args.save is not None:
+        with open(args.save, "w") as f:
+            json.dump(
+                {"metadata": metadata(), "results": results}, f, indent=2, sort_keys=True
+            )
+            f.write("\n")
+        print("Saved %s" % args.save)
+
+    if args.compare is not None:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if baseline["metadata"]["platform"] != platform.platform():
+            print(
+                "\nWarning: the baseline was made on a different platform (%s)"
+                % baseline["metadata"]["platform"]
+            )
+        regressions = compare(
+            results, baseline=baseline["results"], tolerance=args.tolerance
+        )
+        if len(regressions) > 0:
+            print(
+                "\n%d benchmark(s) more than %g%% slower than the baseline"
+                % (len(regressions), 100 * args.tolerance)
+            )
+            return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -4,7 +4,8 @@
 import numpy as np
 
 
-def cosmic_hits(image_frame, cr_rate, frametime, pixel_pitch, max_val):
+def cosmic_hits(image_frame, cr_rate, frametime, pixel_pitch, max_val,
+                rng=None):
     """Generate cosmic hits.
 
     This function does not return the values of the cosmics; instead it returns
@@ -26,6 +27,9 @@ def cosmic_hits(image_frame, cr_rate, frametime, pixel_pitch, max_val):
         Distance between pixel centers (m).
     max_val : float
         Maximum value of cosmic hit (e-).
+    rng : numpy.random.Generator, optional
+        Random number generator. Defaults to None, in which case the global
+        numpy.random state is used.
 
     Returns
     -------
@@ -33,6 +37,9 @@ def cosmic_hits(image_frame, cr_rate, frametime, pixel_pitch, max_val):
         Image area frame with cosmics added (e-).
 
     """
+    if rng is None:
+        rng = np.random
+
     if cr_rate > 0:
         # Find number of hits/frame
         nr, nc = image_frame.shape
@@ -45,32 +52,42 @@ def cosmic_hits(image_frame, cr_rate, frametime, pixel_pitch, max_val):
         # a radius of hit_rad chosen between cr_min_radius and cr_max_radius
         cr_min_radius = 0
         cr_max_radius = 2
-        hit_row = np.random.uniform(low=0, high=nr-1, size=hits_per_frame)
-        hit_col = np.random.uniform(low=0, high=nc-1, size=hits_per_frame)
-        hit_rad = np.random.uniform(low=cr_min_radius, high=cr_max_radius,
-                                    size=hits_per_frame)
-
-        # Create hits
-        for i in range(hits_per_frame):
-            # Get pixels where cosmic lands
-            min_row = max(np.floor(hit_row[i] - hit_rad[i]).astype(int), 0)
-            max_row = min(np.ceil(hit_row[i] + hit_rad[i]).astype(int), nr-1)
-            min_col = max(np.floor(hit_col[i] - hit_rad[i]).astype(int), 0)
-            max_col = min(np.ceil(hit_col[i] + hit_rad[i]).astype(int), nc-1)
-            cols, rows = np.meshgrid(np.arange(min_col, max_col+1),
-                                    np.arange(min_row, max_row+1))
-
-            # Create gaussian
-            sigma = 0.5
-            a = 1 / (np.sqrt(2*np.pi) * sigma)
-            b = 2 * sigma**2
-            cosm_section = a * np.exp(-((rows-hit_row[i])**2 + (cols-hit_col[i])**2) / b)
-
-            # Scale by maximum value
-            cosm_section = cosm_section / np.max(cosm_section) * max_val
-
-            # Add cosmic to frame
-            image_frame[min_row:max_row+1, min_col:max_col+1] += cosm_section
+        hit_row = rng.uniform(low=0, high=nr-1, size=hits_per_frame)
+        hit_col = rng.uniform(low=0, high=nc-1, size=hits_per_frame)
+        hit_rad = rng.uniform(low=cr_min_radius, high=cr_max_radius,
+                              size=hits_per_frame)
+
+        # Pixel extent of each hit, clipped at the frame edges
+        min_row = np.maximum(np.floor(hit_row - hit_rad).astype(int), 0)
+        max_row = np.minimum(np.ceil(hit_row + hit_rad).astype(int), nr-1)
+        min_col = np.maximum(np.floor(hit_col - hit_rad).astype(int), 0)
+        max_col = np.minimum(np.ceil(hit_col + hit_rad).astype(int), nc-1)
+
+        # Lay a fixed size stamp over every hit, large enough for the biggest
+        # possible radius, and only keep the stamp pixels within each extent
+        stamp_size = 2*int(np.ceil(cr_max_radius)) + 2
+        offsets = np.arange(stamp_size)
+        rows = min_row[:, None, None] + offsets[None, :, None]
+        cols = min_col[:, None, None] + offsets[None, None, :]
+        rows, cols = np.broadcast_arrays(rows, cols)
+        in_hit = ((rows <= max_row[:, None, None])
+                  & (cols <= max_col[:, None, None]))
+
+        # Create gaussians
+        sigma = 0.5
+        a = 1 / (np.sqrt(2*np.pi) * sigma)
+        b = 2 * sigma**2
+        cosm_sections = a * np.exp(-((rows-hit_row[:, None, None])**2
+                                     + (cols-hit_col[:, None, None])**2) / b)
+        cosm_sections[~in_hit] = 0
+
+        # Scale each hit by maximum value
+        section_max = cosm_sections.max(axis=(1, 2))[:, None, None]
+        cosm_sections = cosm_sections / section_max * max_val
+
+        # Add cosmics to frame, accumulating where hits overlap
+        np.add.at(image_frame, (rows[in_hit], cols[in_hit]),
+                  cosm_sections[in_hit])
 
     return image_frame
 
@@ -80,6 +97,13 @@ def sat_tails(serial_frame, full_well_serial):
 
     This is most prevalent in cosmic hits.
 
+    Every element which exceeds full_well_serial overflows into the following
+    elements with a tail of overflow/relative_i (where relative_i is 2 for the
+    next element), truncated once the tail drops below 1000 e-. A new overflow
+    supersedes the tail of an earlier one. Only the tails themselves are
+    processed, as whole segments, so the cost scales with the number and
+    length of the tails rather than with the size of the frame.
+
     Parameters
     ----------
     serial_frame : array_like
@@ -88,20 +112,136 @@ def sat_tails(serial_frame, full_well_serial):
         Serial (gain) register full well capacity (e-).
 
     """
+    n = len(serial_frame)
+    # Tails only add charge, so every element saturated before the tails are
+    # added is still saturated afterwards
+    sat_inds = np.flatnonzero(serial_frame > full_well_serial).tolist()
+    sat_inds.append(n)  # Sentinel
+    k = 0  # Index into sat_inds
+
+    i = 0
     overflow = 0.
-    overflow_i = 0.
-    for i, pix in enumerate(serial_frame):
-        serial_frame[i] += _set_tail_val(overflow, overflow_i, i)
+    overflow_i = 0
+    tail_end = 0  # Upper bound on the end of the current tail
+    while i < n:
+        if i >= tail_end:
+            # No active tail, so skip straight to the next saturated element
+            while sat_inds[k] < i:
+                k += 1
+            i = sat_inds[k]
+            if i == n:
+                break
+            val = serial_frame.item(i)
+        else:
+            val = serial_frame.item(i) + _tail_val(overflow, i+1 - overflow_i)
+            serial_frame[i] = val
 
-        if serial_frame[i] > full_well_serial:
-            overflow = serial_frame[i] - full_well_serial
+        if val > full_well_serial:
+            # New overflow supersedes the current tail
+            overflow = val - full_well_serial
             overflow_i = i
+            tail_end = min(i + _max_tail_len(overflow), n)
+            i += 1
+            continue
+        i += 1
+
+        # Tails of large overflows often cascade into further overflows
+        # straight away, so the first few elements after an overflow are
+        # stepped through one at a time. Beyond that, add the tail up to its
+        # end or up to the next saturated element in one go.
+        if i - overflow_i > _PROBE_LEN and i < tail_end:
+            while sat_inds[k] < i:
+                k += 1
+            seg_end = min(tail_end, sat_inds[k] + 1)
+            seg = serial_frame[i:seg_end] + _tail_vals(
+                overflow, np.arange(i, seg_end) + 1 - overflow_i)
+
+            over_inds = np.flatnonzero(seg > full_well_serial)
+            if len(over_inds) > 0:
+                stop = over_inds[0] + 1
+                serial_frame[i:i+stop] = seg[:stop]
+                overflow = seg.item(over_inds[0]) - full_well_serial
+                overflow_i = i + over_inds[0]
+                tail_end = min(overflow_i + _max_tail_len(overflow), n)
+                i = overflow_i + 1
+            else:
+                serial_frame[i:seg_end] = seg
+                i = seg_end
 
     return serial_frame
 
 
-def _set_tail_val(overflow, overflow_i, i):
-    relative_i = i+1 - overflow_i
+def sat_tails_sparse(inds, counts, full_well_serial, n):
+    """Simulate tails created by serial register saturation in a sparse frame.
+
+    The same as sat_tails, for a serial register frame of n elements which
+    are zero apart from the given events. Only the stretches of the frame
+    reached by tails are made dense.
+
+    Parameters
+    ----------
+    inds : array_like
+        Sorted flat indices of the nonzero elements of the frame.
+    counts : array_like
+        Values of the nonzero elements of the frame (e-).
+    full_well_serial : float
+        Serial (gain) register full well capacity (e-).
+    n : int
+        Number of elements in the frame.
+
+    Returns
+    -------
+    inds : array_like
+        Sorted flat indices of the nonzero elements of the frame with tails.
+    counts : array_like
+        Values of the nonzero elements of the frame with tails (e-).
+
+    """
+    sat_inds = inds[counts > full_well_serial]
+    if len(sat_inds) == 0:
+        return inds, counts
+
+    kept = np.ones(len(inds), dtype=bool)
+    tail_inds = []
+    tail_counts = []
+    stop = 0
+    for start in sat_inds.tolist():
+        if start < stop:
+            # Already in the stretch of an earlier overflow
+            continue
+
+        # Tails can cascade into further overflows, so grow the stretch until
+        # it holds the tails of every overflow in it
+        stop = start
+        reach = start + 1
+        while reach > stop:
+            stop = reach
+            a, b = np.searchsorted(inds, [start, stop])
+            stretch = np.zeros(stop - start, dtype=counts.dtype)
+            stretch[inds[a:b] - start] = counts[a:b]
+            sat_tails(stretch, full_well_serial)
+            over_inds = np.flatnonzero(stretch > full_well_serial).tolist()
+            reach = min(max(start + i + _max_tail_len(stretch[i]
+                                                      - full_well_serial)
+                            for i in over_inds), n)
+
+        kept[a:b] = False
+        nonzero = np.flatnonzero(stretch)
+        tail_inds.append(start + nonzero)
+        tail_counts.append(stretch[nonzero])
+
+    inds = np.concatenate([inds[kept]] + tail_inds)
+    counts = np.concatenate([counts[kept]] + tail_counts)
+    order = np.argsort(inds, kind='stable')
+
+    return inds[order], counts[order]
+
+
+# Number of elements after an overflow which are added one at a time
+_PROBE_LEN = 16
+
+
+def _tail_val(overflow, relative_i):
     tail_val = overflow * 1 / relative_i
     if tail_val < 1000:
         tail_val = 0
@@ -109,6 +249,21 @@ def _set_tail_val(overflow, overflow_i, i):
     return tail_val
 
 
+def _tail_vals(overflow, relative_i):
+    tail_vals = overflow * 1 / relative_i
+    tail_vals[tail_vals < 1000] = 0
+
+    return tail_vals
+
+
+def _max_tail_len(overflow):
+    """Upper bound on the number of elements, counting the overflow element
+    itself, up to the end of an overflow's tail."""
+    # The tail is below 1000 e- once relative_i exceeds overflow/1000, with a
+    # margin for rounding
+    return int(overflow // 1000) + 2
+
+
 if __name__ == '__main__':
     import matplotlib.pyplot as plt
 
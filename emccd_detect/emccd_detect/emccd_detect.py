@@ -1,14 +1,23 @@
 # -*- coding: utf-8 -*-
 """Simulation for EMCCD detector."""
 
+import contextlib
+import itertools
 import os
+import sys
 import warnings
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
 import numpy as np
 
-from emccd_detect.cosmics import cosmic_hits, sat_tails
-from emccd_detect.rand_em_gain import rand_em_gain
+from emccd_detect.cosmics import (_max_tail_len, cosmic_hits, sat_tails,
+                                  sat_tails_sparse)
+from emccd_detect.frame_sink import open_frame_sink
+from emccd_detect.noise_bank import NoiseBank
+from emccd_detect.pipeline import FramePipeline
+from emccd_detect.profiling import PipelineProfiler
+from emccd_detect.rand_em_gain import EMGainSampler, rand_em_gain
 from emccd_detect.util.read_metadata_wrapper import MetadataWrapper
 try:
     from arcticpy import add_cti, CCD, ROE, Trap, TrapInstantCapture
@@ -21,6 +30,10 @@ class EMCCDDetectException(Exception):
     """Exception class for emccd_detect module."""
 
 
+# Stand-in for the profiling contexts when profiling is disabled
+_NO_PROFILE = contextlib.nullcontext()
+
+
 class EMCCDDetectBase:
     """Base class for EMCCD detector.
 
@@ -53,6 +66,21 @@ class EMCCDDetectBase:
         inclusive.
     numel_gain_register : int
         Number of gain register elements. For eventually modeling partial CIC.
+    rng : {None, int, SeedSequence, BitGenerator, Generator}, optional
+        Source of randomness. An int or numpy.random.SeedSequence seeds a new
+        PCG64 Generator, and a BitGenerator (e.g. numpy.random.SFC64) or
+        Generator is used as is. Each simulated frame draws from its own
+        stream spawned from this source, so results are reproducible and
+        independent of how frames are batched. Defaults to None, in which
+        case the global numpy.random state is used.
+    dtype : {numpy.float64, numpy.float32}, optional
+        Floating point precision of the simulation work arrays. float32 halves
+        memory and bandwidth per frame at the cost of precision. Defaults to
+        numpy.float64.
+    adc_dtype : {'auto', unsigned integer dtype}, optional
+        Dtype of the ADC output frames. Must have at least nbits bits; 'auto'
+        picks the smallest unsigned integer that fits (e.g. numpy.uint16 for
+        14 bits). Defaults to numpy.uint64.
 
     """
     def __init__(
@@ -69,7 +97,10 @@ class EMCCDDetectBase:
         pixel_pitch,
         eperdn,
         nbits,
-        numel_gain_register
+        numel_gain_register,
+        rng=None,
+        dtype=np.float64,
+        adc_dtype=np.uint64
     ):
         # Input checks
         if not isinstance(nbits, (int, np.integer)):
@@ -91,6 +122,9 @@ class EMCCDDetectBase:
         self.eperdn = eperdn
         self.nbits = nbits
         self.numel_gain_register = numel_gain_register
+        self.rng = rng
+        self.dtype = dtype
+        self.adc_dtype = adc_dtype
 
         # Placeholders for trap parameters
         self.ccd = None
@@ -100,6 +134,18 @@ class EMCCDDetectBase:
         self.offset = None
         self.window_range = None
 
+        # Placeholder for the fast EM gain sampler
+        self.em_gain_sampler = None
+
+        # Placeholder for the sparse (photon counting) mode
+        self.sparse_max_density = None
+
+        # Placeholder for the read noise bank
+        self.noise_bank = None
+
+        # Placeholder for stage profiling
+        self.profiler = None
+
         # Placeholders for derived values
         self.mean_expected_rate = None
 
@@ -119,6 +165,264 @@ class EMCCDDetectBase:
         else:
             self._eperdn = eperdn
 
+    @property
+    def dtype(self):
+        return self._dtype
+
+    @dtype.setter
+    def dtype(self, dtype):
+        try:
+            dtype = np.dtype(dtype)
+        except TypeError:
+            raise EMCCDDetectException('dtype must be a numpy float dtype')
+        if dtype not in (np.float32, np.float64):
+            raise EMCCDDetectException('dtype must be numpy.float32 or '
+                                       'numpy.float64')
+        self._dtype = dtype
+
+    @property
+    def adc_dtype(self):
+        # Resolved on access so 'auto' follows later changes to nbits
+        if isinstance(self._adc_dtype, str):
+            return _min_uint_dtype(self.nbits)
+        if np.iinfo(self._adc_dtype).bits < self.nbits:
+            raise EMCCDDetectException('adc_dtype has fewer bits than nbits')
+        return self._adc_dtype
+
+    @adc_dtype.setter
+    def adc_dtype(self, adc_dtype):
+        if isinstance(adc_dtype, str) and adc_dtype == 'auto':
+            self._adc_dtype = adc_dtype
+        else:
+            try:
+                adc_dtype = np.dtype(adc_dtype)
+            except TypeError:
+                adc_dtype = None
+            if adc_dtype is None or adc_dtype.kind != 'u':
+                raise EMCCDDetectException("adc_dtype must be 'auto' or an "
+                                           "unsigned integer dtype")
+            self._adc_dtype = adc_dtype
+        # Check against nbits
+        self.adc_dtype
+
+    @property
+    def rng(self):
+        return self._rng
+
+    @rng.setter
+    def rng(self, rng):
+        if rng is None:
+            seed_seq = None
+        elif isinstance(rng, np.random.Generator):
+            seed_seq = _get_seed_seq(rng.bit_generator)
+        elif isinstance(rng, np.random.BitGenerator):
+            seed_seq = _get_seed_seq(rng)
+            rng = np.random.Generator(rng)
+        elif isinstance(rng, (int, np.integer, np.random.SeedSequence)):
+            if isinstance(rng, np.random.SeedSequence):
+                seed_seq = rng
+            else:
+                seed_seq = np.random.SeedSequence(int(rng))
+            rng = np.random.Generator(np.random.PCG64(seed_seq))
+        else:
+            raise EMCCDDetectException('rng must be None, an int, a '
+                                       'SeedSequence, a BitGenerator or a '
+                                       'Generator')
+
+        self._rng = rng
+        self._seed_seq = seed_seq
+
+    def spawn_rngs(self, n):
+        """Spawn independent random number generators.
+
+        Every call returns new streams which do not overlap with each other or
+        with those of previous calls, e.g. one stream per simulated frame.
+
+        Parameters
+        ----------
+        n : int
+            Number of generators to spawn.
+
+        Returns
+        -------
+        list of numpy.random.Generator
+            Generators using the same bit generator type as self.rng.
+
+        """
+        bit_generator, seed_seqs = self._spawn_seed_seqs(n)
+
+        return [np.random.Generator(bit_generator(child))
+                for child in seed_seqs]
+
+    def _spawn_seed_seqs(self, n):
+        """Spawn n child SeedSequences along with the bit generator type."""
+        if self._rng is None:
+            # Seed from the global state so numpy.random.seed still applies
+            seed_seq = np.random.SeedSequence(
+                np.random.randint(2**32, size=4, dtype=np.uint64))
+            bit_generator = np.random.PCG64
+        else:
+            seed_seq = self._seed_seq
+            bit_generator = type(self._rng.bit_generator)
+            if seed_seq is None:
+                raise EMCCDDetectException('rng has no SeedSequence to spawn '
+                                           'streams from')
+
+        return bit_generator, seed_seq.spawn(n)
+
+    def _frame_rngs(self, nframes=None):
+        """Return the random streams for one frame or a stack of frames."""
+        if self._rng is None:
+            return np.random
+        if nframes is None:
+            return self.spawn_rngs(1)[0]
+        return _FrameRNGs(self.spawn_rngs(nframes))
+
+    def _stage_rng(self, rng):
+        """Default rng for a simulation stage called on its own."""
+        if rng is not None:
+            return rng
+        if self._rng is not None:
+            return self._rng
+        return np.random
+
+    def update_em_gain_sampler(self, table_n_max=0, table_size=4096,
+                               normal_n=None):
+        """Use EMGainSampler instead of rand_em_gain in the gain register.
+
+        This is much faster for sparse (photon counting) frames. See
+        EMGainSampler for the parameters.
+
+        """
+        self.em_gain_sampler = EMGainSampler(
+            table_n_max=table_n_max,
+            table_size=table_size,
+            normal_n=normal_n
+        )
+
+    def unset_em_gain_sampler(self):
+        # Go back to drawing the gain for every element with rand_em_gain
+        self.em_gain_sampler = None
+
+    def update_sparse_mode(self, max_density=0.1):
+        """Simulate sparse (photon counting) frames as lists of events.
+
+        In photon counting the mean expected rate is typically 0.01-0.1 e-/pix,
+        so almost every element is zero before the gain register. In sparse
+        mode frames are simulated by only drawing the electrons of the
+        elements which get any, and carrying them as (flat index, count)
+        events through the gain register and saturation. The dense frame is
+        only made when read noise is added, so everything before the amp
+        costs in proportion to the number of events rather than of elements.
+
+        This applies to every frame simulation method apart from
+        sim_full_frame_roi, including the stacked ones (sim_full_frames,
+        sim_sub_frames, sim_full_frame_stream, sim_frames_parallel and
+        write_frames), which decide frame by frame. Frames are simulated
+        densely as usual when CTI is enabled, or when their expected number of
+        electrons per element is above max_density.
+
+        Parameters
+        ----------
+        max_density : float, optional
+            Largest mean expected electrons per element for which a frame is
+            simulated as events. Defaults to 0.1.
+
+        Notes
+        -----
+        Sparse frames follow the same distributions as dense ones but not the
+        same random streams, so individual values differ for the same seed.
+
+        """
+        if not max_density > 0:
+            raise EMCCDDetectException('max_density must be greater than 0')
+        self.sparse_max_density = max_density
+
+    def unset_sparse_mode(self):
+        # Go back to simulating every element of every frame
+        self.sparse_max_density = None
+
+    def update_noise_bank(self, size=2**24, dtype=np.float32, seed=None,
+                          path=None, block_size=None, row_sigma=0.,
+                          col_sigma=0.):
+        """Serve read noise from a precomputed NoiseBank.
+
+        This skips drawing fresh normal deviates for every element of every
+        frame, for high volume Monte Carlo where exact independence of the
+        read noise across frames does not matter. The bank can also add a
+        bias drift between rows and a fixed column pattern. See NoiseBank for
+        the parameters.
+
+        """
+        self.noise_bank = NoiseBank(
+            size=size,
+            dtype=dtype,
+            seed=seed,
+            path=path,
+            block_size=block_size,
+            row_sigma=row_sigma,
+            col_sigma=col_sigma
+        )
+
+    def unset_noise_bank(self):
+        # Go back to drawing fresh read noise for every frame
+        self.noise_bank = None
+
+    def enable_profiling(self, trace_memory=False, callback=None):
+        """Record wall time, allocated bytes and call counts of each stage.
+
+        Stages are 'cosmics', 'integrate', 'clock_parallel', 'cic',
+        'em_gain', 'sat_tails', 'amp' and 'adc'. One record is made for each
+        simulation call (a frame, a stack of frames, a streamed chunk or a
+        chunk of frames run by a sim_frames_parallel worker), not for each
+        frame, so a record of a stack holds the stages of all its frames. The
+        'time_per_frame' of each stage in profile_report is its total time
+        divided by the total number of frames, an average over all records.
+
+        Parameters
+        ----------
+        trace_memory : bool, optional
+            Also record the peak bytes allocated by each stage, using
+            tracemalloc. This slows the simulation down noticeably. Defaults
+            to False.
+        callback : callable, optional
+            Called with each record as soon as its frames are done. Defaults
+            to None.
+
+        """
+        self.disable_profiling()
+        self.profiler = PipelineProfiler(trace_memory=trace_memory,
+                                         callback=callback)
+
+    def disable_profiling(self):
+        # Stop recording and discard the records
+        if self.profiler is not None:
+            self.profiler.close()
+        self.profiler = None
+
+    def profile_report(self):
+        """Return the stage profile of all frames since enable_profiling.
+
+        See PipelineProfiler.report for the structure of the report.
+
+        """
+        if self.profiler is None:
+            raise EMCCDDetectException('Profiling is not enabled, call '
+                                       'enable_profiling first')
+        return self.profiler.report()
+
+    def _profile_frames(self, nframes):
+        """Context collecting the stages of nframes frames into one record."""
+        if self.profiler is None:
+            return _NO_PROFILE
+        return self.profiler.frames(nframes)
+
+    def _stage(self, name):
+        """Context timing one pipeline stage when profiling is enabled."""
+        if self.profiler is None:
+            return _NO_PROFILE
+        return self.profiler.stage(name)
+
     try:
         def update_cti(
             self,
@@ -188,84 +492,361 @@ class EMCCDDetectBase:
         be immediately wrapped back into the image.
 
         """
+        rng = self._frame_rngs()
+
+        with self._profile_frames(1):
+            fluxmap = np.array(fluxmap, dtype=self.dtype)
+            exposed_pix_m = np.ones(np.shape(fluxmap), dtype=bool)  # No unexposed pixels
+            if self._use_sparse(fluxmap, frametime, exposed_pix_m):
+                # Simulate the whole frame as events
+                return self._sim_frame_sparse(fluxmap, frametime,
+                                              exposed_pix_m, fluxmap.shape,
+                                              rng)
+
+            # Simulate the integration process
+            actualized_e = self._integrate(fluxmap, frametime, exposed_pix_m,
+                                           rng)
+
+            # Simulate parallel clocking
+            parallel_counts = self.clock_parallel(actualized_e)
+
+            # Simulate serial clocking (output will be flattened to 1d)
+            empty_element_m = np.zeros(parallel_counts.shape, dtype=bool)  # No empty elements
+            gain_counts = self.clock_serial(parallel_counts, empty_element_m, rng)
+
+            # Simulate amplifier and adc redout
+            output_dn = self.readout(gain_counts, rng, actualized_e.shape)
+
+        # Reshape from 1d to 2d
+        return output_dn.reshape(actualized_e.shape)
+
+    def sim_sub_frames(self, fluxmap, frametime, nframes=None):
+        """Simulate a stack of partial detector frames in one pass.
+
+        This runs the same algorithm as sim_sub_frame, but on a whole stack of
+        frames at once, so the per-frame Python overhead is paid only once.
+
+        Parameters
+        ----------
+        fluxmap : array_like
+            Input fluxmap of arbitrary 2d shape (phot/pix/s), used for every
+            frame, or a 3d cube of fluxmaps with one fluxmap per frame.
+        frametime : float or array_like
+            Frame exposure time (s), either shared by all frames or given per
+            frame.
+        nframes : int
+            Number of frames to simulate. Defaults to the length of the
+            fluxmap cube or of the per-frame frametimes.
+
+        Returns
+        -------
+        output_counts : array_like
+            Detector output counts, shape (nframes, rows, cols) (dn).
+
+        """
+        fluxmap_stack, frametime = _frame_stack(fluxmap, frametime, nframes,
+                                                self.dtype)
+        rng = self._frame_rngs(len(fluxmap_stack))
+
+        with self._profile_frames(len(fluxmap_stack)):
+            exposed_pix_m = np.ones(fluxmap_stack.shape[-2:], dtype=bool)  # No unexposed pixels
+            sparse = self._sparse_frames(fluxmap_stack, frametime,
+                                         exposed_pix_m)
+            if not sparse.any():
+                return self._sim_dense_sub_frame_stack(fluxmap_stack,
+                                                       frametime, rng)
+
+            # Simulate the sparse frames as events, one at a time
+            output_dn = np.empty(fluxmap_stack.shape, dtype=self.adc_dtype)
+            for i in np.flatnonzero(sparse):
+                frame_frametime, frame_rng = _stack_part(frametime, rng, i)
+                output_dn[i] = self._sim_frame_sparse(
+                    fluxmap_stack[i], frame_frametime, exposed_pix_m,
+                    fluxmap_stack.shape[-2:], frame_rng)
+
+            # Simulate the rest of the frames together
+            dense = np.flatnonzero(~sparse)
+            if len(dense) > 0:
+                dense_frametime, dense_rng = _stack_part(frametime, rng, dense)
+                output_dn[dense] = self._sim_dense_sub_frame_stack(
+                    fluxmap_stack[dense], dense_frametime, dense_rng)
+
+        return output_dn
+
+    def _sim_dense_sub_frame_stack(self, fluxmap_stack, frametime, rng):
+        """Simulate a stack of partial frames element by element."""
         # Simulate the integration process
-        exposed_pix_m = np.ones_like(fluxmap).astype(bool)  # No unexposed pixels
-        actualized_e = self.integrate(fluxmap.copy(), frametime, exposed_pix_m)
+        exposed_pix_m = np.ones(fluxmap_stack.shape[-2:], dtype=bool)
+        actualized_e = self._integrate(fluxmap_stack, frametime,
+                                       exposed_pix_m, rng)
 
         # Simulate parallel clocking
         parallel_counts = self.clock_parallel(actualized_e)
 
-        # Simulate serial clocking (output will be flattened to 1d)
-        empty_element_m = np.zeros_like(parallel_counts).astype(bool)  # No empty elements
-        gain_counts = self.clock_serial(parallel_counts, empty_element_m)
+        # Simulate serial clocking (output will be flattened to 1d per frame)
+        empty_element_m = np.zeros(parallel_counts.shape[-2:], dtype=bool)
+        gain_counts = self.clock_serial(parallel_counts, empty_element_m, rng)
 
         # Simulate amplifier and adc redout
-        output_dn = self.readout(gain_counts)
+        output_dn = self.readout(gain_counts, rng, actualized_e.shape[-2:])
 
-        # Reshape from 1d to 2d
+        # Reshape from 1d to 2d per frame
         return output_dn.reshape(actualized_e.shape)
 
-    def integrate(self, fluxmap_full, frametime, exposed_pix_m):
+    def _use_sparse(self, fluxmap_full, frametime, exposed_pix_m, n_empty=0):
+        """Whether to simulate a frame as events (see update_sparse_mode)."""
+        if self.sparse_max_density is None:
+            return False
+        if self.ccd is not None and self.roe is not None and self.traps is not None:
+            # arcticpy clocks dense frames
+            return False
+
+        # Mean expected electrons per element, ignoring cosmics
+        n_im = exposed_pix_m.size
+        mean_phe = np.sum(fluxmap_full, where=exposed_pix_m) * frametime * self.qe
+        mean_e = (mean_phe + n_im*self.dark_current*frametime
+                  + (n_im + n_empty)*self.cic)
+
+        return mean_e <= self.sparse_max_density * (n_im + n_empty)
+
+    def _sparse_frames(self, fluxmap_stack, frametime, exposed_pix_m,
+                       n_empty=0):
+        """Mask of the frames of a stack to simulate as events."""
+        frametimes = np.broadcast_to(frametime, len(fluxmap_stack))
+        return np.array([
+            self._use_sparse(fluxmap, frame_frametime, exposed_pix_m, n_empty)
+            for fluxmap, frame_frametime in zip(fluxmap_stack, frametimes)
+        ], dtype=bool)
+
+    def _sim_frame_sparse(self, fluxmap_full, frametime, exposed_pix_m,
+                          frame_shape, rng, imaging_inds=None,
+                          empty_inds=None):
+        """Simulate a frame without CTI as a sparse list of events.
+
+        This follows the same algorithm as the dense simulation, but electrons
+        are only drawn for the elements which get any, and are carried as
+        (flat index, count) events through the gain register. See
+        update_sparse_mode.
+
+        Parameters
+        ----------
+        fluxmap_full : array_like
+            Imaging area fluxmap (phot/pix/s). Modified in place.
+        frametime : float
+            Frame exposure time (s).
+        exposed_pix_m : array_like
+            Mask of the exposed imaging area pixels.
+        frame_shape : tuple
+            Shape of the output frame.
+        rng : numpy.random.Generator
+            Random number generator.
+        imaging_inds : array_like, optional
+            Flat indices in the output frame of the imaging area pixels.
+            Defaults to None, for an output frame which is the imaging area.
+        empty_inds : array_like, optional
+            Flat indices in the output frame of the empty (prescan and
+            overscan) elements. Defaults to None, for no empty elements.
+
+        Returns
+        -------
+        output_dn : array_like
+            Detector output counts, shape frame_shape (dn).
+
+        """
+        # Add cosmic ray effects
+        with self._stage('cosmics'):
+            if self.cr_rate != 0:
+                cosm_actualized_e = cosmic_hits(
+                    np.zeros(fluxmap_full.shape, dtype=self.dtype),
+                    self.cr_rate, frametime, self.pixel_pitch,
+                    self.full_well_image, rng)
+                cosm_actualized_e[~exposed_pix_m] = 0
+                cosm_inds = np.flatnonzero(cosm_actualized_e)
+                cosm_e = cosm_actualized_e.ravel()[cosm_inds]
+            else:
+                cosm_inds = np.zeros(0, dtype=np.intp)
+                cosm_e = np.zeros(0, dtype=self.dtype)
+
+        with self._stage('integrate'):
+            # Calculate mean expected rate after integrating over frametime
+            mean_phe_map = fluxmap_full
+            mean_phe_map[~exposed_pix_m] = 0
+            mean_phe_map *= frametime
+            mean_phe_map *= self.qe
+            mean_phe_map += self.dark_current*frametime + self.cic
+            self.mean_expected_rate = mean_phe_map
+
+            # Actualize electrons at the pixels, one event per electron, and
+            # add the cosmics
+            event_inds = np.concatenate((
+                _poisson_events(mean_phe_map.ravel(), rng), cosm_inds))
+            event_e = np.concatenate((
+                np.ones(len(event_inds) - len(cosm_inds), dtype=self.dtype),
+                cosm_e))
+            if imaging_inds is not None:
+                event_inds = imaging_inds[event_inds]
+
+        # Actualize cic electrons in the empty elements
+        if empty_inds is not None:
+            with self._stage('cic'):
+                n_cic = rng.poisson(self.cic * len(empty_inds))
+                cic_inds = empty_inds[
+                    (rng.random(n_cic) * len(empty_inds)).astype(np.intp)]
+                event_inds = np.concatenate((event_inds, cic_inds))
+                event_e = np.concatenate((
+                    event_e, np.ones(n_cic, dtype=self.dtype)))
+
+        with self._stage('integrate'):
+            # Sum the events of each element
+            event_inds, inverse = np.unique(event_inds, return_inverse=True)
+            event_e = np.bincount(inverse, weights=event_e,
+                                  minlength=len(event_inds))
+            event_e = event_e.astype(self.dtype, copy=False)
+
+            # Cap at pixel full well capacity
+            np.minimum(event_e, self.full_well_image, out=event_e)
+
+        # Clock electrons through gain register elements
+        gain_counts = self._em_gain(event_e, rng)
+        with self._stage('sat_tails'):
+            if self.cr_rate != 0:
+                event_inds, gain_counts = sat_tails_sparse(
+                    event_inds, gain_counts, self.full_well_serial,
+                    int(np.prod(frame_shape)))
+        np.minimum(gain_counts, self.full_well_serial, out=gain_counts)
+
+        # Simulate amplifier and adc redout
+        amp_ev = self._amp_events(frame_shape, event_inds, gain_counts, rng)
+        output_dn = self._adc(amp_ev)
+
+        return output_dn
+
+    def integrate(self, fluxmap_full, frametime, exposed_pix_m, rng=None):
+        # Work on a copy, so the caller's fluxmap is left unchanged
+        return self._integrate(np.array(fluxmap_full, dtype=self.dtype),
+                               frametime, exposed_pix_m, rng)
+
+    def _integrate(self, fluxmap_full, frametime, exposed_pix_m, rng=None):
+        """Integrate a fluxmap owned by the simulation.
+
+        The same as integrate, except that fluxmap_full is zeroed in the
+        unexposed pixels and turned into the mean expected rate in place (see
+        _imaging_area_elements), so it must be a work buffer rather than the
+        caller's fluxmap.
+
+        """
+        rng = self._stage_rng(rng)
+
         # Add cosmic ray effects
         # XXX Maybe change this to units of flux later
-        cosm_actualized_e = cosmic_hits(np.zeros_like(fluxmap_full),
-                                        self.cr_rate, frametime,
-                                        self.pixel_pitch, self.full_well_image)
+        with self._stage('cosmics'):
+            cosm_actualized_e = np.zeros(fluxmap_full.shape, dtype=self.dtype)
+            if fluxmap_full.ndim == 3:
+                # Cosmics are generated frame by frame, each with its own frametime
+                # and, if given, its own random stream
+                frametimes = np.broadcast_to(frametime, (len(fluxmap_full),))
+                if isinstance(rng, _FrameRNGs):
+                    cosm_rngs = rng
+                else:
+                    cosm_rngs = itertools.repeat(rng)
+                for cosm_frame, frame_frametime, cosm_rng in zip(
+                        cosm_actualized_e, frametimes, cosm_rngs):
+                    cosmic_hits(cosm_frame, self.cr_rate, frame_frametime,
+                                self.pixel_pitch, self.full_well_image, cosm_rng)
+                # Broadcast per-frame frametimes against each frame's pixels
+                frametime = np.reshape(frametime, np.shape(frametime) + (1, 1))
+            else:
+                cosm_actualized_e = cosmic_hits(cosm_actualized_e,
+                                                self.cr_rate, frametime,
+                                                self.pixel_pitch,
+                                                self.full_well_image, rng)
 
         # Mask flux out of unexposed (covered) pixels
-        fluxmap_full[~exposed_pix_m] = 0
-        cosm_actualized_e[~exposed_pix_m] = 0
+        fluxmap_full[..., ~exposed_pix_m] = 0
+        cosm_actualized_e[..., ~exposed_pix_m] = 0
 
         # Simulate imaging area pixel effects over time
         actualized_e = self._imaging_area_elements(fluxmap_full, frametime,
-                                                   cosm_actualized_e)
+                                                   cosm_actualized_e, rng)
 
         return actualized_e
 
     def clock_parallel(self, actualized_e):
         # Only add CTI if update_cti has been called
         if self.ccd is not None and self.roe is not None and self.traps is not None:
-            parallel_counts = add_cti(
-                actualized_e.copy(),
-                parallel_roe=self.roe,
-                parallel_ccd=self.ccd,
-                parallel_traps=self.traps,
-                parallel_express=self.express,
-                parallel_offset=self.offset,
-                parallel_window_range=self.window_range
-            )
+            if actualized_e.ndim == 3:
+                # arcticpy clocks one frame at a time
+                return np.stack([self.clock_parallel(frame)
+                                 for frame in actualized_e])
+            window_range = self._parallel_window_range(len(actualized_e))
+            if window_range is not None and len(window_range) == 0:
+                # No rows of this (region of the) frame are in the window
+                return actualized_e
+            with self._stage('clock_parallel'):
+                parallel_counts = add_cti(
+                    actualized_e.copy(),
+                    parallel_roe=self.roe,
+                    parallel_ccd=self.ccd,
+                    parallel_traps=self.traps,
+                    parallel_express=self.express,
+                    parallel_offset=self.offset,
+                    parallel_window_range=window_range
+                )
         else:
             parallel_counts = actualized_e
 
         return parallel_counts
 
-    def clock_serial(self, actualized_e_full, empty_element_m):
+    def _parallel_window_range(self, nrows):
+        """CTI window_range restricted to the first nrows imaging area rows."""
+        window_range = self.window_range
+        if window_range is None:
+            return None
+        if isinstance(window_range, (int, np.integer)):
+            window_range = range(window_range, window_range + 1)
+        if max(window_range) < nrows:
+            return window_range
+        if isinstance(window_range, range) and window_range.step > 0:
+            return range(window_range.start, nrows, window_range.step)
+        return [row for row in window_range if row < nrows]
+
+    def clock_serial(self, actualized_e_full, empty_element_m, rng=None):
+        rng = self._stage_rng(rng)
+
+        # Flatten row by row (frame by frame for a stack of frames)
+        actualized_e_full_flat = actualized_e_full.reshape(
+            actualized_e_full.shape[:-2] + (-1,))
+
+        # Empty elements may be given as a 2d boolean mask or as flat indices
+        if np.asarray(empty_element_m).dtype == bool:
+            empty_element_m = np.ravel(empty_element_m)
         # Actualize cic electrons in prescan and overscan pixels
         # XXX Another place where we are fudging a little
-        actualized_e_full[empty_element_m] = np.random.poisson(actualized_e_full[empty_element_m]
-                                                               + self.cic)
+        with self._stage('cic'):
+            actualized_e_full_flat[..., empty_element_m] = rng.poisson(
+                actualized_e_full_flat[..., empty_element_m] + self.cic)
         # XXX Call arcticpy here
-        # Flatten row by row
-        actualized_e_full_flat = actualized_e_full.ravel()
 
         # Clock electrons through serial register elements
         serial_counts = self._serial_register_elements(actualized_e_full_flat)
 
         # Clock electrons through gain register elements
-        gain_counts = self._gain_register_elements(serial_counts)
+        gain_counts = self._gain_register_elements(serial_counts, rng)
 
         return gain_counts
 
-    def readout(self, gain_counts):
+    def readout(self, gain_counts, rng=None, frame_shape=None,
+                element_inds=None):
         # Pass electrons through amplifier
-        amp_ev = self._amp(gain_counts)
+        amp_ev = self._amp(gain_counts, rng, frame_shape, element_inds)
 
         # Pass amp electron volt counts through analog to digital converter
         output_dn = self._adc(amp_ev)
 
         return output_dn
 
-    def _imaging_area_elements(self, fluxmap_full, frametime, cosm_actualized_e):
+    def _imaging_area_elements(self, fluxmap_full, frametime, cosm_actualized_e,
+                               rng=None):
         """Simulate imaging area pixel behavior for a given fluxmap and
         frametime.
 
@@ -283,32 +864,44 @@ class EMCCDDetectBase:
             Frame exposure time (s).
         cosm_actualized_e : array_like
             Electrons actualized from cosmic rays, same size as fluxmap_full (-e).
+        rng : numpy.random.Generator, optional
+            Random number generator. Defaults to None, in which case self.rng
+            (or the global numpy.random state) is used.
 
         Returns
         -------
         actualized_e : array_like
             Map of actualized electrons (e-).
 
+        Notes
+        -----
+        To avoid temporaries, fluxmap_full is turned into the mean expected
+        rate and cosm_actualized_e into the actualized electrons in place.
+
         """
-        # Calculate mean photo-electrons after integrating over frametime
-        mean_phe_map = fluxmap_full * frametime * self.qe
+        rng = self._stage_rng(rng)
 
-        # Calculate mean expected rate after integrating over frametime
-        mean_dark = self.dark_current * frametime
-        mean_noise = mean_dark + self.cic
+        with self._stage('integrate'):
+            # Calculate mean photo-electrons after integrating over frametime
+            mean_phe_map = fluxmap_full
+            mean_phe_map *= frametime
+            mean_phe_map *= self.qe
 
-        # Set mean expected rate (commonly referred to as lambda)
-        self.mean_expected_rate = mean_phe_map + mean_noise
+            # Calculate mean expected rate after integrating over frametime
+            mean_dark = self.dark_current * frametime
+            mean_noise = mean_dark + self.cic
 
-        # Actualize electrons at the pixels
-        actualized_e = np.random.poisson(self.mean_expected_rate).astype(float)
+            # Set mean expected rate (commonly referred to as lambda)
+            mean_phe_map += mean_noise
+            self.mean_expected_rate = mean_phe_map
 
-        # Add cosmic ray effects
-        # XXX Maybe change this to units of flux later
-        actualized_e += cosm_actualized_e
+            # Actualize electrons at the pixels and add cosmic ray effects
+            # XXX Maybe change this to units of flux later
+            actualized_e = cosm_actualized_e
+            actualized_e += rng.poisson(self.mean_expected_rate)
 
-        # Cap at pixel full well capacity
-        actualized_e[actualized_e > self.full_well_image] = self.full_well_image
+            # Cap at pixel full well capacity
+            np.minimum(actualized_e, self.full_well_image, out=actualized_e)
 
         return actualized_e
 
@@ -329,13 +922,22 @@ class EMCCDDetectBase:
         serial_counts = actualized_e_full_flat
         return serial_counts
 
-    def _gain_register_elements(self, serial_counts):
+    def _gain_register_elements(self, serial_counts, rng=None,
+                                segment_bounds=None):
         """Simulate gain register element behavior.
 
         Parameters
         ----------
         serial_counts : array_like
             Electrons counts after passing through serial register elements.
+        rng : numpy.random.Generator, optional
+            Random number generator. Defaults to None, in which case self.rng
+            (or the global numpy.random state) is used.
+        segment_bounds : array_like, optional
+            Start indices of the runs of consecutively read out elements in
+            1d serial_counts, plus its length, for elements gathered from
+            separate parts of the frame. Saturation tails are kept within each
+            run. Defaults to None, for a single run.
 
         Returns
         -------
@@ -344,28 +946,71 @@ class EMCCDDetectBase:
 
         """
         # Apply EM gain
-        gain_counts = np.zeros_like(serial_counts)
+        rng = self._stage_rng(rng)
+        gain_counts = self._em_gain(serial_counts, rng)
+
+        # Simulate saturation tails (tails never cross from one frame into
+        # the next)
+        with self._stage('sat_tails'):
+            if self.cr_rate != 0:
+                if segment_bounds is not None:
+                    for start, stop in zip(segment_bounds[:-1],
+                                           segment_bounds[1:]):
+                        sat_tails(gain_counts[start:stop],
+                                  self.full_well_serial)
+                elif gain_counts.ndim == 1:
+                    gain_counts = sat_tails(gain_counts, self.full_well_serial)
+                else:
+                    for frame_counts in gain_counts:
+                        sat_tails(frame_counts, self.full_well_serial)
 
-        gain_counts = rand_em_gain(
-            n_in_array=serial_counts,
-            em_gain=self.em_gain)
+        # Cap at full well capacity of gain register
+        np.minimum(gain_counts, self.full_well_serial, out=gain_counts)
 
-        # Simulate saturation tails
-        if self.cr_rate != 0:
-            gain_counts = sat_tails(gain_counts, self.full_well_serial)
+        return gain_counts
 
-        # Cap at full well capacity of gain register
-        gain_counts[gain_counts > self.full_well_serial] = self.full_well_serial
+    def _em_gain(self, serial_counts, rng):
+        """Apply random EM gain to serial register electron counts."""
+        with self._stage('em_gain'):
+            if self.em_gain_sampler is None:
+                gain_counts = rand_em_gain(
+                    n_in_array=serial_counts,
+                    em_gain=self.em_gain,
+                    rng=rng)
+            elif isinstance(rng, _FrameRNGs):
+                # The sampler draws in its own order, so go frame by frame
+                gain_counts = np.stack([
+                    self.em_gain_sampler(frame_counts, self.em_gain, frame_rng)
+                    for frame_counts, frame_rng in zip(serial_counts, rng)
+                ])
+            else:
+                gain_counts = self.em_gain_sampler(serial_counts, self.em_gain,
+                                                   rng)
+            if gain_counts.dtype != self.dtype:
+                gain_counts = gain_counts.astype(self.dtype)
 
         return gain_counts
 
-    def _amp(self, serial_counts):
+    def _amp(self, serial_counts, rng=None, frame_shape=None,
+             element_inds=None):
         """Simulate amp behavior.
 
         Parameters
         ----------
         serial_counts : array_like
             Electron counts from the serial register.
+        rng : numpy.random.Generator, optional
+            Random number generator. Defaults to None, in which case self.rng
+            (or the global numpy.random state) is used.
+        frame_shape : tuple, optional
+            Shape of one frame, where serial_counts is a frame or a stack of
+            frames, flattened or not. Needed for the bias patterns of a noise
+            bank. Defaults to None, in which case the last axis of
+            serial_counts is taken as one frame.
+        element_inds : array_like, optional
+            Flat indices in a frame of shape frame_shape of the elements of 1d
+            serial_counts, for elements gathered from parts of a frame.
+            Defaults to None.
 
         Returns
         -------
@@ -378,32 +1023,97 @@ class EMCCDDetectBase:
         after the application of EM gain.
 
         """
-        # Create read noise distribution in units of electrons
-        read_noise_e = self.read_noise * np.random.normal(size=serial_counts.shape)
+        rng = self._stage_rng(rng)
+        with self._stage('amp'):
+            # Apply read noise and bias to counts to get output electron volts,
+            # reusing the read noise array
+            amp_ev = self._read_noise_e(serial_counts.shape, rng, frame_shape,
+                                        element_inds)
+            amp_ev += serial_counts
+            amp_ev += self.bias
 
-        # Apply read noise and bias to counts to get output electron volts
-        amp_ev = serial_counts + read_noise_e + self.bias
+        return amp_ev
+
+    def _amp_events(self, shape, event_inds, event_counts, rng=None):
+        """Simulate amp behavior for serial register counts given as events.
+
+        Parameters
+        ----------
+        shape : tuple
+            Shape of the frame.
+        event_inds : array_like
+            Flat indices of the nonzero elements of the frame.
+        event_counts : array_like
+            Electron counts of the nonzero elements of the frame.
+        rng : numpy.random.Generator, optional
+            Random number generator. Defaults to None, in which case self.rng
+            (or the global numpy.random state) is used.
+
+        Returns
+        -------
+        amp_ev : array_like
+            Output from amp, shape shape (eV).
+
+        """
+        rng = self._stage_rng(rng)
+        with self._stage('amp'):
+            # The dense frame is only made here, starting from the read noise
+            amp_ev = self._read_noise_e(shape, rng, shape)
+            amp_ev += self.bias
+            amp_ev.reshape(-1)[event_inds] += event_counts
 
         return amp_ev
 
+    def _read_noise_e(self, shape, rng, frame_shape=None, element_inds=None):
+        """Draw read noise (e-), as a new array of type self.dtype."""
+        if self.noise_bank is not None:
+            read_noise_e = np.empty(shape, dtype=self.dtype)
+            if element_inds is not None:
+                frames = read_noise_e.reshape(1, -1)
+            elif frame_shape is not None:
+                frames = read_noise_e.reshape(-1, int(np.prod(frame_shape)))
+            else:
+                frames = read_noise_e.reshape(-1, shape[-1])
+            row_len = None if frame_shape is None else frame_shape[-1]
+            if isinstance(rng, _FrameRNGs):
+                frame_rngs = rng
+            else:
+                frame_rngs = itertools.repeat(rng)
+            for frame, frame_rng in zip(frames, frame_rngs):
+                self.noise_bank.fill(frame, self.read_noise, frame_rng,
+                                     row_len, element_inds)
+            return read_noise_e
+
+        if rng is np.random:
+            read_noise_e = rng.standard_normal(size=shape)
+            read_noise_e = read_noise_e.astype(self.dtype, copy=False)
+        else:
+            read_noise_e = rng.standard_normal(size=shape, dtype=self.dtype)
+        read_noise_e *= self.read_noise
+
+        return read_noise_e
+
     def _adc(self, amp_ev):
         """Simulate analog to digital converter behavior.
 
         Parameters
         ----------
         amp_ev : array_like
-            Electron volt counts from amp (eV).
+            Electron volt counts from amp (eV). Modified in place.
 
         Returns
         -------
         output_dn : array_like
-            Analog to digital converter output (dn).
+            Analog to digital converter output, of type self.adc_dtype (dn).
 
         """
         # Convert from electron volts to dn
         dn_min = 0
         dn_max = 2**self.nbits - 1
-        output_dn = np.clip(amp_ev / self.eperdn, dn_min, dn_max).astype(np.uint64)
+        with self._stage('adc'):
+            np.divide(amp_ev, self.eperdn, out=amp_ev)
+            np.clip(amp_ev, dn_min, dn_max, out=amp_ev)
+            output_dn = amp_ev.astype(self.adc_dtype)
 
         return output_dn
 
@@ -413,6 +1123,9 @@ class EMCCDDetect(EMCCDDetectBase):
 
     This class gives a method for simulating full frames (sim_full_frame) and
     also for adding simulated noise only to the input fluxmap (sim_sub_frame).
+    Stacks of frames can be simulated in one vectorized pass with
+    sim_full_frames and sim_sub_frames. Sparse (photon counting)
+    frames can be simulated as events, see update_sparse_mode.
 
     Parameters
     ----------
@@ -446,6 +1159,15 @@ class EMCCDDetect(EMCCDDetectBase):
         Defaults to 604.
     meta_path : str
         Full path of metadata yaml.
+    rng : {None, int, SeedSequence, BitGenerator, Generator}, optional
+        Source of randomness, see EMCCDDetectBase. Defaults to None, in which
+        case the global numpy.random state is used.
+    dtype : {numpy.float64, numpy.float32}, optional
+        Floating point precision of the simulation work arrays. Defaults to
+        numpy.float64.
+    adc_dtype : {'auto', unsigned integer dtype}, optional
+        Dtype of the ADC output frames, see EMCCDDetectBase. Defaults to
+        numpy.uint64.
 
     """
     def __init__(
@@ -463,7 +1185,10 @@ class EMCCDDetect(EMCCDDetectBase):
         eperdn=None,
         nbits=14,
         numel_gain_register=604,
-        meta_path=None
+        meta_path=None,
+        rng=None,
+        dtype=np.float64,
+        adc_dtype=np.uint64
     ):
         # If no metadata file path specified, default to metadata.yaml in util
         if meta_path is None:
@@ -493,7 +1218,10 @@ class EMCCDDetect(EMCCDDetectBase):
             pixel_pitch=pixel_pitch,
             eperdn=eperdn,
             nbits=nbits,
-            numel_gain_register=numel_gain_register
+            numel_gain_register=numel_gain_register,
+            rng=rng,
+            dtype=dtype,
+            adc_dtype=adc_dtype
         )
 
     def sim_full_frame(self, fluxmap, frametime):
@@ -516,34 +1244,685 @@ class EMCCDDetect(EMCCDDetectBase):
             Detector output counts, including prescan/overscan (dn).
 
         """
-        # Initialize the imaging area pixels
-        imaging_area_zeros = self.meta.imaging_area_zeros.copy()
-        # Embed the fluxmap within the imaging area. Create a mask for
-        # referencing the input fluxmap subsection later
+        rng = self._frame_rngs()
+
+        with self._profile_frames(1):
+            # Initialize the imaging area pixels
+            imaging_area_zeros = np.zeros(self.meta.imaging_area_zeros.shape,
+                                          dtype=self.dtype)
+            # Embed the fluxmap within the imaging area. Create a mask for
+            # referencing the input fluxmap subsection later
+            fluxmap_full = self.meta.embed_im(imaging_area_zeros, 'image',
+                                              fluxmap)
+            exposed_pix_m = self.meta.exposed_pix_m
+            empty_element_inds = self.meta.empty_element_inds
+            if self._use_sparse(fluxmap_full, frametime, exposed_pix_m,
+                                len(empty_element_inds)):
+                # Simulate the whole frame as events
+                return self._sim_frame_sparse(
+                    fluxmap_full, frametime, exposed_pix_m,
+                    self.meta.full_frame_zeros.shape, rng,
+                    imaging_inds=self.meta.imaging_element_inds,
+                    empty_inds=empty_element_inds)
+
+            # Simulate the integration process
+            actualized_e = self._integrate(fluxmap_full, frametime, exposed_pix_m,
+                                           rng)
+
+            # Simulate parallel clocking
+            parallel_counts = self.clock_parallel(actualized_e)
+
+            # Initialize the serial register elements.
+            full_frame_zeros = np.zeros(self.meta.full_frame_zeros.shape,
+                                        dtype=self.dtype)
+            # Embed the imaging area within the full frame. Create a mask for
+            # referencing the prescan and overscan subsections later
+            parallel_counts_full = self.meta.imaging_embed(full_frame_zeros, parallel_counts)
+            # Simulate serial clocking, with the empty elements given by index
+            gain_counts = self.clock_serial(parallel_counts_full,
+                                            self.meta.empty_element_inds, rng)
+
+            # Simulate amplifier and adc redout
+            output_dn = self.readout(gain_counts, rng,
+                                     parallel_counts_full.shape)
+
+        # Reshape from 1d to 2d
+        return output_dn.reshape(parallel_counts_full.shape)
+
+    def sim_full_frame_roi(self, fluxmap, frametime, regions,
+                           tail_context=None):
+        """Simulate only some regions of a full detector frame.
+
+        This runs the same algorithm as sim_full_frame, but only for the
+        elements needed to get the requested regions right, so the cost
+        scales with the size of the regions rather than of the frame. e.g. for
+        a patch of the image area and a few prescan columns for the bias.
+
+        The elements simulated are those of the regions themselves, plus:
+        - with CTI (see update_cti), the imaging area rows between each region
+          and the serial register, whose charge is clocked through the
+          region's pixels, restricted to window_range;
+        - with cosmics, a margin of pixels around the imaging area part so
+          that hits just outside still spill in, and the tail_context serial
+          elements read out before each region row, whose saturation tails
+          can reach it.
+
+        Parameters
+        ----------
+        fluxmap : array_like
+            Input fluxmap, same shape as self.meta.geom['image'] (phot/pix/s).
+        frametime : float
+            Frame exposure time (s).
+        regions : list of {str, tuple}
+            Regions to simulate, each either a key of self.meta.geom (e.g.
+            'image' or 'prescan') or a window (row_start, row_end, col_start,
+            col_end) of full frame pixels, with the ends exclusive.
+        tail_context : int, optional
+            Number of serial register elements read out before each region row
+            to include for saturation tails, which are only simulated with
+            cosmics. Defaults to None, in which case the longest tail that the
+            image area full well can produce at this EM gain is used.
+
+        Returns
+        -------
+        output_counts : list of array_like
+            Detector output counts of each region (dn).
+
+        Notes
+        -----
+        Regions are simulated together, so overlapping regions have the same
+        counts where they overlap. The imaging area is simulated over the
+        bounding box of all the region pixels (and context) in it, so regions
+        spread across it cost more than a single region of the same size.
+
+        The number of cosmic hits is set by the area simulated (see
+        cosmic_hits), and arcticpy's express approximation by the number of
+        rows clocked, so these match sim_full_frame statistically rather than
+        exactly. With express=0 (every transfer modeled) the CTI is the same.
+
+        """
+        frame_rows, frame_cols = self.meta.full_frame_zeros.shape
+        windows = [self._roi_window(region) for region in regions]
+        if tail_context is None:
+            tail_context = self._sat_tail_context()
+        if self.cr_rate == 0:
+            tail_context = 0
+
+        # Flat full frame indices of the elements to read out, in runs of
+        # consecutive elements
+        flat_inds, segment_bounds = _roi_flat_inds(windows, frame_cols,
+                                                   tail_context)
+        rows, cols = np.divmod(flat_inds, frame_cols)
+
+        rng = self._frame_rngs()
+
+        with self._profile_frames(1):
+            serial_e = np.zeros(len(flat_inds), dtype=self.dtype)
+
+            # Imaging area elements
+            rows_im = rows - self.meta.r0c0_im[0]
+            cols_im = cols - self.meta.r0c0_im[1]
+            im_m = ((rows_im >= 0) & (rows_im < self.meta.rows_im)
+                    & (cols_im >= 0) & (cols_im < self.meta.cols_im))
+            if im_m.any():
+                actualized_e, (r0, c0) = self._imaging_area_roi(
+                    fluxmap, frametime, rows_im[im_m], cols_im[im_m], rng)
+                serial_e[im_m] = actualized_e[rows_im[im_m] - r0,
+                                              cols_im[im_m] - c0]
+
+            # Actualize cic electrons in the empty (prescan and overscan)
+            # elements
+            with self._stage('cic'):
+                serial_e[~im_m] = rng.poisson(self.cic, size=np.sum(~im_m))
+
+            # Clock electrons through serial and gain register elements
+            serial_counts = self._serial_register_elements(serial_e)
+            gain_counts = self._gain_register_elements(
+                serial_counts, rng, segment_bounds=segment_bounds)
+
+            # Simulate amplifier and adc redout
+            output_dn = self.readout(gain_counts, rng,
+                                     self.meta.full_frame_zeros.shape,
+                                     flat_inds)
+
+        # Pick out each region
+        output_counts = []
+        for row_start, row_end, col_start, col_end in windows:
+            region_inds = (np.arange(row_start, row_end)[:, None] * frame_cols
+                           + np.arange(col_start, col_end))
+            output_counts.append(
+                output_dn[np.searchsorted(flat_inds, region_inds)])
+
+        return output_counts
+
+    def _roi_window(self, region):
+        """Full frame (row_start, row_end, col_start, col_end) of a region."""
+        frame_rows, frame_cols = self.meta.full_frame_zeros.shape
+        if isinstance(region, str):
+            if region not in self.meta.geom:
+                raise EMCCDDetectException('Region {0} is not in the '
+                                           'metadata geometry'.format(region))
+            rs, cs = self.meta.section_slice(region)
+            return rs.start, rs.stop, cs.start, cs.stop
+
+        try:
+            row_start, row_end, col_start, col_end = (int(i) for i in region)
+        except (TypeError, ValueError):
+            raise EMCCDDetectException('Regions must be geometry keys or '
+                                       '(row_start, row_end, col_start, '
+                                       'col_end) windows')
+        if not (0 <= row_start < row_end <= frame_rows
+                and 0 <= col_start < col_end <= frame_cols):
+            raise EMCCDDetectException('Window {0} is empty or outside the '
+                                       'frame'.format(tuple(region)))
+        return row_start, row_end, col_start, col_end
+
+    def _sat_tail_context(self):
+        """Number of elements the longest likely saturation tail reaches."""
+        # Brightest likely gain register output, from a full image pixel
+        max_gain_counts = self.em_gain * (self.full_well_image
+                                          + 6*np.sqrt(self.full_well_image))
+        overflow = max_gain_counts - self.full_well_serial
+        if overflow <= 0:
+            return 0
+        return _max_tail_len(overflow)
+
+    def _imaging_area_roi(self, fluxmap, frametime, rows_im, cols_im, rng):
+        """Integrate and clock the imaging area pixels needed for a ROI.
+
+        Parameters
+        ----------
+        fluxmap : array_like
+            Input fluxmap, same shape as self.meta.geom['image'] (phot/pix/s).
+        frametime : float
+            Frame exposure time (s).
+        rows_im, cols_im : array_like
+            Imaging area coordinates of the pixels needed.
+        rng : numpy.random.Generator
+            Random number generator.
+
+        Returns
+        -------
+        actualized_e : array_like
+            Electrons after parallel clocking, for a box of the imaging area
+            containing the pixels (e-).
+        r0c0 : tuple
+            Imaging area coordinates of the corner of the box.
+
+        """
+        r0, r1 = rows_im.min(), rows_im.max() + 1
+        c0, c1 = cols_im.min(), cols_im.max() + 1
+        if self.cr_rate != 0:
+            # Cosmic hits are up to a few pixels across
+            margin = _COSMIC_MARGIN
+            r0, r1 = max(r0 - margin, 0), min(r1 + margin, self.meta.rows_im)
+            c0, c1 = max(c0 - margin, 0), min(c1 + margin, self.meta.cols_im)
+        if self.ccd is not None and self.roe is not None and self.traps is not None:
+            # Charge from all the rows closer to the serial register is
+            # clocked through the pixels, and with traps kept between columns
+            # from all the columns before them too
+            r0 = 0
+            if not getattr(self.roe, 'empty_traps_between_columns', True):
+                c0 = 0
+
+        # Fluxmap and exposed pixels within the box
+        fluxmap_box = np.zeros((r1 - r0, c1 - c0), dtype=self.dtype)
+        rs, cs = self.meta.section_slice_im('image')
+        im_rows = slice(max(rs.start, r0), min(rs.stop, r1))
+        im_cols = slice(max(cs.start, c0), min(cs.stop, c1))
+        if im_rows.start < im_rows.stop and im_cols.start < im_cols.stop:
+            fluxmap_box[im_rows.start-r0:im_rows.stop-r0,
+                        im_cols.start-c0:im_cols.stop-c0] = np.asarray(
+                fluxmap)[im_rows.start-rs.start:im_rows.stop-rs.start,
+                         im_cols.start-cs.start:im_cols.stop-cs.start]
+        exposed_pix_m = self.meta.exposed_pix_m[r0:r1, c0:c1]
+
+        # Simulate the integration process
+        actualized_e = self._integrate(fluxmap_box, frametime, exposed_pix_m,
+                                       rng)
+
+        # Simulate parallel clocking
+        parallel_counts = self.clock_parallel(actualized_e)
+
+        return parallel_counts, (r0, c0)
+
+    def sim_full_frames(self, fluxmap, frametime, nframes=None):
+        """Simulate a stack of full detector frames in one pass.
+
+        This runs the same algorithm as sim_full_frame, but on a whole stack of
+        frames at once, so the per-frame Python overhead, mask building and
+        temporary allocations are paid only once per stack.
+
+        Parameters
+        ----------
+        fluxmap : array_like
+            Input fluxmap, same shape as self.meta.geom['image'] (phot/pix/s),
+            used for every frame, or a 3d cube of such fluxmaps with one
+            fluxmap per frame.
+        frametime : float or array_like
+            Frame exposure time (s), either shared by all frames or given per
+            frame.
+        nframes : int
+            Number of frames to simulate. Defaults to the length of the
+            fluxmap cube or of the per-frame frametimes.
+
+        Returns
+        -------
+        output_counts : array_like
+            Detector output counts, including prescan/overscan, shape
+            (nframes, frame_rows, frame_cols) (dn).
+
+        """
+        fluxmap, frametime, nframes = _frame_inputs(fluxmap, frametime,
+                                                    nframes)
+
+        # Initialize the imaging area pixels of every frame
+        imaging_area_zeros = np.zeros((nframes,)
+                                      + self.meta.imaging_area_zeros.shape,
+                                      dtype=self.dtype)
+        # Embed the fluxmaps within the imaging areas (a 2d fluxmap is
+        # broadcast to every frame)
         fluxmap_full = self.meta.embed_im(imaging_area_zeros, 'image',
-                                          fluxmap.copy())
-        exposed_pix_m = self.meta.imaging_slice(self.meta.mask('image'))
+                                          fluxmap)
+        # Initialize the serial register elements of every frame
+        full_frame_zeros = np.zeros((nframes,)
+                                    + self.meta.full_frame_zeros.shape,
+                                    dtype=self.dtype)
+
+        return self._sim_full_frame_stack(fluxmap_full, frametime,
+                                          full_frame_zeros,
+                                          self._frame_rngs(nframes))
+
+    def sim_full_frame_stream(self, fluxmaps, frametime, chunk_size=None):
+        """Generate full detector frames from an iterable of fluxmaps.
+
+        Frames are simulated in chunks of chunk_size using preallocated work
+        buffers which are reused for every chunk, so the working set stays
+        bounded no matter how long the sequence is. This allows consumers such
+        as running means or histograms to process sequences far larger than
+        memory.
+
+        Parameters
+        ----------
+        fluxmaps : iterable
+            Iterable (e.g. a generator) of input fluxmaps, each the same shape
+            as self.meta.geom['image'] (phot/pix/s). Use itertools.repeat to
+            simulate many frames of the same fluxmap.
+        frametime : float or iterable
+            Frame exposure time (s), either shared by all frames or an iterable
+            giving one frametime per fluxmap.
+        chunk_size : int, optional
+            Number of frames simulated and yielded at a time. Defaults to None,
+            in which case single 2d frames are yielded.
+
+        Yields
+        ------
+        output_counts : array_like
+            Detector output counts, including prescan/overscan (dn). Either a
+            single frame or, if chunk_size is given, a stack of up to
+            chunk_size frames (the last chunk may be shorter).
+
+        """
+        if chunk_size is None:
+            nchunk = 1
+        elif isinstance(chunk_size, (int, np.integer)) and chunk_size >= 1:
+            nchunk = chunk_size
+        else:
+            raise EMCCDDetectException('chunk_size must be a positive integer')
+
+        if np.ndim(frametime) == 0:
+            frametimes = itertools.repeat(float(frametime))
+        else:
+            frametimes = iter(frametime)
+
+        # Work buffers, reused for every chunk
+        imaging_area_buf = np.zeros((nchunk,)
+                                    + self.meta.imaging_area_zeros.shape,
+                                    dtype=self.dtype)
+        full_frame_buf = np.zeros((nchunk,) + self.meta.full_frame_zeros.shape,
+                                  dtype=self.dtype)
+        chunk_frametimes = np.zeros(nchunk)
+
+        n = 0
+        for fluxmap, frame_frametime in zip(fluxmaps, frametimes):
+            imaging_area_buf[n].fill(0)
+            self.meta.embed_im(imaging_area_buf[n], 'image', fluxmap)
+            chunk_frametimes[n] = frame_frametime
+            n += 1
+
+            if n == nchunk:
+                yield self._stream_chunk(imaging_area_buf, chunk_frametimes,
+                                         full_frame_buf, n, chunk_size)
+                n = 0
+
+        # Flush the final partial chunk
+        if n > 0:
+            yield self._stream_chunk(imaging_area_buf, chunk_frametimes,
+                                     full_frame_buf, n, chunk_size)
+
+    def open_frame_sink(self, path, nframes, frametime=None):
+        """Open a file to write a sequence of full frames into.
+
+        The file is preallocated for nframes frames of type self.adc_dtype and
+        memory mapped, see frame_sink.FrameSink, except for compressed FITS
+        files, which get frames of the smallest unsigned integer type holding
+        nbits. Its header records the detector parameters and the metadata
+        geometry.
+
+        Parameters
+        ----------
+        path : str
+            Path of a .npy, .fits or .fits.fz file to create, see
+            frame_sink.open_frame_sink.
+        nframes : int
+            Number of frames in the file.
+        frametime : float, optional
+            Frame exposure time (s) to record in the header, if it is the same
+            for every frame. Defaults to None.
+
+        Returns
+        -------
+        frame_sink.FrameSink
+            Open sink, to append frames to and then close.
+
+        """
+        header = {
+            'EM_GAIN': self.em_gain,
+            'FULL_WELL_IMAGE': self.full_well_image,
+            'FULL_WELL_SERIAL': self.full_well_serial,
+            'DARK_CURRENT': self.dark_current,
+            'CIC': self.cic,
+            'READ_NOISE': self.read_noise,
+            'BIAS': self.bias,
+            'QE': self.qe,
+            'CR_RATE': self.cr_rate,
+            'PIXEL_PITCH': self.pixel_pitch,
+            'EPERDN': self.eperdn,
+            'NBITS': self.nbits,
+            'NUMEL_GAIN_REGISTER': self.numel_gain_register,
+        }
+        if frametime is not None:
+            header['FRAMETIME'] = frametime
+        for section, geom in self.meta.geom.items():
+            for key, value in geom.items():
+                prefix = 'GEOM_{0}_'.format(section.upper())
+                if key == 'r0c0':
+                    header[prefix + 'R0'], header[prefix + 'C0'] = value
+                else:
+                    header[prefix + key.upper()] = value
+
+        dtype = self.adc_dtype
+        if Path(path).suffix.lower() == '.fz':
+            # Tile compression only takes integers of up to 32 bits
+            dtype = _min_uint_dtype(self.nbits)
+
+        return open_frame_sink(path, self.meta.full_frame_zeros.shape,
+                               nframes, dtype, header)
+
+    def write_frames(self, path, fluxmap, frametime, nframes=None,
+                     chunk_size=None, queue_size=2):
+        """Simulate a sequence of full frames straight into a file.
+
+        Frames are simulated with sim_full_frame_stream and handed to a writer
+        thread, which appends them to a file opened with open_frame_sink (and
+        compresses them first for a .fits.fz file) while the next frames are
+        simulated. See pipeline.FramePipeline. Only a few chunks (by default
+        single frames) are held in memory however long the sequence is.
+
+        Parameters
+        ----------
+        path : str
+            Path of a .npy, .fits or .fits.fz file to create, see
+            open_frame_sink.
+        fluxmap : array_like or iterable
+            Input fluxmap, same shape as self.meta.geom['image'] (phot/pix/s),
+            used for every frame, or an iterable (e.g. a 3d cube or a
+            generator) of such fluxmaps with one fluxmap per frame.
+        frametime : float or array_like
+            Frame exposure time (s), either shared by all frames or given per
+            frame.
+        nframes : int, optional
+            Number of frames to simulate. Defaults to the length of the
+            fluxmaps or of the per-frame frametimes.
+        chunk_size : int, optional
+            Number of frames simulated and written at a time. Defaults to
+            None, for one frame at a time.
+        queue_size : int, optional
+            Largest number of frames (or chunks) simulated but not yet
+            written, beyond which the simulation waits for the writer. 0
+            writes each frame in this thread before simulating the next.
+            Defaults to 2.
+
+        Returns
+        -------
+        dict
+            Throughput report of simulating ('make') and writing ('write') the
+            frames, see pipeline.FramePipeline.run.
+
+        """
+        if np.ndim(fluxmap) == 2:
+            fluxmaps = itertools.repeat(fluxmap)
+        else:
+            fluxmaps = fluxmap
+        if nframes is None:
+            if np.ndim(frametime) == 1:
+                nframes = len(frametime)
+            elif hasattr(fluxmaps, '__len__'):
+                nframes = len(fluxmaps)
+            else:
+                raise EMCCDDetectException('nframes must be specified for a '
+                                           'single fluxmap or a generator')
+        if np.ndim(frametime) == 1 and len(frametime) != nframes:
+            raise EMCCDDetectException('frametime does not have one value per '
+                                       'frame')
+        shared_frametime = None if np.ndim(frametime) else frametime
+
+        with self.open_frame_sink(path, nframes, shared_frametime) as sink:
+            stream = self.sim_full_frame_stream(
+                itertools.islice(fluxmaps, nframes), frametime, chunk_size)
+            report = FramePipeline(sink, queue_size).run(stream)
+            if sink.n_written < nframes:
+                raise EMCCDDetectException('Ran out of fluxmaps after {0} of '
+                                           '{1} frames'.format(sink.n_written,
+                                                               nframes))
+
+        return report
+
+    def sim_frames_parallel(self, fluxmap, frametime, n_workers=None,
+                            nframes=None, chunk_size=None, out=None):
+        """Simulate a stack of full detector frames on a pool of processes.
+
+        Frames are farmed out in chunks to worker processes. The detector is
+        sent to each worker once, when the worker starts, and the fluxmaps and
+        output frames live in shared memory, so only frame indices and seeds
+        are passed per chunk. Every frame gets its own random stream spawned
+        from self.rng, so for a seeded detector the output is identical to
+        sim_full_frames and does not depend on n_workers or chunk_size.
+
+        Parameters
+        ----------
+        fluxmap : array_like
+            Input fluxmap, same shape as self.meta.geom['image'] (phot/pix/s),
+            used for every frame, or a 3d cube of such fluxmaps with one
+            fluxmap per frame.
+        frametime : float or array_like
+            Frame exposure time (s), either shared by all frames or given per
+            frame.
+        n_workers : int, optional
+            Number of worker processes. Defaults to os.cpu_count().
+        nframes : int, optional
+            Number of frames to simulate. Defaults to the length of the
+            fluxmap cube or of the per-frame frametimes.
+        chunk_size : int, optional
+            Number of frames simulated per task. Defaults to spreading the
+            frames over about four tasks per worker.
+        out : array_like, optional
+            Array of shape (nframes, frame_rows, frame_cols) and type
+            self.adc_dtype to copy the frames into, e.g. a numpy.memmap.
+            Defaults to None, in which case a new array is allocated.
+
+        Returns
+        -------
+        output_counts : array_like
+            Detector output counts, including prescan/overscan, shape
+            (nframes, frame_rows, frame_cols) (dn). The same array as out if
+            it is given.
+
+        """
+        fluxmap, frametime, nframes = _frame_inputs(fluxmap, frametime,
+                                                    nframes)
+        if n_workers is None:
+            n_workers = os.cpu_count() or 1
+        if not isinstance(n_workers, (int, np.integer)) or n_workers < 1:
+            raise EMCCDDetectException('n_workers must be a positive integer')
+        if chunk_size is None:
+            chunk_size = -(-nframes // (4*n_workers))
+        elif not isinstance(chunk_size, (int, np.integer)) or chunk_size < 1:
+            raise EMCCDDetectException('chunk_size must be a positive integer')
+
+        # Shared memory is only available from Python 3.8
+        from multiprocessing import shared_memory
+
+        bit_generator, seed_seqs = self._spawn_seed_seqs(nframes)
+        out_shape = (nframes,) + self.meta.full_frame_zeros.shape
+        out_dtype = self.adc_dtype
+        if out is None:
+            # Allocated up front, so that running out of memory for it does
+            # not waste the simulation
+            out = np.empty(out_shape, dtype=out_dtype)
+        elif out.shape != out_shape or out.dtype != out_dtype:
+            raise EMCCDDetectException('out must have shape {0} and type '
+                                       '{1}'.format(out_shape, out_dtype))
+
+        fluxmap_shm = None
+        out_shm = None
+        try:
+            fluxmap_shm = shared_memory.SharedMemory(create=True,
+                                                     size=fluxmap.nbytes)
+            out_shm = shared_memory.SharedMemory(
+                create=True,
+                size=int(np.prod(out_shape)) * out_dtype.itemsize)
+            np.ndarray(fluxmap.shape, dtype=fluxmap.dtype,
+                       buffer=fluxmap_shm.buf)[...] = fluxmap
+            with ProcessPoolExecutor(
+                max_workers=n_workers,
+                initializer=_init_frame_worker,
+                initargs=(self, fluxmap_shm.name, fluxmap.shape,
+                          out_shm.name, out_shape, out_dtype.str, frametime,
+                          bit_generator)
+            ) as executor:
+                futures = [
+                    executor.submit(_sim_frame_chunk, start,
+                                    min(start+chunk_size, nframes),
+                                    seed_seqs[start:start+chunk_size])
+                    for start in range(0, nframes, chunk_size)
+                ]
+                for future in futures:
+                    records = future.result()
+                    if self.profiler is not None:
+                        self.profiler.add_records(records)
+
+            out[...] = np.ndarray(out_shape, dtype=out_dtype,
+                                  buffer=out_shm.buf)
+        finally:
+            # Only unlink the blocks which were created
+            for shm in (fluxmap_shm, out_shm):
+                if shm is not None:
+                    shm.close()
+                    shm.unlink()
+
+        return out
+
+    def _stream_chunk(self, imaging_area_buf, chunk_frametimes, full_frame_buf,
+                      n, chunk_size):
+        """Simulate the first n frames held in the stream work buffers."""
+        full_frame_buf[:n].fill(0)
+        output_dn = self._sim_full_frame_stack(imaging_area_buf[:n],
+                                               chunk_frametimes[:n].copy(),
+                                               full_frame_buf[:n],
+                                               self._frame_rngs(n))
+        # The mean expected rate is made in the imaging area buffer, which
+        # is overwritten by the next chunk
+        self.mean_expected_rate = self.mean_expected_rate.copy()
+        if chunk_size is None:
+            return output_dn[0]
+        return output_dn
+
+    def _sim_full_frame_stack(self, fluxmap_full, frametime, full_frame_zeros,
+                              rng):
+        """Simulate a stack of full frames from prepared imaging areas.
+
+        Parameters
+        ----------
+        fluxmap_full : array_like
+            Stack of imaging areas with the fluxmaps embedded (phot/pix/s).
+            Modified in place.
+        frametime : float or array_like
+            Frame exposure time (s), shared or one per frame.
+        full_frame_zeros : array_like
+            Stack of zeroed full frames, used as the serial register work
+            buffer. Modified in place.
+        rng : numpy.random.Generator or _FrameRNGs
+            Random streams for the stack, see _frame_rngs.
+
+        Returns
+        -------
+        output_counts : array_like
+            Detector output counts, including prescan/overscan (dn).
+
+        """
+        with self._profile_frames(len(fluxmap_full)):
+            exposed_pix_m = self.meta.exposed_pix_m
+            empty_element_inds = self.meta.empty_element_inds
+            sparse = self._sparse_frames(fluxmap_full, frametime,
+                                         exposed_pix_m, len(empty_element_inds))
+            if not sparse.any():
+                return self._sim_dense_full_frame_stack(
+                    fluxmap_full, frametime, full_frame_zeros, rng)
+
+            # Simulate the sparse frames as events, one at a time
+            output_dn = np.empty(full_frame_zeros.shape, dtype=self.adc_dtype)
+            for i in np.flatnonzero(sparse):
+                frame_frametime, frame_rng = _stack_part(frametime, rng, i)
+                output_dn[i] = self._sim_frame_sparse(
+                    fluxmap_full[i], frame_frametime, exposed_pix_m,
+                    full_frame_zeros.shape[-2:], frame_rng,
+                    imaging_inds=self.meta.imaging_element_inds,
+                    empty_inds=empty_element_inds)
+
+            # Simulate the rest of the frames together
+            dense = np.flatnonzero(~sparse)
+            if len(dense) > 0:
+                dense_frametime, dense_rng = _stack_part(frametime, rng, dense)
+                output_dn[dense] = self._sim_dense_full_frame_stack(
+                    fluxmap_full[dense], dense_frametime,
+                    full_frame_zeros[:len(dense)], dense_rng)
+
+        return output_dn
+
+    def _sim_dense_full_frame_stack(self, fluxmap_full, frametime,
+                                    full_frame_zeros, rng):
+        """Simulate a stack of full frames element by element."""
+        exposed_pix_m = self.meta.exposed_pix_m
         # Simulate the integration process
-        actualized_e = self.integrate(fluxmap_full, frametime, exposed_pix_m)
+        actualized_e = self._integrate(fluxmap_full, frametime, exposed_pix_m,
+                                       rng)
 
         # Simulate parallel clocking
         parallel_counts = self.clock_parallel(actualized_e)
 
-        # Initialize the serial register elements.
-        full_frame_zeros = self.meta.full_frame_zeros.copy()
-        # Embed the imaging area within the full frame. Create a mask for
-        # referencing the prescan and overscan subsections later
-        parallel_counts_full = self.meta.imaging_embed(full_frame_zeros, parallel_counts)
-        empty_element_m = (self.meta.mask('prescan')
-                           + self.meta.mask('parallel_overscan')
-                           + self.meta.mask('serial_overscan'))
-        # Simulate serial clocking
-        gain_counts = self.clock_serial(parallel_counts_full, empty_element_m)
+        # Embed the imaging areas within the full frames
+        parallel_counts_full = self.meta.imaging_embed(full_frame_zeros,
+                                                       parallel_counts)
+        # Simulate serial clocking, with the empty elements given by index
+        gain_counts = self.clock_serial(parallel_counts_full,
+                                        self.meta.empty_element_inds, rng)
 
         # Simulate amplifier and adc redout
-        output_dn = self.readout(gain_counts)
+        output_dn = self.readout(gain_counts, rng,
+                                 parallel_counts_full.shape[-2:])
 
-        # Reshape from 1d to 2d
+        # Reshape from 1d to 2d per frame
         return output_dn.reshape(parallel_counts_full.shape)
 
     def slice_fluxmap(self, full_frame):
@@ -599,6 +1978,257 @@ class EMCCDDetect(EMCCDDetectBase):
         return (frame_dn * self.eperdn - self.bias) / self.em_gain
 
 
+def _get_seed_seq(bit_generator):
+    """Return the SeedSequence a bit generator was seeded with, if any."""
+    seed_seq = getattr(bit_generator, 'seed_seq',
+                       getattr(bit_generator, '_seed_seq', None))
+    if isinstance(seed_seq, np.random.SeedSequence):
+        return seed_seq
+    return None
+
+
+def _stack_part(frametime, rng, inds):
+    """Frametime and random streams of one frame, or some frames, of a stack."""
+    if np.ndim(frametime):
+        frametime = frametime[inds]
+    if isinstance(rng, _FrameRNGs):
+        if np.ndim(inds):
+            rng = _FrameRNGs(rng[i] for i in inds)
+        else:
+            rng = rng[inds]
+
+    return frametime, rng
+
+
+class _FrameRNGs:
+    """Per-frame random generators acting as one generator on a frame stack.
+
+    Draws for a stack are split along the leading (frame) axis, so frame i
+    only ever consumes stream i. Array arguments must have the leading frame
+    axis; scalar arguments are shared by all frames.
+
+    """
+    def __init__(self, rngs):
+        self.rngs = list(rngs)
+
+    def __len__(self):
+        return len(self.rngs)
+
+    def __getitem__(self, i):
+        return self.rngs[i]
+
+    def __iter__(self):
+        return iter(self.rngs)
+
+    def _draw(self, method, *args, size=None, **kwargs):
+        frame_size = None if size is None else tuple(size)[1:]
+        return np.stack([
+            getattr(rng, method)(*[arg[i] if np.ndim(arg) else arg
+                                   for arg in args], size=frame_size, **kwargs)
+            for i, rng in enumerate(self.rngs)
+        ])
+
+    def poisson(self, lam=1.0, size=None):
+        return self._draw('poisson', lam, size=size)
+
+    def gamma(self, shape, scale=1.0, size=None):
+        return self._draw('gamma', shape, scale, size=size)
+
+    def normal(self, loc=0.0, scale=1.0, size=None):
+        return self._draw('normal', loc, scale, size=size)
+
+    def standard_normal(self, size=None, dtype=np.float64):
+        return self._draw('standard_normal', size=size, dtype=dtype)
+
+
+def _frame_inputs(fluxmap, frametime, nframes):
+    """Check inputs of the multi-frame methods and count the frames.
+
+    Returns the fluxmap as a float array (2d, shared by all frames, or a 3d
+    cube), the frametime as either a float or an array of shape (nframes,),
+    and nframes.
+
+    """
+    fluxmap = np.asarray(fluxmap, dtype=float)
+    if nframes is None and np.ndim(frametime) == 1:
+        nframes = len(frametime)
+    if fluxmap.ndim == 2:
+        if nframes is None:
+            raise EMCCDDetectException('nframes must be specified for a 2d '
+                                       'fluxmap')
+        if not isinstance(nframes, (int, np.integer)) or nframes < 1:
+            raise EMCCDDetectException('nframes must be a positive integer')
+    elif fluxmap.ndim == 3:
+        if nframes is not None and nframes != len(fluxmap):
+            raise EMCCDDetectException('nframes does not match the length of '
+                                       'the fluxmap cube')
+        nframes = len(fluxmap)
+    else:
+        raise EMCCDDetectException('fluxmap must be a 2d array or a 3d cube')
+
+    if np.ndim(frametime) == 0:
+        frametime = float(frametime)
+    else:
+        frametime = np.asarray(frametime, dtype=float)
+        if frametime.shape != (nframes,):
+            raise EMCCDDetectException('frametime must be a float or have one '
+                                       'value per frame')
+
+    return fluxmap, frametime, nframes
+
+
+def _min_uint_dtype(nbits):
+    """Smallest unsigned integer dtype with at least nbits bits."""
+    for dtype in (np.uint8, np.uint16, np.uint32, np.uint64):
+        if np.iinfo(dtype).bits >= nbits:
+            return np.dtype(dtype)
+
+
+def _poisson_events(mean_rate, rng):
+    """Draw Poisson distributed electrons as events.
+
+    Returns one flat index into mean_rate per electron, so elements with more
+    than one electron appear more than once. The total number of electrons is
+    drawn first and then shared out between the elements in proportion to
+    their mean rate, which gives the same independent Poisson distributed
+    counts as drawing every element, for a cost that scales with the number
+    of electrons.
+
+    """
+    cum_rate = np.cumsum(mean_rate, dtype=np.float64)
+    if len(cum_rate) == 0:
+        return np.zeros(0, dtype=np.intp)
+    n_events = rng.poisson(cum_rate[-1])
+    inds = np.searchsorted(cum_rate, rng.random(n_events) * cum_rate[-1],
+                           side='right')
+
+    # Guard against a draw rounding up to the total
+    return np.minimum(inds, len(cum_rate) - 1)
+
+
+# Pixels around a region within which a cosmic hit can reach it
+_COSMIC_MARGIN = 4
+
+
+def _roi_flat_inds(windows, frame_cols, tail_context):
+    """Flat full frame indices of the elements read out for ROI windows.
+
+    Each row of each (row_start, row_end, col_start, col_end) window is
+    preceded by tail_context elements in readout order (wrapping back into
+    previous rows). Returns the sorted unique indices, along with the
+    positions within them where each run of consecutive indices starts, plus
+    their total number.
+
+    """
+    starts = []
+    stops = []
+    for row_start, row_end, col_start, col_end in windows:
+        row_inds = np.arange(row_start, row_end) * frame_cols
+        starts.append(np.maximum(row_inds + col_start - tail_context, 0))
+        stops.append(row_inds + col_end)
+    starts = np.concatenate(starts)
+    stops = np.concatenate(stops)
+
+    # Merge overlapping and adjacent runs
+    order = np.argsort(starts, kind='stable')
+    starts, stops = starts[order], stops[order]
+    run_stops = np.maximum.accumulate(stops)
+    new_run = np.ones(len(starts), dtype=bool)
+    new_run[1:] = starts[1:] > run_stops[:-1]
+    run_starts = starts[new_run]
+    run_stops = run_stops[np.append(new_run[1:], True)]
+
+    run_lens = run_stops - run_starts
+    segment_bounds = np.concatenate(([0], np.cumsum(run_lens)))
+    flat_inds = (np.arange(segment_bounds[-1])
+                 - np.repeat(segment_bounds[:-1] - run_starts, run_lens))
+
+    return flat_inds, segment_bounds
+
+
+def _frame_stack(fluxmap, frametime, nframes, dtype=np.float64):
+    """Expand inputs of the multi-frame methods to a stack of fluxmaps.
+
+    Returns a (nframes, rows, cols) copy of the fluxmap(s) of type dtype and
+    the frametime as either a float or an array of shape (nframes,).
+
+    """
+    fluxmap, frametime, nframes = _frame_inputs(fluxmap, frametime, nframes)
+    fluxmap_stack = np.empty((nframes,) + fluxmap.shape[-2:], dtype=dtype)
+    fluxmap_stack[...] = fluxmap
+
+    return fluxmap_stack, frametime
+
+
+# State of a sim_frames_parallel worker process, set once by the initializer
+_frame_worker = {}
+
+
+def _attach_shm(name):
+    """Attach to an existing shared memory block without taking ownership.
+
+    The creating process unlinks the block. Before Python 3.13 attaching
+    always registers the block with the resource tracker, which the workers
+    share with the parent, so the parent's unlink also covers it.
+
+    """
+    from multiprocessing import shared_memory
+
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+    return shared_memory.SharedMemory(name=name)
+
+
+def _init_frame_worker(emccd, fluxmap_name, fluxmap_shape, out_name, out_shape,
+                       out_dtype, frametime, bit_generator):
+    """Initialize a sim_frames_parallel worker process."""
+    fluxmap_shm = _attach_shm(fluxmap_name)
+    out_shm = _attach_shm(out_name)
+    if emccd.profiler is not None:
+        # Workers only collect records to hand back to the parent
+        emccd.profiler = PipelineProfiler(
+            trace_memory=emccd.profiler.trace_memory)
+    _frame_worker.update(
+        emccd=emccd,
+        shms=(fluxmap_shm, out_shm),
+        fluxmap=np.ndarray(fluxmap_shape, dtype=float, buffer=fluxmap_shm.buf),
+        out=np.ndarray(out_shape, dtype=out_dtype, buffer=out_shm.buf),
+        frametime=frametime,
+        bit_generator=bit_generator
+    )
+
+
+def _sim_frame_chunk(start, stop, seed_seqs):
+    """Simulate frames start:stop into the shared output of a worker."""
+    emccd = _frame_worker['emccd']
+    fluxmap = _frame_worker['fluxmap']
+    frametime = _frame_worker['frametime']
+    bit_generator = _frame_worker['bit_generator']
+    n = stop - start
+
+    imaging_area = np.zeros((n,) + emccd.meta.imaging_area_zeros.shape,
+                            dtype=emccd.dtype)
+    if fluxmap.ndim == 3:
+        fluxmap = fluxmap[start:stop]
+    emccd.meta.embed_im(imaging_area, 'image', fluxmap)
+    if np.ndim(frametime):
+        frametime = frametime[start:stop].copy()
+    full_frame_zeros = np.zeros((n,) + emccd.meta.full_frame_zeros.shape,
+                                dtype=emccd.dtype)
+    rng = _FrameRNGs(np.random.Generator(bit_generator(seed_seq))
+                     for seed_seq in seed_seqs)
+
+    _frame_worker['out'][start:stop] = emccd._sim_full_frame_stack(
+        imaging_area, frametime, full_frame_zeros, rng)
+
+    # Hand the stage profile of the chunk back to the parent
+    if emccd.profiler is None:
+        return []
+    records = emccd.profiler.records
+    emccd.profiler.records = []
+    return records
+
+
 def emccd_detect(
     fluxmap,
     frametime,
@@ -612,7 +2242,8 @@ def emccd_detect(
     qe=0.9,
     cr_rate=0.,
     pixel_pitch=13e-6,
-    shot_noise_on=None
+    shot_noise_on=None,
+    rng=None
 ):
     """Create an EMCCD-detected image for a given fluxmap.
 
@@ -649,6 +2280,9 @@ def emccd_detect(
     shot_noise_on : bool, optional
         Apply shot noise. Defaults to None. [No longer supported as of v2.1.0.
         Input will have no effect.]
+    rng : {None, int, SeedSequence, BitGenerator, Generator}, optional
+        Source of randomness, see EMCCDDetectBase. Defaults to None, in which
+        case the global numpy.random state is used.
 
     Returns
     -------
@@ -687,7 +2321,8 @@ def emccd_detect(
         pixel_pitch=pixel_pitch,
         eperdn=1.,
         nbits=64,
-        numel_gain_register=604
+        numel_gain_register=604,
+        rng=rng
     )
 
     return emccd.sim_sub_frame(fluxmap, frametime).astype(float)
@@ -0,0 +1,319 @@
+# -*- coding: utf-8 -*-
+"""Write sequences of frames into files on disk as they are made."""
+
+import abc
+import io
+import json
+from pathlib import Path
+
+import numpy as np
+
+
+class FrameSinkException(Exception):
+    """Exception class for frame_sink module."""
+
+
+class FrameSink(abc.ABC):
+    """Base class for a cube of frames on disk, filled in order.
+
+    Use NpyFrameSink, FitsFrameSink or CompressedFitsFrameSink, or
+    open_frame_sink to pick one from the path.
+
+    The file is preallocated for nframes frames when the sink is opened and
+    memory mapped, so frames (or chunks of frames) are copied straight into
+    it as they are appended. Dirty pages are written back by the operating
+    system in the background, so only the frames being appended are held in
+    memory and the writing overlaps with simulating the next frames.
+
+    Parameters
+    ----------
+    path : str
+        Path of the file to create. An existing file is overwritten.
+    frame_shape : tuple
+        Shape (rows, cols) of each frame.
+    nframes : int
+        Number of frames in the cube.
+    dtype : data-type
+        Dtype of the frames.
+    header : dict, optional
+        Values to record alongside the frames, e.g. detector parameters.
+        Keys are strings and values are numbers, strings or bools. Defaults to
+        None.
+
+    """
+    def __init__(self, path, frame_shape, nframes, dtype, header=None):
+        if len(frame_shape) != 2:
+            raise FrameSinkException('frame_shape must be (rows, cols)')
+        if not isinstance(nframes, (int, np.integer)) or nframes < 1:
+            raise FrameSinkException('nframes must be a positive integer')
+
+        self.path = Path(path)
+        self.frame_shape = tuple(int(i) for i in frame_shape)
+        self.nframes = int(nframes)
+        self.dtype = np.dtype(dtype)
+        self.header = _header_values(header)
+        self.n_written = 0
+        self._data = self._open()
+
+    @abc.abstractmethod
+    def _open(self):
+        """Create the file and return a writable memory map of the cube."""
+
+    def _store(self, frames):
+        """Convert frames to the values stored in the file."""
+        return frames
+
+    def _write(self, frames):
+        """Write frames into the cube from frame n_written on."""
+        self._data[self.n_written:self.n_written+len(frames)] = \
+            self._store(frames)
+
+    @property
+    def closed(self):
+        return self._data is None
+
+    def append(self, frames):
+        """Write the next frame, or chunk of frames, into the cube.
+
+        Parameters
+        ----------
+        frames : array_like
+            A single frame of shape frame_shape, or a stack of frames of shape
+            (n, rows, cols).
+
+        """
+        if self.closed:
+            raise FrameSinkException('Sink is closed')
+        frames = np.asarray(frames)
+        if frames.ndim == 2:
+            frames = frames[None]
+        if frames.shape[1:] != self.frame_shape:
+            raise FrameSinkException('Frames must have shape {0}'.format(
+                self.frame_shape))
+        stop = self.n_written + len(frames)
+        if stop > self.nframes:
+            raise FrameSinkException('Sink only has room for {0} '
+                                     'frames'.format(self.nframes))
+
+        self._write(frames)
+        self.n_written = stop
+
+    def flush(self):
+        # Write the frames appended so far back to the file
+        if not self.closed:
+            self._data.flush()
+
+    def close(self):
+        """Flush and close the file."""
+        if self.closed:
+            return
+        self._data.flush()
+        # The file is closed once the memory map is released
+        self._data = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class NpyFrameSink(FrameSink):
+    """Frame cube in a .npy file, with the header in a .json file next to it.
+
+    The cube can be read back with numpy.load(path, mmap_mode='r'). See
+    FrameSink for the parameters.
+
+    """
+    @property
+    def header_path(self):
+        return self.path.with_suffix('.json')
+
+    def _open(self):
+        with open(self.header_path, 'w') as f:
+            json.dump(self.header, f, indent=2)
+            f.write('\n')
+
+        return np.lib.format.open_memmap(
+            self.path, mode='w+', dtype=self.dtype,
+            shape=(self.nframes,) + self.frame_shape)
+
+
+class FitsFrameSink(FrameSink):
+    """Frame cube in the primary HDU of a FITS file.
+
+    The header values are recorded as header cards, with HIERARCH cards for
+    keys longer than 8 characters. Unsigned integer frames are stored as
+    signed integers with the standard BZERO offset, so FITS readers such as
+    astropy.io.fits give the unsigned values back. See FrameSink for the
+    parameters.
+
+    """
+    def _open(self):
+        from astropy.io import fits
+
+        if self.dtype not in _FITS_BITPIX:
+            raise FrameSinkException('FITS cannot hold frames of type '
+                                     '{0}'.format(self.dtype))
+        bitpix, bzero = _FITS_BITPIX[self.dtype]
+
+        header = fits.Header()
+        header['SIMPLE'] = True
+        header['BITPIX'] = bitpix
+        header['NAXIS'] = 3
+        header['NAXIS1'] = self.frame_shape[1]
+        header['NAXIS2'] = self.frame_shape[0]
+        header['NAXIS3'] = self.nframes
+        if bzero:
+            header['BZERO'] = bzero
+            header['BSCALE'] = 1
+        header.extend(_fits_header(self.header))
+        header_bytes = header.tostring().encode('ascii')
+
+        # Stored big endian, as signed integers when there is a BZERO offset
+        kind = 'i' if bzero else self.dtype.kind
+        stored_dtype = np.dtype('>{0}{1}'.format(kind, self.dtype.itemsize))
+        data_bytes = (self.nframes * int(np.prod(self.frame_shape))
+                      * stored_dtype.itemsize)
+        with open(self.path, 'wb') as f:
+            f.write(header_bytes)
+            # The data unit is padded to a whole number of FITS blocks
+            f.truncate(len(header_bytes) + -(-data_bytes // _FITS_BLOCK)
+                       * _FITS_BLOCK)
+
+        self._bzero = bzero
+        return np.memmap(self.path, dtype=stored_dtype, mode='r+',
+                         offset=len(header_bytes),
+                         shape=(self.nframes,) + self.frame_shape)
+
+    def _store(self, frames):
+        if not self._bzero:
+            return frames
+        # Subtracting BZERO (2**(bits-1)) from an unsigned integer is the same
+        # as flipping its top bit and reading it as signed
+        frames = frames.astype(self.dtype, copy=False)
+        sign_bit = self.dtype.type(1 << (8*self.dtype.itemsize - 1))
+        return (frames ^ sign_bit).view('i{0}'.format(self.dtype.itemsize))
+
+
+class CompressedFitsFrameSink(FrameSink):
+    """Frames as tile compressed image extensions of a FITS file.
+
+    The primary HDU holds the header values, and each frame is compressed
+    into an extension of its own as it is appended, as for fpack (.fits.fz)
+    files. Unlike the other sinks the file grows as frames are appended
+    rather than being preallocated. Frames must be integers of up to 32 bits.
+    See FrameSink for the other parameters.
+
+    Parameters
+    ----------
+    compression_type : str, optional
+        Compression algorithm, see astropy.io.fits.CompImageHDU. Defaults to
+        'RICE_1', which is lossless for integer frames.
+
+    """
+    def __init__(self, path, frame_shape, nframes, dtype, header=None,
+                 compression_type='RICE_1'):
+        self.compression_type = compression_type
+        super().__init__(path, frame_shape, nframes, dtype, header)
+
+    def _open(self):
+        from astropy.io import fits
+
+        if self.dtype.kind not in 'iu' or self.dtype.itemsize > 4:
+            raise FrameSinkException('Compressed FITS cannot hold frames of '
+                                     'type {0}'.format(self.dtype))
+
+        f = open(self.path, 'wb')
+        fits.PrimaryHDU(header=_fits_header(self.header)).writeto(f)
+        return f
+
+    def _write(self, frames):
+        from astropy.io import fits
+
+        for frame in frames:
+            # astropy only writes extensions as part of a whole HDU list, so
+            # write one with an empty primary HDU and keep the extension
+            hdus = fits.HDUList([
+                fits.PrimaryHDU(),
+                fits.CompImageHDU(frame.astype(self.dtype, copy=False),
+                                  compression_type=self.compression_type)
+            ])
+            buf = io.BytesIO()
+            hdus.writeto(buf)
+            self._data.write(buf.getbuffer()[len(hdus[0].header.tostring()):])
+
+    def close(self):
+        """Flush and close the file."""
+        if self.closed:
+            return
+        self._data.close()
+        self._data = None
+
+
+def open_frame_sink(path, frame_shape, nframes, dtype, header=None):
+    """Open the frame sink for the type of file given by the path extension.
+
+    '.npy' files get an NpyFrameSink, '.fits', '.fit' or '.fts' files a
+    FitsFrameSink and '.fz' (e.g. '.fits.fz') files a CompressedFitsFrameSink.
+    See FrameSink for the parameters.
+
+    """
+    suffix = Path(path).suffix.lower()
+    if suffix == '.npy':
+        sink_class = NpyFrameSink
+    elif suffix in ('.fits', '.fit', '.fts'):
+        sink_class = FitsFrameSink
+    elif suffix == '.fz':
+        sink_class = CompressedFitsFrameSink
+    else:
+        raise FrameSinkException('Cannot tell the file type of {0}, use a '
+                                 '.npy, .fits or .fits.fz '
+                                 'extension'.format(path))
+
+    return sink_class(path, frame_shape, nframes, dtype, header)
+
+
+# FITS blocks are 2880 bytes
+_FITS_BLOCK = 2880
+
+# BITPIX and BZERO of the frame dtypes FITS can hold
+_FITS_BITPIX = {
+    np.dtype(np.uint8): (8, 0),
+    np.dtype(np.int16): (16, 0),
+    np.dtype(np.int32): (32, 0),
+    np.dtype(np.int64): (64, 0),
+    np.dtype(np.uint16): (16, 2**15),
+    np.dtype(np.uint32): (32, 2**31),
+    np.dtype(np.uint64): (64, 2**63),
+    np.dtype(np.float32): (-32, 0),
+    np.dtype(np.float64): (-64, 0),
+}
+
+
+def _fits_header(values):
+    """FITS header of header values, with HIERARCH cards for long keys."""
+    from astropy.io import fits
+
+    header = fits.Header()
+    for key, value in values.items():
+        if len(key) > 8:
+            key = 'HIERARCH ' + key
+        header[key] = value
+
+    return header
+
+
+def _header_values(header):
+    """Check header values and convert numpy scalars to Python ones."""
+    values = {}
+    for key, value in (header or {}).items():
+        if isinstance(value, np.generic):
+            value = value.item()
+        if not isinstance(key, str) or not isinstance(
+                value, (bool, int, float, str)):
+            raise FrameSinkException('Header keys must be strings and values '
+                                     'numbers, strings or bools')
+        values[key] = value
+
+    return values
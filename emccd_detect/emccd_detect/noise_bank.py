@@ -0,0 +1,210 @@
+# -*- coding: utf-8 -*-
+"""Precomputed bank of normal deviates for fast read noise."""
+
+import os
+
+import numpy as np
+
+
+# Number of deviates generated at a time when filling a bank
+_GEN_CHUNK = 2**20
+
+
+class NoiseBankException(Exception):
+    """Exception class for noise_bank module."""
+
+
+class NoiseBank:
+    """Bank of standard normal deviates to serve read noise from.
+
+    For high volume Monte Carlo, where the read noise statistics matter but
+    exact independence across millions of frames does not, read noise is
+    served from a bank of deviates generated once instead of being drawn
+    fresh for every frame. Each frame is made of blocks copied from random
+    offsets in the bank, each with a random sign, so the cost per element is
+    a scaled copy rather than a normal draw.
+
+    Blocks are copied into the frame rather than served as views of the bank
+    (or a rolled bank) because each block needs its own scale and sign, and
+    the frame is a writable buffer that later stages add to in place. Views
+    would make those additions corrupt the bank, which may also be a shared
+    read-only memory map, and rolling the bank would copy all of it for every
+    frame instead of one frame's worth.
+
+    The bias can also be given a drift between rows, an offset per row drawn
+    from the bank for every frame, and a column pattern, an offset per column
+    which is the same in every frame.
+
+    Parameters
+    ----------
+    size : int, optional
+        Number of deviates in the bank. Should be several times the number of
+        elements in a frame, so that frames rarely share the same stretches
+        of deviates. Defaults to 2**24.
+    dtype : {numpy.float32, numpy.float64}, optional
+        Floating point precision of the deviates. Defaults to numpy.float32.
+    seed : {None, int, SeedSequence}, optional
+        Seed for generating the bank. Defaults to None, in which case fresh
+        entropy is used.
+    path : str, optional
+        Path of a .npy file to memory map the bank from, which is created
+        (from size, dtype and seed) if it does not exist yet. A memory mapped
+        bank is generated once and shared between processes, e.g. the workers
+        of sim_frames_parallel, rather than copied to each. Defaults to None,
+        in which case the bank is held in memory.
+    block_size : int, optional
+        Largest number of consecutive elements served from one offset.
+        Defaults to None, in which case an eighth of the bank is used.
+    row_sigma : float, optional
+        Standard deviation of the bias offset of each row, drawn anew for every
+        frame (e-). Defaults to 0.
+    col_sigma : float, optional
+        Standard deviation of the fixed bias offset of each column (e-).
+        Defaults to 0.
+
+    """
+    def __init__(self, size=2**24, dtype=np.float32, seed=None, path=None,
+                 block_size=None, row_sigma=0., col_sigma=0.):
+        if path is not None and os.path.exists(path):
+            bank = np.load(path, mmap_mode='r')
+            if bank.ndim != 1 or bank.dtype.kind != 'f':
+                raise NoiseBankException('{0} does not hold a 1d float '
+                                         'array'.format(path))
+        else:
+            if not isinstance(size, (int, np.integer)) or size < 1:
+                raise NoiseBankException('size must be a positive integer')
+            dtype = np.dtype(dtype)
+            if dtype not in (np.float32, np.float64):
+                raise NoiseBankException('dtype must be numpy.float32 or '
+                                         'numpy.float64')
+            bank = _generate_bank(size, dtype, seed, path)
+        if block_size is None:
+            block_size = max(len(bank) // 8, 1)
+        if (not isinstance(block_size, (int, np.integer))
+                or not 1 <= block_size <= len(bank)):
+            raise NoiseBankException('block_size must be an integer between 1 '
+                                     'and the size of the bank')
+        if row_sigma < 0 or col_sigma < 0:
+            raise NoiseBankException('row_sigma and col_sigma must not be '
+                                     'negative')
+
+        self.bank = bank
+        self.path = path
+        self.block_size = block_size
+        self.row_sigma = row_sigma
+        self.col_sigma = col_sigma
+
+    def __len__(self):
+        return len(self.bank)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        if self.path is not None:
+            # Map the file again when unpickled instead of copying the bank
+            state['bank'] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if self.bank is None:
+            self.bank = np.load(self.path, mmap_mode='r')
+
+    def fill(self, out, scale=1., rng=None, row_len=None, element_inds=None):
+        """Fill a frame with deviates from the bank, plus the bias patterns.
+
+        Parameters
+        ----------
+        out : array_like
+            Contiguous array for the elements of one frame, flattened row by
+            row. Modified in place.
+        scale : float, optional
+            Standard deviation of the deviates, e.g. the read noise (e-).
+            Defaults to 1.
+        rng : numpy.random.Generator, optional
+            Random number generator for the offsets and signs. Defaults to
+            None, in which case the global numpy.random state is used.
+        row_len : int, optional
+            Number of elements in each row of the frame. Only needed for the
+            bias patterns. Defaults to None.
+        element_inds : array_like, optional
+            Flat indices in the frame of the elements of out, for elements
+            gathered from parts of a frame. Defaults to None, in which case
+            out holds every element of the frame in order.
+
+        Returns
+        -------
+        out : array_like
+            The filled frame.
+
+        """
+        if rng is None:
+            rng = np.random
+
+        flat = out.reshape(-1)
+        n = len(flat)
+        n_bank = len(self.bank)
+
+        # Copy scaled blocks from random offsets, with random signs
+        n_blocks = -(-n // self.block_size)
+        offsets = (rng.random(n_blocks)
+                   * (n_bank - self.block_size + 1)).astype(np.intp)
+        signs = np.where(rng.random(n_blocks) < 0.5, -scale, scale)
+        for i, (offset, sign) in enumerate(zip(offsets.tolist(),
+                                               signs.tolist())):
+            start = i * self.block_size
+            stop = min(start + self.block_size, n)
+            np.multiply(self.bank[offset:offset+stop-start], sign,
+                        out=flat[start:stop])
+
+        if self.row_sigma == 0 and self.col_sigma == 0:
+            return out
+        if row_len is None:
+            raise NoiseBankException('row_len is needed for the bias patterns')
+
+        if element_inds is None:
+            if n % row_len != 0:
+                raise NoiseBankException('Frame is not a whole number of '
+                                         'rows')
+            n_rows = n // row_len
+        else:
+            rows, cols = np.divmod(element_inds, row_len)
+            n_rows = int(rows.max()) + 1 if n else 0
+        if max(n_rows, row_len) > n_bank:
+            raise NoiseBankException('Bank is too small for the bias patterns')
+
+        if self.row_sigma != 0:
+            offset = int(rng.random() * (n_bank - n_rows + 1))
+            row_drift = self.row_sigma * self.bank[offset:offset+n_rows]
+            if element_inds is None:
+                flat.reshape(n_rows, row_len)[...] += row_drift[:, None]
+            else:
+                flat += row_drift[rows]
+        if self.col_sigma != 0:
+            # Always from the end of the bank, so the same in every frame
+            col_pattern = self.col_sigma * self.bank[n_bank-row_len:]
+            if element_inds is None:
+                flat.reshape(n_rows, row_len)[...] += col_pattern
+            else:
+                flat += col_pattern[cols]
+
+        return out
+
+
+def _generate_bank(size, dtype, seed, path):
+    """Generate a bank of standard normal deviates, in memory or in a file."""
+    rng = np.random.default_rng(seed)
+    if path is None:
+        bank = np.empty(size, dtype=dtype)
+    else:
+        bank = np.lib.format.open_memmap(path, mode='w+', dtype=dtype,
+                                         shape=(size,))
+    for start in range(0, size, _GEN_CHUNK):
+        stop = min(start + _GEN_CHUNK, size)
+        bank[start:stop] = rng.standard_normal(stop - start, dtype=dtype)
+
+    if path is None:
+        bank.flags.writeable = False
+        return bank
+    bank.flush()
+    del bank
+    return np.load(path, mmap_mode='r')
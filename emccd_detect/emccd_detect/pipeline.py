@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+"""Overlap making frames with writing them to disk."""
+
+import queue
+import threading
+import time
+
+import numpy as np
+
+
+class PipelineException(Exception):
+    """Exception class for pipeline module."""
+
+
+# Marks the end of the frames on the queue
+_DONE = object()
+
+
+class FramePipeline:
+    """Write frames on a background thread while the next ones are made.
+
+    Frames are made by iterating over an iterable (e.g. a generator which
+    simulates them) in the calling thread and handed to a writer thread on a
+    bounded queue, which appends them to a sink. For a compressed sink, the
+    writer compresses frame N while frame N+1 is simulated. The GIL is
+    released during the bulk of the numpy, compression and file work, so the
+    two stages run concurrently on separate cores.
+
+    When the queue is full, making frames waits for the writer to catch up
+    (backpressure), so at most queue_size + 2 frames are held in memory
+    however slow the writer is.
+
+    Parameters
+    ----------
+    sink : frame_sink.FrameSink
+        Sink to append the frames to. It is not closed by the pipeline.
+    queue_size : int, optional
+        Largest number of frames (or chunks of frames) waiting to be written.
+        0 appends each frame in the calling thread as soon as it is made, with
+        no overlap. Defaults to 2.
+
+    """
+    def __init__(self, sink, queue_size=2):
+        if not isinstance(queue_size, (int, np.integer)) or queue_size < 0:
+            raise PipelineException('queue_size must be a non-negative '
+                                    'integer')
+
+        self.sink = sink
+        self.queue_size = queue_size
+
+    def run(self, frames):
+        """Append every frame of an iterable to the sink.
+
+        Parameters
+        ----------
+        frames : iterable
+            Iterable of frames or of stacks of frames, consumed in the calling
+            thread.
+
+        Returns
+        -------
+        dict
+            Throughput report. Keys 'nframes', 'time' (s) and
+            'frames_per_second' hold the totals. 'stages' maps 'make' and
+            'write' each to a dict with its busy 'time' (s), the 'wait' (s)
+            it spent blocked on the other stage, its 'frames_per_second' while
+            busy and its busy 'fraction' of the total time. The wait of 'make'
+            is the backpressure from the writer.
+
+        """
+        stages = {name: {'time': 0., 'wait': 0.} for name in ('make', 'write')}
+        t_start = time.perf_counter()
+        if self.queue_size == 0:
+            nframes = self._run_serial(frames, stages)
+        else:
+            nframes = self._run_threaded(frames, stages)
+        total_time = time.perf_counter() - t_start
+
+        for stats in stages.values():
+            stats['frames_per_second'] = (nframes / stats['time']
+                                          if stats['time'] else None)
+            stats['fraction'] = (stats['time'] / total_time if total_time
+                                 else None)
+
+        return {
+            'nframes': nframes,
+            'time': total_time,
+            'frames_per_second': nframes / total_time if total_time else None,
+            'stages': stages
+        }
+
+    def _run_serial(self, frames, stages):
+        """Make and append the frames one after the other."""
+        nframes = 0
+        frames = iter(frames)
+        while True:
+            t0 = time.perf_counter()
+            item = next(frames, _DONE)
+            t1 = time.perf_counter()
+            stages['make']['time'] += t1 - t0
+            if item is _DONE:
+                return nframes
+
+            self.sink.append(item)
+            stages['write']['time'] += time.perf_counter() - t1
+            nframes += _count_frames(item)
+
+    def _run_threaded(self, frames, stages):
+        """Make the frames while a writer thread appends them."""
+        work = queue.Queue(maxsize=self.queue_size)
+        errors = []
+
+        def writer():
+            while True:
+                t0 = time.perf_counter()
+                item = work.get()
+                t1 = time.perf_counter()
+                stages['write']['wait'] += t1 - t0
+                if item is _DONE:
+                    return
+                if errors:
+                    # Keep draining so that the maker is never left blocked
+                    continue
+                try:
+                    self.sink.append(item)
+                except BaseException as e:
+                    errors.append(e)
+                stages['write']['time'] += time.perf_counter() - t1
+
+        thread = threading.Thread(target=writer, name='frame_writer',
+                                  daemon=True)
+        thread.start()
+
+        nframes = 0
+        try:
+            frames = iter(frames)
+            while not errors:
+                t0 = time.perf_counter()
+                item = next(frames, _DONE)
+                t1 = time.perf_counter()
+                stages['make']['time'] += t1 - t0
+                if item is _DONE:
+                    break
+
+                # Blocks while the queue is full
+                work.put(item)
+                stages['make']['wait'] += time.perf_counter() - t1
+                nframes += _count_frames(item)
+        finally:
+            work.put(_DONE)
+            thread.join()
+
+        if errors:
+            raise errors[0]
+
+        return nframes
+
+
+def _count_frames(item):
+    """Number of frames in a frame or a stack of frames."""
+    return len(item) if np.ndim(item) == 3 else 1
@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+"""Stage-level timing and memory instrumentation for the detector pipeline."""
+
+import contextlib
+import time
+import tracemalloc
+
+
+class ProfilingException(Exception):
+    """Exception class for profiling module."""
+
+
+class PipelineProfiler:
+    """Record wall time, allocated bytes and call counts per pipeline stage.
+
+    One record is made for each simulation call (a single frame, a stack of
+    frames or a streamed chunk), holding the stats of every stage run during
+    it.
+
+    Parameters
+    ----------
+    trace_memory : bool, optional
+        Also record the peak bytes allocated by each stage, using tracemalloc.
+        This slows the simulation down noticeably. Defaults to False.
+    callback : callable, optional
+        Called with each record as soon as it is complete. Defaults to None.
+
+    Attributes
+    ----------
+    records : list of dict
+        One dict per simulation call, with keys 'nframes', 'time' (s) and
+        'stages'. 'stages' maps each stage name to a dict with keys 'calls',
+        'time' (s) and 'bytes' (peak allocation, 0 without trace_memory).
+
+    """
+    def __init__(self, trace_memory=False, callback=None):
+        if callback is not None and not callable(callback):
+            raise ProfilingException('callback must be callable')
+
+        self.trace_memory = trace_memory
+        self.callback = callback
+        self.records = []
+        self._current = None
+        self._started_tracemalloc = False
+
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracemalloc = True
+
+    def __getstate__(self):
+        # Copies sent to worker processes start empty and without the
+        # callback, which may not be picklable; see add_records
+        state = self.__dict__.copy()
+        state.update(callback=None, records=[], _current=None,
+                     _started_tracemalloc=False)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracemalloc = True
+
+    def close(self):
+        """Stop tracemalloc if this profiler started it."""
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+            self._started_tracemalloc = False
+
+    @contextlib.contextmanager
+    def frames(self, nframes):
+        """Collect the stages run inside the block into one record.
+
+        Nested calls are folded into the outermost record.
+
+        """
+        if self._current is not None:
+            yield
+            return
+
+        self._current = {'nframes': nframes, 'time': 0., 'stages': {}}
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            record = self._current
+            record['time'] = time.perf_counter() - t0
+            self._current = None
+            self.add_records([record])
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        """Time (and optionally trace allocations of) one pipeline stage."""
+        if self._current is None:
+            # Stage called on its own, outside of a simulation call
+            with self.frames(None):
+                with self.stage(name):
+                    yield
+            return
+
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+            start_bytes = tracemalloc.get_traced_memory()[0]
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            dt = time.perf_counter() - t0
+            stats = self._current['stages'].setdefault(
+                name, {'calls': 0, 'time': 0., 'bytes': 0})
+            stats['calls'] += 1
+            stats['time'] += dt
+            if self.trace_memory:
+                peak_bytes = tracemalloc.get_traced_memory()[1] - start_bytes
+                stats['bytes'] = max(stats['bytes'], peak_bytes)
+
+    def add_records(self, records):
+        """Append finished records, e.g. from worker processes."""
+        for record in records:
+            self.records.append(record)
+            if self.callback is not None:
+                self.callback(record)
+
+    def report(self):
+        """Summarize the records.
+
+        Returns
+        -------
+        dict
+            Keys 'nframes' and 'time' (s) hold the totals over all records,
+            'stages' maps each stage name to its total 'calls' and 'time' (s),
+            its largest 'bytes', its 'time_per_frame' (s) and its 'fraction'
+            of the total time, and 'records' holds the records themselves.
+
+        """
+        nframes = sum(record['nframes'] or 0 for record in self.records)
+        total_time = sum(record['time'] for record in self.records)
+
+        stages = {}
+        for record in self.records:
+            for name, stats in record['stages'].items():
+                total = stages.setdefault(
+                    name, {'calls': 0, 'time': 0., 'bytes': 0})
+                total['calls'] += stats['calls']
+                total['time'] += stats['time']
+                total['bytes'] = max(total['bytes'], stats['bytes'])
+        for total in stages.values():
+            total['time_per_frame'] = (total['time'] / nframes if nframes
+                                       else None)
+            total['fraction'] = (total['time'] / total_time if total_time
+                                 else None)
+
+        return {
+            'nframes': nframes,
+            'time': total_time,
+            'stages': stages,
+            'records': list(self.records)
+        }
@@ -1,15 +1,25 @@
 # -*- coding: utf-8 -*-
 """Generate random numbers according to EM gain pdfs."""
 
+import functools
+
 import numpy as np
 from scipy import special
 
 
+# Inverse CDF tables end at x = 1 - exp(-_TABLE_T_MAX), about 1 - 1e-9
+_TABLE_T_MAX = 20.
+
+# Number of most recently used inverse CDF tables kept, each of which holds
+# 2*table_size floats (64 kB by default)
+_TABLE_CACHE_SIZE = 256
+
+
 class RandEMGainException(Exception):
     """Exception class for rand_em_gain module."""
 
 
-def rand_em_gain(n_in_array, em_gain):
+def rand_em_gain(n_in_array, em_gain, rng=None):
     """Generate random numbers according to EM gain pdfs.
 
     Parameters
@@ -18,6 +28,9 @@ def rand_em_gain(n_in_array, em_gain):
         Array of electron values (e-).
     em_gain : float
         CCD em_gain (e-/photon).
+    rng : numpy.random.Generator, optional
+        Random number generator. Defaults to None, in which case the global
+        numpy.random state is used.
 
     Returns
     -------
@@ -37,17 +50,168 @@ def rand_em_gain(n_in_array, em_gain):
     [2] https://arxiv.org/pdf/astro-ph/0307305.pdf
 
     """
+    if rng is None:
+        rng = np.random
+
     if em_gain < 1:
         raise RandEMGainException('EM gain cannot be set to less than 1')
     elif em_gain == 1:
         return n_in_array
     else:
         # Apply gain to regular counts
-        n_out_array = np.random.gamma(n_in_array, em_gain)
-        n_out_array = np.round(n_out_array)
+        n_out_array = rng.gamma(n_in_array, em_gain)
+        np.round(n_out_array, out=n_out_array)
         return n_out_array
 
 
+class EMGainSampler:
+    """Fast EM gain draws for sparse (photon counting) frames.
+
+    Draws from the same distributions as rand_em_gain, but only for nonzero
+    input elements and with cheaper exact draws for the common small counts:
+
+        n == 1 : exponential, -g*log(1-x)
+        n == 2 : inverse CDF via the Lambert W function
+        n <= table_n_max (integer n) : interpolated inverse CDF table
+        n >= normal_n : normal approximation, g*(n + sqrt(n)*z)
+        otherwise : gamma distribution
+
+    Parameters
+    ----------
+    table_n_max : int, optional
+        Largest integer input count drawn from precomputed inverse CDF tables.
+        Tables are built on first use and cached per (n, gain, table_size),
+        keeping the 256 most recently used. Defaults to 0 (no tables).
+    table_size : int, optional
+        Number of nodes in each inverse CDF table. Defaults to 4096.
+    normal_n : float, optional
+        Input count at and above which the normal approximation to the gamma
+        distribution is used. Defaults to None (never).
+
+    Notes
+    -----
+    Draws follow the same distributions as rand_em_gain but not the same
+    random streams, so individual values differ for the same seed.
+
+    """
+    def __init__(self, table_n_max=0, table_size=4096, normal_n=None):
+        if not isinstance(table_n_max, (int, np.integer)) or table_n_max < 0:
+            raise RandEMGainException('table_n_max must be a non-negative '
+                                      'integer')
+        if not isinstance(table_size, (int, np.integer)) or table_size < 2:
+            raise RandEMGainException('table_size must be an integer of at '
+                                      'least 2')
+        if normal_n is not None and normal_n <= 2:
+            raise RandEMGainException('normal_n must be greater than 2')
+
+        self.table_n_max = table_n_max
+        self.table_size = table_size
+        self.normal_n = normal_n
+
+    def __call__(self, n_in_array, em_gain, rng=None):
+        """Apply random EM gain to an array of electron counts.
+
+        Parameters
+        ----------
+        n_in_array : array_like
+            Array of electron values (e-).
+        em_gain : float
+            CCD em_gain (e-/photon).
+        rng : numpy.random.Generator, optional
+            Random number generator. Defaults to None, in which case the
+            global numpy.random state is used.
+
+        Returns
+        -------
+        array_like
+            Electron values multiplied by random EM gain distribution (e-).
+
+        """
+        if rng is None:
+            rng = np.random
+
+        if em_gain < 1:
+            raise RandEMGainException('EM gain cannot be set to less than 1')
+        elif em_gain == 1:
+            return n_in_array
+
+        n_in_array = np.asarray(n_in_array)
+        n_in_flat = n_in_array.ravel()
+        # Same precision as the input, e.g. float32 for a float32 detector
+        n_out_flat = np.zeros(n_in_flat.shape, dtype=np.result_type(
+            n_in_array.dtype, np.float32))
+
+        # Zeros stay zero, so only draw for the nonzero elements
+        inds = np.flatnonzero(n_in_flat != 0)
+        n_in = n_in_flat[inds]
+
+        ones = n_in == 1
+        n_out_flat[inds[ones]] = np.round(
+            em_gain * rng.standard_exponential(np.count_nonzero(ones)))
+
+        twos = n_in == 2
+        x = rng.random(np.count_nonzero(twos))
+        n_out_flat[inds[twos]] = np.round(
+            -em_gain * special.lambertw((x-1)/np.e, -1).real - em_gain)
+
+        rest = ~(ones | twos)
+        inds = inds[rest]
+        n_in = n_in[rest]
+
+        if self.table_n_max > 2:
+            tabled = (n_in <= self.table_n_max) & (n_in == np.round(n_in))
+            for n in np.unique(n_in[tabled]):
+                n_inds = inds[n_in == n]
+                n_out_flat[n_inds] = np.round(
+                    self._table_draw(int(n), em_gain, len(n_inds), rng))
+            inds = inds[~tabled]
+            n_in = n_in[~tabled]
+
+        if self.normal_n is not None:
+            normal = n_in >= self.normal_n
+            z = rng.standard_normal(np.count_nonzero(normal))
+            n_normal = n_in[normal]
+            n_out_flat[inds[normal]] = np.round(
+                np.maximum(em_gain * (n_normal + np.sqrt(n_normal)*z), 0))
+            inds = inds[~normal]
+            n_in = n_in[~normal]
+
+        n_out_flat[inds] = np.round(rng.gamma(n_in, em_gain))
+
+        return n_out_flat.reshape(n_in_array.shape)
+
+    def _table_draw(self, n, em_gain, size, rng):
+        """Draw size samples for input count n from the inverse CDF table."""
+        s_grid, table = _inv_cdf_table(n, float(em_gain), self.table_size)
+
+        # Tables are uniform in s = t**(1/n), where t = -log(1-x). The output
+        # goes as t**(1/n) for small t and as t for large t, so it is close
+        # to linear in s at both ends
+        t = rng.standard_exponential(size)
+        n_out = np.interp(t**(1/n), s_grid, table)
+
+        # Beyond the end of the table, evaluate the inverse CDF directly
+        tail = t > _TABLE_T_MAX
+        if tail.any():
+            n_out[tail] = em_gain * special.gammaincinv(n, -np.expm1(-t[tail]))
+
+        return n_out
+
+
+@functools.lru_cache(maxsize=_TABLE_CACHE_SIZE)
+def _inv_cdf_table(n, em_gain, table_size):
+    """Return (s, n_out) nodes of the inverse CDF of the EM gain output.
+
+    The output for n input electrons is gamma distributed with shape n and
+    scale em_gain. Nodes are uniform in s = t**(1/n), where t = -log(1-x) for
+    x in [0, 1).
+
+    """
+    s_grid = np.linspace(0, _TABLE_T_MAX**(1/n), table_size)
+    table = em_gain * special.gammaincinv(n, -np.expm1(-s_grid**n))
+    s_grid.flags.writeable = False
+    table.flags.writeable = False
+    return s_grid, table
 
 
 if __name__ == '__main__':
@@ -69,13 +69,14 @@ class Metadata(object):
         ----------
         frame : array_like
             Full frame consistent with size given in frame_rows, frame_cols.
+            A stack of frames along a leading axis is also accepted.
         key : str
             Keyword referencing section to be sliced; must exist in geom.
 
         """
         rows, cols, r0c0 = self._unpack_geom(key)
 
-        section = frame[r0c0[0]:r0c0[0]+rows, r0c0[1]:r0c0[1]+cols]
+        section = frame[..., r0c0[0]:r0c0[0]+rows, r0c0[1]:r0c0[1]+cols]
         if section.size == 0:
             raise ReadMetadataException('Corners invalid')
         return section
@@ -37,6 +37,18 @@ class MetadataWrapper(Metadata):
         Moving median filter window size for cosmic tail subtraction.
     cic_thresh : float
         Multiplication factor for readnoise that determines beginning of cic.
+    empty_element_m : array_like
+        Full frame boolean mask of the empty (prescan and overscan) elements.
+    empty_element_inds : array_like
+        Flat full frame indices of the empty elements.
+    exposed_pix_m : array_like
+        Imaging area boolean mask of the exposed (fluxmap) pixels.
+
+    Notes
+    -----
+    The mask, index array and slice attributes are derived from the geometry
+    once and cached; the arrays are read-only and shared between callers, so
+    copy them before modifying. mask returns a new writable array each call.
 
     """
 
@@ -50,26 +62,114 @@ class MetadataWrapper(Metadata):
         self.imaging_area_zeros = np.zeros((self.rows_im, self.cols_im))
         self.full_frame_zeros = np.zeros((self.frame_rows, self.frame_cols))
 
+        # Geometry derived masks and slices, built on first use
+        self._masks = {}
+        self._slices = {}
+        self._slices_im = {}
+        self._empty_element_m = None
+        self._empty_element_inds = None
+        self._imaging_element_inds = None
+        self._exposed_pix_m = None
+
     def mask(self, key):
-        full_frame_m = self.full_frame_zeros.copy()
+        """Return a full frame boolean mask of a section.
 
-        rows, cols, r0c0 = self._unpack_geom(key)
-        full_frame_m[r0c0[0]:r0c0[0]+rows, r0c0[1]:r0c0[1]+cols] = 1
-        return full_frame_m.astype(bool)
+        Parameters
+        ----------
+        key : str
+            Keyword referencing section; must exist in geom.
+
+        Returns
+        -------
+        array_like
+            Boolean mask, True inside the section.
+
+        """
+        return self._section_mask(key).copy()
+
+    def _section_mask(self, key):
+        """Return the cached, read-only full frame mask of a section."""
+        if key not in self._masks:
+            full_frame_m = np.zeros(self.full_frame_zeros.shape, dtype=bool)
+            full_frame_m[self.section_slice(key)] = True
+            full_frame_m.flags.writeable = False
+            self._masks[key] = full_frame_m
+        return self._masks[key]
+
+    def section_slice(self, key):
+        """Return the (rows, cols) slices of a section in the full frame.
+
+        Index a frame (or a stack of frames) with frame[..., rs, cs] instead of
+        with a boolean mask to get a view rather than a copy.
+
+        """
+        if key not in self._slices:
+            rows, cols, r0c0 = self._unpack_geom(key)
+            self._slices[key] = (slice(r0c0[0], r0c0[0]+rows),
+                                 slice(r0c0[1], r0c0[1]+cols))
+        return self._slices[key]
+
+    def section_slice_im(self, key):
+        """Return the (rows, cols) slices of a section in the imaging area."""
+        if key not in self._slices_im:
+            rows, cols, r0c0 = self._unpack_geom_im(key)
+            self._slices_im[key] = (slice(r0c0[0], r0c0[0]+rows),
+                                    slice(r0c0[1], r0c0[1]+cols))
+        return self._slices_im[key]
+
+    @property
+    def empty_element_m(self):
+        if self._empty_element_m is None:
+            empty_element_m = (self._section_mask('prescan')
+                               | self._section_mask('parallel_overscan')
+                               | self._section_mask('serial_overscan'))
+            empty_element_m.flags.writeable = False
+            self._empty_element_m = empty_element_m
+        return self._empty_element_m
+
+    @property
+    def empty_element_inds(self):
+        if self._empty_element_inds is None:
+            empty_element_inds = np.flatnonzero(self.empty_element_m)
+            empty_element_inds.flags.writeable = False
+            self._empty_element_inds = empty_element_inds
+        return self._empty_element_inds
+
+    @property
+    def imaging_element_inds(self):
+        """Flat full frame indices of the imaging area, in imaging area
+        order."""
+        if self._imaging_element_inds is None:
+            frame_inds = np.arange(self.full_frame_zeros.size).reshape(
+                self.full_frame_zeros.shape)
+            imaging_element_inds = self.imaging_slice(frame_inds).ravel()
+            imaging_element_inds.flags.writeable = False
+            self._imaging_element_inds = imaging_element_inds
+        return self._imaging_element_inds
+
+    @property
+    def exposed_pix_m(self):
+        if self._exposed_pix_m is None:
+            exposed_pix_m = np.zeros(self.imaging_area_zeros.shape,
+                                     dtype=bool)
+            exposed_pix_m[self.section_slice_im('image')] = True
+            exposed_pix_m.flags.writeable = False
+            self._exposed_pix_m = exposed_pix_m
+        return self._exposed_pix_m
 
     def embed(self, frame, key, data):
-        rows, cols, r0c0 = self._unpack_geom(key)
+        rs, cs = self.section_slice(key)
         try:
-            frame[r0c0[0]:r0c0[0]+rows, r0c0[1]:r0c0[1]+cols] = data
+            frame[..., rs, cs] = data
         except Exception:
             raise ReadMetadataWrapperException('Data does not fit in selected '
                                                'section')
         return frame
 
     def embed_im(self, im_area, key, data):
-        rows, cols, r0c0 = self._unpack_geom_im(key)
+        rs, cs = self.section_slice_im(key)
         try:
-            im_area[r0c0[0]:r0c0[0]+rows, r0c0[1]:r0c0[1]+cols] = data
+            im_area[..., rs, cs] = data
         except Exception:
             raise ReadMetadataWrapperException('Data does not fit in selected '
                                                'section')
@@ -79,20 +179,26 @@ class MetadataWrapper(Metadata):
         """Select only the real counts from full frame and exclude virtual.
 
         Use this to transform mask and embed from acting on the full frame to
-        acting on only the image frame.
+        acting on only the image frame. Stacks of frames along a leading axis
+        are sliced frame by frame.
 
         """
-        rows, cols, r0c0 = self._imaging_area_geom()
+        rs, cs = self._imaging_area_slice()
 
-        return frame[r0c0[0]:r0c0[0]+rows, r0c0[1]:r0c0[1]+cols]
+        return frame[..., rs, cs]
 
     def imaging_embed(self, frame, im_area):
         """Add the imaging area back to the full frame."""
-        rows, cols, r0c0 = self._imaging_area_geom()
+        rs, cs = self._imaging_area_slice()
 
-        frame[r0c0[0]:r0c0[0]+rows, r0c0[1]:r0c0[1]+cols] = im_area
+        frame[..., rs, cs] = im_area
         return frame
 
+    def _imaging_area_slice(self):
+        """Return (rows, cols) slices of the imaging area in the full frame."""
+        return (slice(self.r0c0_im[0], self.r0c0_im[0]+self.rows_im),
+                slice(self.r0c0_im[1], self.r0c0_im[1]+self.cols_im))
+
     def _unpack_geom_corners(self, key):
         """Returns corners corresponding to geometry."""
         rows, cols, r0c0 = self._unpack_geom(key)
@@ -151,7 +257,7 @@ class MetadataWrapper(Metadata):
         """
         rows, cols, r0c0 = self._unpack_geom_im(key)
 
-        section = im_area[r0c0[0]:r0c0[0]+rows, r0c0[1]:r0c0[1]+cols]
+        section = im_area[..., r0c0[0]:r0c0[0]+rows, r0c0[1]:r0c0[1]+cols]
         if section.size == 0:
             raise ReadMetadataWrapperException('Corners invalid')
         return section
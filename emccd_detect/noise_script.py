@@ -42,15 +42,11 @@ if __name__ == '__main__':
         numel_gain_register=604
         )
 
-    # Simulate several full frames
-    frames_l = []
+    # Simulate several frames in one pass
     nframes = 500
-    for i in range(nframes):
-        #sim_full_frame = emccd.sim_full_frame(full_fluxmap, frametime)
-        sim_sub_frame = emccd.sim_sub_frame(fluxmap,frametime)
-        e_frame = emccd.get_e_frame(sim_sub_frame)
-        frames_l.append(e_frame)
-    frames = np.stack(frames_l)
+    #sim_full_frames = emccd.sim_full_frames(full_fluxmap, frametime, nframes)
+    sim_sub_frames = emccd.sim_sub_frames(fluxmap, frametime, nframes)
+    frames = emccd.get_e_frame(sim_sub_frames)
 
     # Plot images
     #imagesc(emccd.get_e_frame(frames[0]), 'Output Full Frame')
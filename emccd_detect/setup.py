@@ -22,9 +22,9 @@ setup(
         'Development Status :: 4 - Beta',
         'Intended Audience :: Developers',
         'Programming Language :: Python :: 3',
-        'Programming Language :: Python :: 3.6',
-        'Programming Language :: Python :: 3.7',
-        'Programming Language :: Python :: 3.8',
+        'Programming Language :: Python :: 3.9',
+        'Programming Language :: Python :: 3.10',
+        'Programming Language :: Python :: 3.11',
     ],
     #packages=find_namespace_packages('arcticpy.src', 'arcticpy.include'),
     packages=find_packages(exclude=["arcticpy_folder.*", "arcticpy_folder", "arcticpy.*", "arcticpy"]),
@@ -33,7 +33,7 @@ setup(
     package_data={'': ['metadata.yaml']},
     include_package_data=True,
     #exclude_package_data={'':['arcticpy']},
-    python_requires= '>=3.6',
+    python_requires= '>=3.9',
     install_requires=[
         #'arcticpy @ git+https://github.com/jkeger/arcticpy@row_wise#egg=arcticpy',
         #'arcticpy @ git+https://github.com/jkeger/arcticpy.git',
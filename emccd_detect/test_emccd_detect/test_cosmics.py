@@ -0,0 +1,220 @@
+# -*- coding: utf-8 -*-
+"""Tests for the cosmics module."""
+
+import numpy as np
+
+from emccd_detect.cosmics import (cosmic_hits, sat_tails,
+                                  sat_tails_sparse)
+
+
+def cosmic_hits_loop(image_frame, cr_rate, frametime, pixel_pitch, max_val,
+                     rng):
+    """Reference cosmic_hits, adding one hit at a time."""
+    nr, nc = image_frame.shape
+    framesize = (nr*pixel_pitch * nc*pixel_pitch) / 10**-4  # cm^2
+    hits_per_frame = int(round(cr_rate * framesize * frametime))
+
+    cr_min_radius = 0
+    cr_max_radius = 2
+    hit_row = rng.uniform(low=0, high=nr-1, size=hits_per_frame)
+    hit_col = rng.uniform(low=0, high=nc-1, size=hits_per_frame)
+    hit_rad = rng.uniform(low=cr_min_radius, high=cr_max_radius,
+                          size=hits_per_frame)
+
+    for i in range(hits_per_frame):
+        min_row = max(np.floor(hit_row[i] - hit_rad[i]).astype(int), 0)
+        max_row = min(np.ceil(hit_row[i] + hit_rad[i]).astype(int), nr-1)
+        min_col = max(np.floor(hit_col[i] - hit_rad[i]).astype(int), 0)
+        max_col = min(np.ceil(hit_col[i] + hit_rad[i]).astype(int), nc-1)
+        cols, rows = np.meshgrid(np.arange(min_col, max_col+1),
+                                 np.arange(min_row, max_row+1))
+
+        sigma = 0.5
+        a = 1 / (np.sqrt(2*np.pi) * sigma)
+        b = 2 * sigma**2
+        cosm_section = a * np.exp(-((rows-hit_row[i])**2
+                                    + (cols-hit_col[i])**2) / b)
+        cosm_section = cosm_section / np.max(cosm_section) * max_val
+
+        image_frame[min_row:max_row+1, min_col:max_col+1] += cosm_section
+
+    return image_frame
+
+
+def sat_tails_loop(serial_frame, full_well_serial):
+    """Reference sat_tails, stepping through every element of the frame."""
+    overflow = 0.
+    overflow_i = 0.
+    for i in range(len(serial_frame)):
+        relative_i = i+1 - overflow_i
+        tail_val = overflow * 1 / relative_i
+        if tail_val < 1000:
+            tail_val = 0
+        serial_frame[i] += tail_val
+
+        if serial_frame[i] > full_well_serial:
+            overflow = serial_frame[i] - full_well_serial
+            overflow_i = i
+
+    return serial_frame
+
+
+def random_serial_frame(rng, n, full_well_serial, n_hits):
+    """Serial register frame with a background below full well and hits of up
+    to a few hundred times full well, which give long and cascading tails."""
+    frame = rng.uniform(0, 0.9*full_well_serial, n)
+    hit_inds = rng.integers(0, n, n_hits)
+    frame[hit_inds] = full_well_serial * rng.uniform(1, 300, n_hits)
+
+    return frame
+
+
+class TestCosmicHits:
+    pixel_pitch = 13e-6
+    max_val = 60000.
+
+    def check(self, image_frame, cr_rate, frametime, seed):
+        expected = cosmic_hits_loop(image_frame.copy(), cr_rate, frametime,
+                                    self.pixel_pitch, self.max_val,
+                                    np.random.default_rng(seed))
+        frame = image_frame.copy()
+        out = cosmic_hits(frame, cr_rate, frametime, self.pixel_pitch,
+                          self.max_val, np.random.default_rng(seed))
+
+        # Hits are added in place
+        assert out is frame
+        assert np.allclose(out, expected, rtol=1e-12, atol=0)
+
+        return expected
+
+    def test__no_hits(self):
+        frame = np.ones((20, 30))
+        out = cosmic_hits(frame.copy(), 0, 1., self.pixel_pitch, self.max_val,
+                          np.random.default_rng(0))
+
+        assert np.array_equal(out, frame)
+
+    def test__crowded_frame(self):
+        # So many hits on a small frame that they overlap each other and reach
+        # every edge, so overlapping stamps must all be accumulated
+        nr, nc = 12, 15
+        framesize = (nr*self.pixel_pitch * nc*self.pixel_pitch) / 10**-4
+        frametime = 1.
+        cr_rate = 60 / (framesize * frametime)
+        image_frame = np.random.default_rng(3).uniform(0, 100, (nr, nc))
+        expected = self.check(image_frame, cr_rate, frametime, seed=4)
+
+        hits = expected - image_frame
+        assert hits.max() > 2*self.max_val
+        for edge in [hits[0], hits[-1], hits[:, 0], hits[:, -1]]:
+            assert np.any(edge > 0)
+
+    def test__random_frames(self):
+        for seed in range(10):
+            rng = np.random.default_rng(seed)
+            nr, nc = rng.integers(2, 200, 2)
+            image_frame = rng.uniform(0, 1000, (nr, nc))
+            self.check(image_frame, cr_rate=rng.uniform(1e3, 1e5),
+                       frametime=rng.uniform(0.1, 1), seed=100+seed)
+
+
+class TestSatTails:
+    full_well_serial = 90000.
+
+    def check(self, frame):
+        expected = sat_tails_loop(frame.copy(), self.full_well_serial)
+        serial_frame = frame.copy()
+        out = sat_tails(serial_frame, self.full_well_serial)
+
+        # Tails are added in place
+        assert out is serial_frame
+        assert np.array_equal(out, expected)
+
+    def test__no_overflows(self):
+        rng = np.random.default_rng(0)
+        self.check(rng.uniform(0, self.full_well_serial, 500))
+
+    def test__single_overflow(self):
+        frame = np.ones(100)
+        frame[2] = self.full_well_serial * 2
+        self.check(frame)
+
+    def test__cascading_overflows(self):
+        # The tail of each overflow saturates the elements after it
+        frame = np.full(2000, 0.8*self.full_well_serial)
+        frame[[10, 500]] = self.full_well_serial * 50
+        expected = sat_tails_loop(frame.copy(), self.full_well_serial)
+        assert np.count_nonzero(expected[11:] > self.full_well_serial) > 1
+
+        self.check(frame)
+
+    def test__overflow_in_tail(self):
+        # A later overflow supersedes a longer tail of an earlier one
+        frame = np.zeros(3000)
+        frame[0] = self.full_well_serial * 20
+        frame[40] = self.full_well_serial * 1.1
+        frame[1000] = self.full_well_serial * 300
+        frame[1001] = self.full_well_serial * 1.01
+        self.check(frame)
+
+    def test__tails_at_end_of_frame(self):
+        for i in [0, 1, 2, 20]:
+            frame = np.zeros(50)
+            frame[-1-i] = self.full_well_serial * 100
+            self.check(frame)
+
+        # Overflow in the last element, with no room for a tail
+        frame = np.ones(10)
+        frame[-1] = self.full_well_serial * 2
+        self.check(frame)
+
+    def test__random_frames(self):
+        rng = np.random.default_rng(1)
+        for n_hits in [1, 5, 20, 100]:
+            for _ in range(20):
+                n = int(rng.integers(1, 5000))
+                self.check(random_serial_frame(rng, n, self.full_well_serial,
+                                               n_hits))
+
+
+class TestSatTailsSparse:
+    full_well_serial = 90000.
+
+    def check(self, inds, counts, n):
+        dense = np.zeros(n)
+        dense[inds] = counts
+        sat_tails(dense, self.full_well_serial)
+        expected_inds = np.flatnonzero(dense)
+
+        out_inds, out_counts = sat_tails_sparse(inds, counts,
+                                                self.full_well_serial, n)
+
+        assert np.array_equal(out_inds, expected_inds)
+        assert np.array_equal(out_counts, dense[expected_inds])
+
+    def test__no_overflows(self):
+        inds = np.array([3, 10, 11, 40])
+        counts = np.array([5., 80000., 1., 200.])
+        out_inds, out_counts = sat_tails_sparse(inds, counts,
+                                                self.full_well_serial, 50)
+
+        assert out_inds is inds
+        assert out_counts is counts
+
+    def test__cascading_overflows(self):
+        # Events within the tail which the tail pushes over full well, and a
+        # tail which runs off the end of the frame
+        inds = np.array([10, 12, 15, 300, 305, 1990])
+        counts = np.array([100., 50., 80000., 50., 89000., 10.])
+        counts[[0, 3]] = self.full_well_serial * 100
+        self.check(inds, counts, 2000)
+
+    def test__random_frames(self):
+        rng = np.random.default_rng(2)
+        for density in [0.001, 0.01, 0.1, 0.5]:
+            for _ in range(20):
+                n = int(rng.integers(1, 5000))
+                inds = np.flatnonzero(rng.random(n) < density)
+                counts = random_serial_frame(rng, n, self.full_well_serial,
+                                             max(len(inds)//10, 1))[inds]
+                self.check(inds, counts, n)
@@ -0,0 +1,469 @@
+# -*- coding: utf-8 -*-
+"""Tests for the emccd_detect module."""
+
+import itertools
+import json
+import os
+
+import numpy as np
+import pytest
+from astropy.io import fits
+
+from emccd_detect.emccd_detect import EMCCDDetect, EMCCDDetectException
+
+# The small test geometry, a 120x220 frame with a 104x105 image area
+META_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)),
+                         'emccd_detect', 'util', 'metadata_test.yaml')
+
+
+def make_emccd(rng=0, **kwargs):
+    """Detector with the small test geometry."""
+    params = dict(
+        em_gain=1000.,
+        full_well_serial=100000.,
+        cr_rate=5.,
+        eperdn=7.,
+        meta_path=META_PATH,
+        rng=rng
+    )
+    params.update(kwargs)
+    return EMCCDDetect(**params)
+
+
+def make_fluxmap(emccd, nframes=None, seed=0, flux_max=1.):
+    """Random fluxmap (or cube of fluxmaps) for a detector's image area."""
+    image = emccd.meta.geom['image']
+    shape = (image['rows'], image['cols'])
+    if nframes is not None:
+        shape = (nframes,) + shape
+    return np.random.default_rng(seed).uniform(0, flux_max, shape)
+
+
+class TestRNG:
+    def test__same_seed_same_frames(self):
+        fluxmap = make_fluxmap(make_emccd())
+        emccd_1 = make_emccd(rng=7)
+        emccd_2 = make_emccd(rng=np.random.default_rng(7))
+
+        assert np.array_equal(emccd_1.sim_full_frame(fluxmap, 10.),
+                              emccd_2.sim_full_frame(fluxmap, 10.))
+        assert np.array_equal(emccd_1.sim_full_frames(fluxmap, 10., 3),
+                              emccd_2.sim_full_frames(fluxmap, 10., 3))
+
+    def test__different_seed_different_frames(self):
+        fluxmap = make_fluxmap(make_emccd())
+        frame_1 = make_emccd(rng=1).sim_full_frame(fluxmap, 10.)
+        frame_2 = make_emccd(rng=2).sim_full_frame(fluxmap, 10.)
+
+        assert not np.array_equal(frame_1, frame_2)
+
+    def test__independent_of_batching(self):
+        fluxmaps = make_fluxmap(make_emccd(), nframes=5)
+        frametime = np.array([1., 2., 5., 10., 20.])
+        expected = make_emccd().sim_full_frames(fluxmaps, frametime)
+
+        # Frames one at a time
+        emccd = make_emccd()
+        frames = [emccd.sim_full_frame(fluxmap, t)
+                  for fluxmap, t in zip(fluxmaps, frametime)]
+        assert np.array_equal(np.stack(frames), expected)
+
+        # Streamed singly and in chunks, with a last chunk that is shorter
+        frames = list(make_emccd().sim_full_frame_stream(fluxmaps, frametime))
+        assert np.array_equal(np.stack(frames), expected)
+        for chunk_size in [1, 2, 5]:
+            chunks = list(make_emccd().sim_full_frame_stream(
+                fluxmaps, frametime, chunk_size=chunk_size))
+            assert np.array_equal(np.concatenate(chunks), expected)
+
+    def test__successive_calls_continue_the_streams(self):
+        fluxmap = make_fluxmap(make_emccd())
+        expected = make_emccd().sim_full_frames(fluxmap, 10., nframes=4)
+
+        emccd = make_emccd()
+        frames = np.concatenate([emccd.sim_full_frames(fluxmap, 10., 1),
+                                 emccd.sim_full_frames(fluxmap, 10., 3)])
+        assert np.array_equal(frames, expected)
+
+        frames = list(make_emccd().sim_full_frame_stream(
+            itertools.repeat(fluxmap, 4), 10.))
+        assert np.array_equal(np.stack(frames), expected)
+
+
+class TestIntegrate:
+    def test__fluxmap_unchanged(self):
+        emccd = make_emccd()
+        fluxmap_full = np.random.default_rng(0).uniform(
+            0, 1, emccd.meta.imaging_area_zeros.shape)
+        fluxmap_copy = fluxmap_full.copy()
+        exposed_pix_m = emccd.meta.exposed_pix_m
+
+        actualized_e = emccd.integrate(fluxmap_full, 10., exposed_pix_m)
+
+        assert np.array_equal(fluxmap_full, fluxmap_copy)
+        assert actualized_e.shape == fluxmap_full.shape
+        expected_rate = np.where(exposed_pix_m, fluxmap_full, 0) * 10. * \
+            emccd.qe + emccd.dark_current*10. + emccd.cic
+        assert np.allclose(emccd.mean_expected_rate, expected_rate)
+
+    def test__stream_mean_expected_rate(self):
+        # The rate of a streamed frame is kept when the next one is made
+        fluxmaps = make_fluxmap(make_emccd(), nframes=2)
+        emccd = make_emccd()
+        stream = emccd.sim_full_frame_stream(fluxmaps, 10.)
+
+        next(stream)
+        mean_expected_rate = emccd.mean_expected_rate
+        rate = mean_expected_rate.copy()
+        next(stream)
+
+        assert np.array_equal(mean_expected_rate, rate)
+        assert not np.array_equal(emccd.mean_expected_rate, rate)
+
+
+class TestSparseMode:
+    nframes = 10
+
+    def frames(self, sparse, fluxmap, frametime=1.):
+        emccd = make_emccd(cr_rate=0.)
+        if sparse:
+            emccd.update_sparse_mode()
+        frames = np.stack([emccd.sim_full_frame(fluxmap, frametime)
+                           for _ in range(self.nframes)])
+
+        return emccd, frames.astype(float)
+
+    def test__same_statistics_as_dense(self):
+        # Photon counting, ~0.07 e- per element
+        fluxmap = np.full(make_fluxmap(make_emccd()).shape, 0.05)
+        emccd, dense = self.frames(False, fluxmap)
+        _, sparse = self.frames(True, fluxmap)
+        assert not np.array_equal(sparse, dense)
+
+        bias_dn = emccd.bias / emccd.eperdn
+        read_noise_dn = emccd.read_noise / emccd.eperdn
+        for section in ['image', 'prescan']:
+            dense_dn = emccd.meta.slice_section(dense, section)
+            sparse_dn = emccd.meta.slice_section(sparse, section)
+
+            # Fraction of elements above the photon counting threshold
+            dense_counted = dense_dn > bias_dn + 5.5*read_noise_dn
+            sparse_counted = sparse_dn > bias_dn + 5.5*read_noise_dn
+            p = dense_counted.mean()
+            assert p > 0.005
+            sigma = np.sqrt(2 * p * (1-p) / dense_counted.size)
+            assert abs(sparse_counted.mean() - p) < 5*sigma
+
+            # Gain of the counted elements and read noise of the others
+            assert (sparse_dn[sparse_counted].mean()
+                    == pytest.approx(dense_dn[dense_counted].mean(), rel=0.05))
+            assert (sparse_dn[~sparse_counted].std()
+                    == pytest.approx(dense_dn[~dense_counted].std(),
+                                     rel=0.03))
+            assert (sparse_dn[~sparse_counted].mean()
+                    == pytest.approx(dense_dn[~dense_counted].mean(),
+                                     rel=1e-3))
+
+    def test__bright_frames_are_dense(self):
+        fluxmap = np.full(make_fluxmap(make_emccd()).shape, 10.)
+        _, dense = self.frames(False, fluxmap)
+        _, sparse = self.frames(True, fluxmap)
+
+        assert np.array_equal(sparse, dense)
+
+    def test__stacks(self):
+        # Frames above the density limit in the same stack are simulated
+        # densely, the rest as events
+        fluxmaps = make_fluxmap(make_emccd(), nframes=4, flux_max=0.01)
+        fluxmaps[2] *= 1000
+        frametime = np.array([1., 2., 1., 3.])
+
+        emccd = make_emccd()
+        emccd.update_sparse_mode()
+        expected = np.stack([emccd.sim_full_frame(fluxmap, t)
+                             for fluxmap, t in zip(fluxmaps, frametime)])
+        dense = make_emccd().sim_full_frames(fluxmaps, frametime)
+        assert np.array_equal(expected[2], dense[2])
+        assert not np.array_equal(expected[0], dense[0])
+
+        emccd = make_emccd()
+        emccd.update_sparse_mode()
+        assert np.array_equal(emccd.sim_full_frames(fluxmaps, frametime),
+                              expected)
+
+        emccd = make_emccd()
+        emccd.update_sparse_mode()
+        chunks = list(emccd.sim_full_frame_stream(fluxmaps, frametime,
+                                                  chunk_size=3))
+        assert np.array_equal(np.concatenate(chunks), expected)
+
+        emccd = make_emccd()
+        emccd.update_sparse_mode()
+        assert np.array_equal(
+            emccd.sim_frames_parallel(fluxmaps, frametime, n_workers=2,
+                                      chunk_size=1),
+            expected)
+
+    def test__sub_frame_stacks(self):
+        fluxmaps = make_fluxmap(make_emccd(), nframes=3, flux_max=0.01)
+        fluxmaps[1] *= 1000
+
+        emccd = make_emccd()
+        emccd.update_sparse_mode()
+        expected = np.stack([emccd.sim_sub_frame(fluxmap, 2.)
+                             for fluxmap in fluxmaps])
+
+        emccd = make_emccd()
+        emccd.update_sparse_mode()
+        assert np.array_equal(emccd.sim_sub_frames(fluxmaps, 2.), expected)
+
+
+class TestSimFullFrameROI:
+    def test__region_shapes(self):
+        emccd = make_emccd()
+        regions = ['image', (10, 30, 50, 90), 'serial_overscan',
+                   (119, 120, 0, 220)]
+        output = emccd.sim_full_frame_roi(make_fluxmap(emccd), 10., regions)
+
+        assert [region.shape for region in output] == [(104, 105), (20, 40),
+                                                       (120, 5), (1, 220)]
+        for region in output:
+            assert region.dtype == emccd.adc_dtype
+
+    def test__overlapping_regions(self):
+        emccd = make_emccd()
+        image, window = emccd.sim_full_frame_roi(
+            make_fluxmap(emccd), 10., ['image', (10, 30, 120, 150)])
+
+        # The image area starts at (2, 108)
+        assert np.array_equal(window, image[8:28, 12:42])
+
+    def test__bad_regions(self):
+        emccd = make_emccd()
+        fluxmap = make_fluxmap(emccd)
+        bad_regions = [
+            'not_a_region',
+            (0, 121, 0, 10),
+            (0, 10, 215, 221),
+            (-1, 10, 0, 10),
+            (5, 5, 0, 10),
+            (10, 5, 0, 10),
+            (0, 10, 7, 7),
+            (0, 10, 0),
+            None,
+        ]
+        for region in bad_regions:
+            with pytest.raises(EMCCDDetectException):
+                emccd.sim_full_frame_roi(fluxmap, 10., ['image', region])
+
+    def test__same_statistics_as_full_frame(self):
+        # Without cosmics and CTI every element is independent, so a region
+        # is distributed like the same region of a full frame
+        nframes = 20
+        fluxmap = make_fluxmap(make_emccd(), flux_max=0.2)
+        windows = [(10, 30, 120, 160), (0, 120, 90, 130)]
+
+        emccd = make_emccd(cr_rate=0.)
+        full = np.stack([emccd.sim_full_frame(fluxmap, 1.)
+                         for _ in range(nframes)]).astype(float)
+        emccd = make_emccd(rng=1, cr_rate=0.)
+        rois = [emccd.sim_full_frame_roi(fluxmap, 1., windows)
+                for _ in range(nframes)]
+
+        for i, (r0, r1, c0, c1) in enumerate(windows):
+            full_dn = full[:, r0:r1, c0:c1]
+            roi_dn = np.stack([roi[i] for roi in rois]).astype(float)
+            assert not np.array_equal(roi_dn, full_dn)
+
+            sigma = full_dn.std() / np.sqrt(full_dn.size)
+            assert abs(roi_dn.mean() - full_dn.mean()) < 5*np.sqrt(2)*sigma
+
+            # Fraction of elements above the photon counting threshold, and
+            # read noise of the others
+            threshold = (emccd.bias + 5.5*emccd.read_noise) / emccd.eperdn
+            full_counted = full_dn > threshold
+            roi_counted = roi_dn > threshold
+            p = full_counted.mean()
+            assert p > 0.01
+            sigma = np.sqrt(2 * p * (1-p) / full_counted.size)
+            assert abs(roi_counted.mean() - p) < 5*sigma
+            assert (roi_dn[~roi_counted].std()
+                    == pytest.approx(full_dn[~full_counted].std(), rel=0.03))
+
+            # Mean of each row, which also follows the per-pixel fluxmap
+            assert np.allclose(roi_dn.mean(axis=(0, 2)),
+                               full_dn.mean(axis=(0, 2)),
+                               atol=5*np.sqrt(2)*full_dn.std()
+                               / np.sqrt(nframes * (c1-c0)))
+
+
+class TestSimFramesParallel:
+    def test__same_as_sim_full_frames(self):
+        fluxmap = make_fluxmap(make_emccd())
+        expected = make_emccd().sim_full_frames(fluxmap, 10., nframes=4)
+
+        output = make_emccd().sim_frames_parallel(fluxmap, 10., n_workers=2,
+                                                  nframes=4, chunk_size=1)
+
+        assert output.dtype == expected.dtype
+        assert np.array_equal(output, expected)
+
+    def test__fluxmap_cube_and_frametimes(self):
+        fluxmap = make_fluxmap(make_emccd(), nframes=3)
+        frametime = np.array([1., 5., 10.])
+        expected = make_emccd().sim_full_frames(fluxmap, frametime)
+
+        output = make_emccd().sim_frames_parallel(fluxmap, frametime,
+                                                  n_workers=2, chunk_size=1)
+
+        assert np.array_equal(output, expected)
+
+    def test__out(self):
+        fluxmap = make_fluxmap(make_emccd())
+        expected = make_emccd().sim_full_frames(fluxmap, 10., nframes=3)
+
+        emccd = make_emccd()
+        out = np.empty(expected.shape, dtype=emccd.adc_dtype)
+        output = emccd.sim_frames_parallel(fluxmap, 10., n_workers=2,
+                                           nframes=3, chunk_size=2, out=out)
+
+        assert output is out
+        assert np.array_equal(out, expected)
+
+
+class TestProfiling:
+    stages = {'cosmics', 'integrate', 'clock_parallel', 'cic', 'em_gain',
+              'sat_tails', 'amp', 'adc'}
+
+    def test__report(self):
+        fluxmap = make_fluxmap(make_emccd())
+        emccd = make_emccd()
+        with pytest.raises(EMCCDDetectException):
+            emccd.profile_report()
+
+        callback_records = []
+        emccd.enable_profiling(callback=callback_records.append)
+        emccd.sim_full_frame(fluxmap, 10.)
+        emccd.sim_full_frames(fluxmap, 10., nframes=3)
+        report = emccd.profile_report()
+
+        # One record per call, holding the stages of all its frames
+        records = report['records']
+        assert [record['nframes'] for record in records] == [1, 3]
+        assert callback_records == records
+        assert report['nframes'] == 4
+        assert report['time'] == pytest.approx(
+            sum(record['time'] for record in records))
+
+        stages = report['stages']
+        assert {'integrate', 'em_gain', 'adc'} <= set(stages) <= self.stages
+        for name, total in stages.items():
+            assert set(total) == {'calls', 'time', 'bytes', 'time_per_frame',
+                                  'fraction'}
+            assert total['calls'] == sum(
+                record['stages'][name]['calls'] for record in records)
+            assert total['time_per_frame'] == pytest.approx(
+                total['time'] / 4)
+            assert total['bytes'] == 0
+        assert 0 < sum(total['fraction'] for total in stages.values()) <= 1
+
+        emccd.disable_profiling()
+        assert emccd.profiler is None
+
+    def test__trace_memory(self):
+        emccd = make_emccd()
+        emccd.enable_profiling(trace_memory=True)
+        emccd.sim_full_frame(make_fluxmap(emccd), 10.)
+        stages = emccd.profile_report()['stages']
+        emccd.disable_profiling()
+
+        assert stages['integrate']['bytes'] > 0
+
+    def test__parallel_records(self):
+        # Records of the worker chunks are handed back to the parent with
+        # add_records, which also calls the callback
+        fluxmap = make_fluxmap(make_emccd())
+        callback_records = []
+        emccd = make_emccd()
+        emccd.enable_profiling(callback=callback_records.append)
+        emccd.sim_frames_parallel(fluxmap, 10., n_workers=2, nframes=5,
+                                  chunk_size=2)
+        report = emccd.profile_report()
+
+        records = report['records']
+        assert [record['nframes'] for record in records] == [2, 2, 1]
+        assert callback_records == records
+        assert report['nframes'] == 5
+        assert {'integrate', 'em_gain', 'adc'} <= set(report['stages'])
+
+
+class TestWriteFrames:
+    nframes = 3
+
+    def expected(self, **kwargs):
+        fluxmap = make_fluxmap(make_emccd())
+        return make_emccd(**kwargs).sim_full_frames(fluxmap, 10.,
+                                                    self.nframes)
+
+    def write(self, path, **kwargs):
+        emccd = make_emccd(**kwargs)
+        report = emccd.write_frames(str(path), make_fluxmap(emccd), 10.,
+                                    nframes=self.nframes)
+        assert report['nframes'] == self.nframes
+
+        return emccd
+
+    def check_header(self, header, emccd):
+        assert header['EM_GAIN'] == emccd.em_gain
+        assert header['FULL_WELL_SERIAL'] == emccd.full_well_serial
+        assert header['READ_NOISE'] == emccd.read_noise
+        assert header['EPERDN'] == emccd.eperdn
+        assert header['NBITS'] == emccd.nbits
+        assert header['FRAMETIME'] == 10.
+        image = emccd.meta.geom['image']
+        assert header['GEOM_IMAGE_ROWS'] == image['rows']
+        assert header['GEOM_IMAGE_COLS'] == image['cols']
+        assert header['GEOM_IMAGE_R0'] == image['r0c0'][0]
+        assert header['GEOM_IMAGE_C0'] == image['r0c0'][1]
+        assert header['GEOM_PRESCAN_COL_START'] == \
+            emccd.meta.geom['prescan']['col_start']
+
+    def test__npy(self, tmp_path):
+        path = tmp_path / 'frames.npy'
+        emccd = self.write(path)
+
+        frames = np.load(path)
+        expected = self.expected()
+        assert frames.dtype == expected.dtype
+        assert np.array_equal(frames, expected)
+
+        with open(tmp_path / 'frames.json') as f:
+            self.check_header(json.load(f), emccd)
+
+    def test__fits(self, tmp_path):
+        # Unsigned frames are stored with a BZERO offset, for 64 and 16 bits
+        for adc_dtype in [np.uint64, 'auto']:
+            path = tmp_path / 'frames.fits'
+            emccd = self.write(path, adc_dtype=adc_dtype)
+
+            with fits.open(path) as hdus:
+                hdus.verify('exception')
+                assert len(hdus) == 1
+                frames = hdus[0].data
+                expected = self.expected(adc_dtype=adc_dtype)
+                assert frames.dtype == expected.dtype
+                assert np.array_equal(frames, expected)
+                self.check_header(hdus[0].header, emccd)
+
+    def test__compressed_fits(self, tmp_path):
+        path = tmp_path / 'frames.fits.fz'
+        emccd = self.write(path)
+
+        with fits.open(path) as hdus:
+            hdus.verify('exception')
+            assert len(hdus) == 1 + self.nframes
+            frames = np.stack([hdu.data for hdu in hdus[1:]])
+            self.check_header(hdus[0].header, emccd)
+        # Compressed as the smallest unsigned type holding nbits, losslessly
+        assert frames.dtype == np.uint16
+        assert np.array_equal(frames, self.expected())
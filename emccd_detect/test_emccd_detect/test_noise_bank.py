@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+"""Tests for the noise_bank module."""
+
+import numpy as np
+import pytest
+
+from emccd_detect.noise_bank import NoiseBank, NoiseBankException
+
+N_ROWS = 200
+ROW_LEN = 300
+
+
+def fill_frames(bank, nframes, scale=1., seed=0, **kwargs):
+    """Fill nframes frames of N_ROWS x ROW_LEN elements from a bank."""
+    rng = np.random.default_rng(seed)
+    frames = np.empty((nframes, N_ROWS, ROW_LEN), dtype=bank.bank.dtype)
+    for frame in frames:
+        bank.fill(frame, scale, rng, **kwargs)
+
+    return frames.astype(float)
+
+
+class TestNoiseBank:
+    def test__served_std(self):
+        bank = NoiseBank(size=2**18, seed=0, block_size=1000)
+        frames = fill_frames(bank, 20, scale=3.)
+
+        assert frames.mean() == pytest.approx(0, abs=0.05)
+        assert frames.std() == pytest.approx(3., rel=0.02)
+
+        # Blocks are drawn from different offsets with different signs
+        assert not np.array_equal(np.abs(frames[0]), np.abs(frames[1]))
+        assert np.count_nonzero(frames[0] > 0) > 0.4 * frames[0].size
+
+    def test__bank_is_not_modified(self):
+        bank = NoiseBank(size=2**16, seed=1, block_size=100, row_sigma=2.,
+                         col_sigma=2.)
+        bank_before = bank.bank.copy()
+        frame = np.zeros(N_ROWS * ROW_LEN, dtype=np.float32)
+        bank.fill(frame, 5., np.random.default_rng(0), row_len=ROW_LEN)
+        frame += 100
+
+        assert not np.shares_memory(frame, bank.bank)
+        assert np.array_equal(bank.bank, bank_before)
+
+    def test__row_sigma(self):
+        bank = NoiseBank(size=2**18, seed=2, row_sigma=5.)
+        frames = fill_frames(bank, 10, scale=1., row_len=ROW_LEN)
+
+        # Rows are offset by a drift with std row_sigma, drawn for every frame
+        row_means = frames.mean(axis=2)
+        assert row_means.std() == pytest.approx(5., rel=0.05)
+        assert np.corrcoef(row_means[0], row_means[1])[0, 1] < 0.3
+
+        # with the read noise around it
+        residuals = frames - row_means[..., None]
+        assert residuals.std() == pytest.approx(1., rel=0.02)
+
+    def test__col_sigma(self):
+        bank = NoiseBank(size=2**18, seed=3, col_sigma=5.)
+        frames = fill_frames(bank, 10, scale=1., row_len=ROW_LEN)
+
+        # Columns are offset by the same pattern in every frame
+        col_means = frames.mean(axis=1)
+        pattern = 5. * bank.bank[-ROW_LEN:]
+        assert pattern.std() == pytest.approx(5., rel=0.2)
+        for col_mean in col_means:
+            assert np.allclose(col_mean, pattern, atol=5/np.sqrt(N_ROWS))
+
+    def test__element_inds(self):
+        # Gathered elements get the patterns of their rows and columns
+        bank = NoiseBank(size=2**16, seed=4, block_size=100, row_sigma=3.,
+                         col_sigma=2.)
+        element_inds = np.array([5, 6, 7, 3*ROW_LEN + 10, 20*ROW_LEN - 1])
+        cols = element_inds % ROW_LEN
+        out = np.empty(len(element_inds), dtype=np.float32)
+        bank.fill(out, 0., np.random.default_rng(0), row_len=ROW_LEN,
+                  element_inds=element_inds)
+
+        col_pattern = 2. * bank.bank[-ROW_LEN:]
+        row_drift = out - col_pattern[cols]
+        assert np.allclose(row_drift[:3], row_drift[0])
+        assert len(np.unique(row_drift[2:])) == 3
+
+    def test__row_len_needed(self):
+        bank = NoiseBank(size=2**10, seed=5, row_sigma=1.)
+        with pytest.raises(NoiseBankException):
+            bank.fill(np.empty(100, dtype=np.float32))
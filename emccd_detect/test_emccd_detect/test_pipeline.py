@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+"""Tests for the pipeline module."""
+
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from emccd_detect.frame_sink import FrameSink
+from emccd_detect.pipeline import FramePipeline, PipelineException
+
+FRAME_SHAPE = (4, 5)
+
+
+class MemorySink(FrameSink):
+    """Sink holding the cube in memory, optionally slow or failing."""
+    def __init__(self, nframes, delay=0., fail_at=None):
+        self.delay = delay
+        self.fail_at = fail_at
+        super().__init__('memory', FRAME_SHAPE, nframes, float)
+
+    def _open(self):
+        return np.zeros((self.nframes,) + self.frame_shape)
+
+    def _write(self, frames):
+        time.sleep(self.delay)
+        if self.fail_at is not None and self.n_written >= self.fail_at:
+            raise OSError('Disk full')
+        super()._write(frames)
+
+
+def make_frames(nframes):
+    """Stack of distinct frames."""
+    shape = (nframes,) + FRAME_SHAPE
+    return np.arange(np.prod(shape), dtype=float).reshape(shape)
+
+
+def run_in_thread(pipeline, frames, timeout=10.):
+    """Run a pipeline, failing the test if it does not finish in time."""
+    result = {}
+
+    def target():
+        try:
+            result['report'] = pipeline.run(frames)
+        except BaseException as e:
+            result['error'] = e
+
+    thread = threading.Thread(target=target, daemon=True)
+    thread.start()
+    thread.join(timeout)
+    assert not thread.is_alive(), 'Pipeline is deadlocked'
+
+    return result
+
+
+class TestFramePipeline:
+    @pytest.mark.parametrize('queue_size', [0, 1, 2])
+    def test__frames_and_stacks(self, queue_size):
+        frames = make_frames(6)
+        items = [frames[0], frames[1:4], frames[4], frames[5:]]
+        sink = MemorySink(6)
+
+        report = FramePipeline(sink, queue_size=queue_size).run(iter(items))
+
+        assert report['nframes'] == 6
+        assert sink.n_written == 6
+        assert np.array_equal(sink._data, frames)
+        assert set(report['stages']) == {'make', 'write'}
+        for stats in report['stages'].values():
+            assert set(stats) == {'time', 'wait', 'frames_per_second',
+                                  'fraction'}
+
+    def test__empty(self):
+        sink = MemorySink(1)
+        report = FramePipeline(sink).run([])
+
+        assert report['nframes'] == 0
+        assert sink.n_written == 0
+
+    def test__backpressure(self):
+        # A slow writer holds up making frames, so that at most queue_size
+        # frames wait on the queue and one is being written when the next is
+        # made
+        queue_size = 2
+        nframes = 10
+        sink = MemorySink(nframes, delay=0.02)
+        ahead = []
+
+        def frames():
+            for i, frame in enumerate(make_frames(nframes)):
+                ahead.append(i - sink.n_written)
+                yield frame
+
+        result = run_in_thread(FramePipeline(sink, queue_size=queue_size),
+                               frames())
+        report = result['report']
+
+        assert report['nframes'] == nframes
+        assert np.array_equal(sink._data, make_frames(nframes))
+        assert max(ahead) <= queue_size + 1
+        assert report['stages']['make']['wait'] > 0.05
+        assert report['stages']['write']['time'] >= nframes * 0.02
+
+    @pytest.mark.parametrize('queue_size', [0, 1, 2])
+    def test__sink_error(self, queue_size):
+        # The error of the sink is raised in the caller, which stops making
+        # frames without being left blocked on a full queue
+        made = []
+
+        def frames():
+            for frame in make_frames(100):
+                made.append(frame)
+                yield frame
+
+        sink = MemorySink(100, delay=0.001, fail_at=3)
+        result = run_in_thread(FramePipeline(sink, queue_size=queue_size),
+                               frames())
+
+        assert isinstance(result.get('error'), OSError)
+        assert sink.n_written == 3
+        assert len(made) < 100
+
+    def test__maker_error(self):
+        def frames():
+            yield make_frames(1)[0]
+            raise ValueError('Bad fluxmap')
+
+        sink = MemorySink(5, delay=0.01)
+        result = run_in_thread(FramePipeline(sink), frames())
+
+        assert isinstance(result.get('error'), ValueError)
+        assert sink.n_written == 1
+
+    def test__queue_size(self):
+        for queue_size in [-1, 1.5, None]:
+            with pytest.raises(PipelineException):
+                FramePipeline(MemorySink(1), queue_size=queue_size)
@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+"""Tests for the rand_em_gain module."""
+
+import numpy as np
+import pytest
+from scipy import stats
+
+from emccd_detect.rand_em_gain import (_TABLE_CACHE_SIZE, EMGainSampler,
+                                       RandEMGainException, _inv_cdf_table,
+                                       rand_em_gain)
+
+EM_GAIN = 1000.
+SIZE = 20000
+
+
+def check_gamma(n_out, n, em_gain=EM_GAIN):
+    """Check draws against the gamma distribution of shape n and scale
+    em_gain, which they follow up to rounding to whole electrons."""
+    p_value = stats.kstest(n_out, stats.gamma(n, scale=em_gain).cdf).pvalue
+    assert p_value > 1e-3
+
+
+class TestEMGainSampler:
+    def test__n_1(self):
+        sampler = EMGainSampler()
+        n_out = sampler(np.ones(SIZE), EM_GAIN, np.random.default_rng(0))
+        check_gamma(n_out, 1)
+
+    def test__n_2(self):
+        # Lambert W inverse CDF
+        sampler = EMGainSampler()
+        n_out = sampler(np.full(SIZE, 2.), EM_GAIN, np.random.default_rng(1))
+        check_gamma(n_out, 2)
+
+    def test__tabulated(self):
+        # Small tables, so interpolation errors would show
+        sampler = EMGainSampler(table_n_max=10, table_size=256)
+        rng = np.random.default_rng(2)
+        for n in [3, 7, 10]:
+            n_out = sampler(np.full(SIZE, float(n)), EM_GAIN, rng)
+            check_gamma(n_out, n)
+
+    def test__gamma_fallback(self):
+        # Above table_n_max and non-integer counts
+        sampler = EMGainSampler(table_n_max=10)
+        rng = np.random.default_rng(3)
+        for n in [15, 3.5]:
+            n_out = sampler(np.full(SIZE, n), EM_GAIN, rng)
+            check_gamma(n_out, n)
+
+    def test__normal(self):
+        sampler = EMGainSampler(normal_n=100)
+        n = 400
+        n_out = sampler(np.full(SIZE, float(n)), EM_GAIN,
+                        np.random.default_rng(4))
+
+        # Same mean and variance as the gamma distribution
+        sigma = np.sqrt(n) * EM_GAIN
+        assert abs(n_out.mean() - n*EM_GAIN) < 5 * sigma / np.sqrt(SIZE)
+        assert n_out.std() == pytest.approx(sigma, rel=0.03)
+
+    def test__mixed_counts(self):
+        # Every path at once, with the draws put back in the right places
+        sampler = EMGainSampler(table_n_max=5, normal_n=100)
+        rng = np.random.default_rng(5)
+        n_in = rng.choice([0, 1, 2, 4, 8, 200], size=(300, 200))
+        n_out = sampler(n_in, EM_GAIN, rng)
+
+        assert n_out.shape == n_in.shape
+        for n in [1, 2, 4, 8]:
+            check_gamma(n_out[n_in == n], n)
+        assert (n_out[n_in == 200].mean()
+                == pytest.approx(200*EM_GAIN, rel=0.01))
+
+    def test__zeros_and_dtype(self):
+        sampler = EMGainSampler(table_n_max=5, normal_n=100)
+        rng = np.random.default_rng(6)
+        n_in = rng.choice([0, 1, 3, 150], size=1000).astype(np.float32)
+
+        n_out = sampler(n_in, EM_GAIN, rng)
+
+        assert n_out.dtype == np.float32
+        assert np.all(n_out[n_in == 0] == 0)
+        assert np.all(n_out == np.round(n_out))
+        assert sampler(n_in.astype(float), EM_GAIN, rng).dtype == np.float64
+
+    def test__gain_of_1(self):
+        sampler = EMGainSampler()
+        n_in = np.array([0., 1., 5.])
+
+        assert sampler(n_in, 1) is n_in
+        with pytest.raises(RandEMGainException):
+            sampler(n_in, 0.5)
+
+    def test__table_cache_is_bounded(self):
+        # Sweeping the gain does not keep every table
+        sampler = EMGainSampler(table_n_max=3, table_size=16)
+        rng = np.random.default_rng(7)
+        for em_gain in np.linspace(100, 200, _TABLE_CACHE_SIZE + 10):
+            sampler(np.array([3.]), em_gain, rng)
+
+        cache_info = _inv_cdf_table.cache_info()
+        assert cache_info.maxsize == _TABLE_CACHE_SIZE
+        assert cache_info.currsize <= _TABLE_CACHE_SIZE
+
+
+class TestRandEMGain:
+    def test__gamma(self):
+        n_out = rand_em_gain(np.full(SIZE, 3.), EM_GAIN,
+                             np.random.default_rng(8))
+        check_gamma(n_out, 3)
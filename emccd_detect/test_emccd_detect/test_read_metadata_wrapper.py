@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+"""Tests for the read_metadata_wrapper module."""
+
+import os
+
+import numpy as np
+import pytest
+
+from emccd_detect.util.read_metadata_wrapper import MetadataWrapper
+
+META_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)),
+                         'emccd_detect', 'util', 'metadata_test.yaml')
+
+
+class TestMetadataWrapper:
+    def test__mask(self):
+        meta = MetadataWrapper(META_PATH)
+        image_m = meta.mask('image')
+
+        assert image_m.dtype == bool
+        assert image_m.shape == (120, 220)
+        assert np.count_nonzero(image_m) == 104 * 105
+        assert image_m[2, 108] and image_m[105, 212]
+        assert not image_m[1, 108] and not image_m[2, 107]
+
+    def test__mask_is_a_new_writable_array(self):
+        meta = MetadataWrapper(META_PATH)
+        image_m = meta.mask('image')
+        image_m[0, 0] = True
+
+        assert not np.shares_memory(image_m, meta.mask('image'))
+        assert not meta.mask('image')[0, 0]
+
+    def test__cached_attributes_are_read_only(self):
+        meta = MetadataWrapper(META_PATH)
+
+        assert meta.empty_element_m is meta.empty_element_m
+        assert np.array_equal(meta.empty_element_m,
+                              meta.mask('prescan')
+                              | meta.mask('parallel_overscan')
+                              | meta.mask('serial_overscan'))
+        assert np.array_equal(meta.empty_element_inds,
+                              np.flatnonzero(meta.empty_element_m))
+        for array in [meta.empty_element_m, meta.empty_element_inds,
+                      meta.imaging_element_inds, meta.exposed_pix_m]:
+            with pytest.raises(ValueError):
+                array[0] = 0